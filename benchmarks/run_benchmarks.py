@@ -0,0 +1,208 @@
+"""Times level construction, InputColumn rendering and level execution.
+
+Run from the root of the repository, e.g.
+
+    python -m benchmarks.run_benchmarks --pairs 1000000 --output bench.json
+
+Results are written as JSON, tagged with the current git commit, so that runs
+against different commits can be compared.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import duckdb
+
+from benchmarks.synthetic import RECORD_COLUMNS, generate_pairs
+from comp_level_factories.dialect_factories.comparison_level_factories import (
+    _core_comparison_levels,
+)
+from comp_level_factories.retarget import retarget
+from comparisons.comparison_level_builder import DamerauLevenshteinLevel
+from execution.duckdb_engine import DuckDBComparisonEngine
+from splink.input_column import InputColumn, interned_input_column
+
+
+def _time(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _result(name, timings, items):
+    median = statistics.median(timings)
+    return {
+        "name": name,
+        "items": items,
+        "repeats": len(timings),
+        "median_seconds": median,
+        "min_seconds": min(timings),
+        "items_per_second": items / median if median else None,
+    }
+
+
+def _comparisons(dialect):
+    levels = _core_comparison_levels(dialect)
+    comparisons = {}
+    for col in RECORD_COLUMNS:
+        comparisons[col] = [
+            levels["null_level"](col),
+            levels["exact_match_level"](col),
+            levels["damerau_levenshtein_level"](col, 1),
+            levels["damerau_levenshtein_level"](col, 2),
+            levels["else_level"](),
+        ]
+    return comparisons
+
+
+def bench_level_construction(num_levels, repeats):
+    levels = _core_comparison_levels("duckdb")
+
+    def build_library_levels():
+        for i in range(num_levels):
+            col = RECORD_COLUMNS[i % len(RECORD_COLUMNS)]
+            levels["exact_match_level"](col)
+            levels["damerau_levenshtein_level"](col, 2)
+
+    builder_levels = [
+        DamerauLevenshteinLevel(RECORD_COLUMNS[i % len(RECORD_COLUMNS)], 2)
+        for i in range(num_levels)
+    ]
+
+    return [
+        _result(
+            "construct_library_levels",
+            _time(build_library_levels, repeats),
+            2 * num_levels,
+        ),
+        _result(
+            "retarget_builder_levels",
+            _time(lambda: retarget(builder_levels, "duckdb"), repeats),
+            num_levels,
+        ),
+    ]
+
+
+def _render_all(col):
+    col.name()
+    col.name_l()
+    col.name_r()
+    col.l_r_names_as_l_r()
+    col.l_r_tf_names_as_l_r()
+    col.unquote().name()
+
+
+def bench_input_column_rendering(num_renders, repeats):
+    def render_new_columns():
+        for i in range(num_renders):
+            col = RECORD_COLUMNS[i % len(RECORD_COLUMNS)]
+            _render_all(InputColumn(col, sql_dialect="duckdb"))
+
+    def render_interned_columns():
+        for i in range(num_renders):
+            col = RECORD_COLUMNS[i % len(RECORD_COLUMNS)]
+            _render_all(interned_input_column(col, sql_dialect="duckdb"))
+
+    return [
+        _result(
+            "render_new_input_columns",
+            _time(render_new_columns, repeats),
+            num_renders,
+        ),
+        _result(
+            "render_interned_input_columns",
+            _time(render_interned_columns, repeats),
+            num_renders,
+        ),
+    ]
+
+
+def bench_duckdb_execution(num_pairs, chunk_size, repeats):
+    engine = DuckDBComparisonEngine()
+    comparisons = _comparisons("duckdb")
+
+    # Chunks are generated as they're needed, so only one is held in memory at
+    # a time, and only execution is timed
+    timings = []
+    for _ in range(repeats):
+        elapsed = 0.0
+        for chunk in generate_pairs(num_pairs, chunk_size=chunk_size):
+            start = time.perf_counter()
+            engine.compute_comparison_vectors(chunk, comparisons)
+            elapsed += time.perf_counter() - start
+        timings.append(elapsed)
+
+    return [_result("duckdb_comparison_vectors", timings, num_pairs)]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(num_pairs, num_levels, chunk_size, repeats):
+    """Runs every benchmark and returns the results as a dict.
+
+    Args:
+        num_pairs (int): The number of record pairs to execute levels on.
+        num_levels (int): The number of levels to construct and render.
+        chunk_size (int): The number of pairs per chunk passed to DuckDB.
+        repeats (int): The number of times to repeat each benchmark.
+
+    Returns:
+        dict: The results, with the commit and environment they were run in.
+    """
+    results = []
+    results.extend(bench_level_construction(num_levels, repeats))
+    results.extend(bench_input_column_rendering(num_levels, repeats))
+    results.extend(bench_duckdb_execution(num_pairs, chunk_size, repeats))
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "platform": platform.platform(),
+        },
+        "parameters": {
+            "num_pairs": num_pairs,
+            "num_levels": num_levels,
+            "chunk_size": chunk_size,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=10_000)
+    parser.add_argument("--levels", type=int, default=1_000)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.pairs, args.levels, args.chunk_size, args.repeats)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
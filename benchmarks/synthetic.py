@@ -0,0 +1,184 @@
+"""Synthetic person-like records and record pairs for benchmarking.
+
+Records are drawn from small lists of common names, with random dates of
+birth and UK-style postcodes. Pairs are built by sampling from a fixed pool
+of records and corrupted copies of them, using array takes, so that very
+large numbers of pairs can be produced quickly and a chunk at a time.
+"""
+
+import random
+import string
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# fmt: off
+FIRST_NAMES = [
+    "james", "mary", "robert", "patricia", "john", "jennifer", "michael",
+    "linda", "david", "elizabeth", "william", "barbara", "richard", "susan",
+    "joseph", "jessica", "thomas", "sarah", "christopher", "karen", "charles",
+    "lisa", "daniel", "nancy", "matthew", "betty", "anthony", "sandra", "mark",
+    "margaret", "donald", "ashley", "steven", "kimberly", "andrew", "emily",
+    "paul", "donna", "joshua", "michelle", "kenneth", "carol", "kevin",
+    "amanda", "brian", "melissa", "george", "deborah", "timothy", "stephanie",
+    "oliver", "amelia", "harry", "isla", "jack", "ava", "noah", "mia", "leo",
+    "ivy", "muhammad", "grace", "arthur", "freya", "oscar", "lily", "mohammed",
+]
+
+SURNAMES = [
+    "smith", "jones", "williams", "taylor", "brown", "davies", "evans",
+    "wilson", "thomas", "johnson", "roberts", "robinson", "thompson", "wright",
+    "walker", "white", "edwards", "hughes", "green", "hall", "lewis", "harris",
+    "clarke", "patel", "jackson", "wood", "turner", "martin", "cooper", "hill",
+    "ward", "morris", "moore", "clark", "lee", "king", "baker", "harrison",
+    "morgan", "allen", "james", "scott", "phillips", "watson", "davis",
+    "parker", "price", "bennett", "young", "griffiths", "mitchell", "kelly",
+    "cook", "carter", "richardson", "bailey", "collins", "bell", "shaw",
+    "murphy", "miller", "cox", "richards", "khan", "marshall", "anderson",
+]
+# fmt: on
+
+RECORD_COLUMNS = ["first_name", "surname", "dob", "postcode"]
+
+
+def _postcode(rng):
+    letters = string.ascii_uppercase
+    return (
+        f"{rng.choice(letters)}{rng.choice(letters)}{rng.randint(1, 99)} "
+        f"{rng.randint(1, 9)}{rng.choice(letters)}{rng.choice(letters)}"
+    )
+
+
+def _dob(rng):
+    year, month, day = rng.randint(1930, 2010), rng.randint(1, 12), rng.randint(1, 28)
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+def _typo(value, rng):
+    # Applies a single random edit: substitution, deletion, insertion or
+    # transposition of adjacent characters
+    if not value:
+        return value
+    i = rng.randrange(len(value))
+    edit = rng.randrange(4)
+    if edit == 0:
+        return value[:i] + rng.choice(string.ascii_lowercase) + value[i + 1 :]
+    if edit == 1 and len(value) > 1:
+        return value[:i] + value[i + 1 :]
+    if edit == 2:
+        return value[:i] + rng.choice(string.ascii_lowercase) + value[i:]
+    if i < len(value) - 1:
+        return value[:i] + value[i + 1] + value[i] + value[i + 2 :]
+    return value
+
+
+def generate_records(num_records, null_rate=0.02, seed=0) -> pa.Table:
+    """Generates person-like records.
+
+    Args:
+        num_records (int): The number of records.
+        null_rate (float, optional): The proportion of values set to null.
+            Defaults to 0.02.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pyarrow.Table: Columns unique_id, first_name, surname, dob, postcode.
+    """
+    rng = random.Random(seed)
+
+    def maybe_null(value):
+        return None if rng.random() < null_rate else value
+
+    return pa.table(
+        {
+            "unique_id": pa.array(range(num_records), type=pa.int64()),
+            "first_name": [
+                maybe_null(rng.choice(FIRST_NAMES)) for _ in range(num_records)
+            ],
+            "surname": [maybe_null(rng.choice(SURNAMES)) for _ in range(num_records)],
+            "dob": [maybe_null(_dob(rng)) for _ in range(num_records)],
+            "postcode": [maybe_null(_postcode(rng)) for _ in range(num_records)],
+        }
+    )
+
+
+def corrupt_records(records, typo_rate=0.2, seed=0) -> pa.Table:
+    """Returns a copy of the records with random typos in their values.
+
+    Args:
+        records (pyarrow.Table): Records from generate_records.
+        typo_rate (float, optional): The probability that any given value
+            contains a typo. Defaults to 0.2.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pyarrow.Table: The corrupted records, with the same unique_ids.
+    """
+    rng = random.Random(seed)
+    columns = {"unique_id": records.column("unique_id")}
+    for col in RECORD_COLUMNS:
+        columns[col] = [
+            _typo(v, rng) if v is not None and rng.random() < typo_rate else v
+            for v in records.column(col).to_pylist()
+        ]
+    return pa.table(columns)
+
+
+def generate_pairs(
+    num_pairs,
+    match_proportion=0.1,
+    pool_size=100_000,
+    chunk_size=1_000_000,
+    seed=0,
+):
+    """Generates record pairs, in chunks, with `_l` and `_r` columns.
+
+    A proportion of pairs compare a record with a corrupted copy of itself,
+    and the rest compare two records picked at random.
+
+    Args:
+        num_pairs (int): The total number of pairs.
+        match_proportion (float, optional): The proportion of pairs that are
+            true matches. Defaults to 0.1.
+        pool_size (int, optional): The number of distinct records pairs are
+            drawn from. Defaults to 100,000.
+        chunk_size (int, optional): The number of pairs per chunk. Defaults
+            to 1,000,000.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Yields:
+        pyarrow.Table: Chunks of pairs, with columns unique_id_l,
+            unique_id_r, first_name_l, first_name_r, etc.
+    """
+    records = generate_records(pool_size, seed=seed)
+    corrupted = corrupt_records(records, seed=seed + 1)
+    rng = np.random.default_rng(seed)
+
+    remaining = num_pairs
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        idx_l = rng.integers(0, pool_size, n)
+        is_match = rng.random(n) < match_proportion
+        idx_r = np.where(is_match, idx_l, rng.integers(0, pool_size, n))
+
+        left = records.take(pa.array(idx_l))
+        # Matches are compared against a corrupted copy of the same record
+        right = pa.table(
+            {
+                col: pc.if_else(
+                    pa.array(is_match),
+                    corrupted.column(col).take(pa.array(idx_r)),
+                    records.column(col).take(pa.array(idx_r)),
+                )
+                for col in ["unique_id"] + RECORD_COLUMNS
+            }
+        )
+
+        chunk = {}
+        for col in ["unique_id"] + RECORD_COLUMNS:
+            chunk[f"{col}_l"] = left.column(col)
+            chunk[f"{col}_r"] = right.column(col)
+        yield pa.table(chunk)
+
+        remaining -= n
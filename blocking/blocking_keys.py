@@ -0,0 +1,253 @@
+from dataclasses import dataclass
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import sqlglot.expressions as exp
+
+from splink.sql_transform import parse_one_cached
+
+
+@dataclass(frozen=True)
+class BlockingKeys:
+    """The equi-join keys of a blocking rule.
+
+    A rule such as `l.surname = r.surname and substr(l.dob, 1, 4) =
+    substr(r.dob, 1, 4)` has the keys `surname` and `substr(dob, 1, 4)` on
+    each side, with the table prefixes removed so they can be evaluated
+    against a single input table.
+
+    Attributes:
+        keys_l (tuple[sqlglot.expression]): The key expressions on the left.
+        keys_r (tuple[sqlglot.expression]): The matching key expressions on
+            the right.
+        residual (tuple[sqlglot.expression]): The rule's other conditions,
+            e.g. `l.dob < r.dob`. Only pairs which also meet these are
+            generated by the rule.
+    """
+
+    keys_l: tuple
+    keys_r: tuple
+    residual: tuple
+
+    @property
+    def has_residual(self):
+        return len(self.residual) > 0
+
+    @property
+    def is_symmetric(self):
+        return [k.sql() for k in self.keys_l] == [k.sql() for k in self.keys_r]
+
+    def keys_sql(self, side, dialect=None):
+        keys = self.keys_l if side == "l" else self.keys_r
+        return [k.sql(dialect) for k in keys]
+
+    def residual_sql_on_pairs(self, dialect=None):
+        """The residual conditions as sql on a table of record pairs, where
+        e.g. `l.dob` is the column `dob_l`.
+        """
+        if not self.has_residual:
+            return None
+        conditions = [_with_column_suffix(c).sql(dialect) for c in self.residual]
+        return " and ".join(f"({c})" for c in conditions)
+
+    def rule_sql_on_pairs(self, dialect=None):
+        """The whole rule as sql on a table of record pairs."""
+        conditions = [
+            f"({_with_column_suffix(l, 'l').sql(dialect)}) = "
+            f"({_with_column_suffix(r, 'r').sql(dialect)})"
+            for l, r in zip(self.keys_l, self.keys_r)
+        ]
+        if self.has_residual:
+            conditions.append(self.residual_sql_on_pairs(dialect))
+        return " and ".join(conditions) if conditions else "true"
+
+
+def blocking_rule_sql(blocking_rule, sql_dialect=None):
+    """Gets the sql and dialect of a blocking rule.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        sql_dialect (str, optional): The dialect of the sql, if a string is
+            passed. Defaults to None.
+
+    Returns:
+        tuple[str, str]: The sql and its dialect.
+    """
+    if isinstance(blocking_rule, str):
+        return blocking_rule, sql_dialect
+
+    sql = getattr(blocking_rule, "_blocking_rule", None)
+    if sql is None:
+        raise ValueError(
+            f"{blocking_rule!r} has no sql yet. Please set its sql_dialect first."
+        )
+    return sql, blocking_rule.sql_dialect
+
+
+def _conjuncts(tree):
+    if isinstance(tree, exp.Paren):
+        return _conjuncts(tree.this)
+    if isinstance(tree, exp.And):
+        return _conjuncts(tree.left) + _conjuncts(tree.right)
+    return [tree]
+
+
+def _side(tree):
+    # "l" or "r" if every column in the expression is from that table
+    tables = {col.table for col in tree.find_all(exp.Column)}
+    if len(tables) == 1 and tables <= {"l", "r"}:
+        return tables.pop()
+    return None
+
+
+def _without_table_prefix(tree):
+    tree = tree.copy()
+    for col in tree.find_all(exp.Column):
+        col.set("table", None)
+    return tree
+
+
+def _with_column_suffix(tree, table=None):
+    # Replaces e.g. l.dob with dob_l. Columns without a table prefix are
+    # given `table`, if set.
+    def add_suffix(node):
+        if isinstance(node, exp.Column) and (node.table or table) in ("l", "r"):
+            name = f"{node.name}_{node.table or table}"
+            return exp.column(exp.to_identifier(name, quoted=True))
+        return node
+
+    return tree.transform(add_suffix)
+
+
+def blocking_keys(blocking_rule, sql_dialect=None) -> BlockingKeys:
+    """Extracts the equi-join keys from a blocking rule.
+
+    Each top level `and` condition of the form `<l expression> = <r
+    expression>` contributes a key. Anything else is residual.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        sql_dialect (str, optional): The dialect of the sql, if a string is
+            passed. Defaults to None.
+
+    Returns:
+        BlockingKeys: The keys of the rule.
+    """
+    sql, sql_dialect = blocking_rule_sql(blocking_rule, sql_dialect)
+    tree = parse_one_cached(sql, sql_dialect, copy=False)
+
+    keys_l, keys_r, residual = [], [], []
+    for condition in _conjuncts(tree):
+        if isinstance(condition, exp.EQ):
+            sides = (_side(condition.left), _side(condition.right))
+            if sides in (("l", "r"), ("r", "l")):
+                l_key, r_key = condition.left, condition.right
+                if sides == ("r", "l"):
+                    l_key, r_key = r_key, l_key
+                keys_l.append(_without_table_prefix(l_key))
+                keys_r.append(_without_table_prefix(r_key))
+                continue
+        residual.append(condition)
+
+    return BlockingKeys(tuple(keys_l), tuple(keys_r), tuple(residual))
+
+
+def as_arrow_table(table) -> pa.Table:
+    if isinstance(table, pa.Table):
+        return table
+    if hasattr(table, "to_arrow"):
+        return table.to_arrow()
+    if hasattr(table, "columns") and hasattr(table, "index"):
+        return pa.Table.from_pandas(table, preserve_index=False)
+    return pa.table(table)
+
+
+def evaluate_keys(table, keys):
+    """Evaluates key expressions against a table.
+
+    Keys which are plain column references are read directly, and any others
+    are evaluated in an in-process DuckDB connection.
+
+    Args:
+        table (pyarrow.Table | pandas.DataFrame | dict): The input records.
+        keys (list[sqlglot.expression]): Key expressions without a table
+            prefix, as in BlockingKeys.
+
+    Returns:
+        list[pyarrow.ChunkedArray]: The value of each key, for each record.
+    """
+    table = as_arrow_table(table)
+    values = [None] * len(keys)
+
+    expressions = {}
+    for i, key in enumerate(keys):
+        if isinstance(key, exp.Column) and key.name in table.column_names:
+            values[i] = table.column(key.name)
+        else:
+            expressions[i] = key.sql("duckdb")
+
+    if expressions:
+        con = duckdb.connect()
+        con.register("__splink__blocking_input", table)
+        select = ", ".join(f"{sql} as k{i}" for i, sql in expressions.items())
+        result = con.execute(
+            f"select {select} from __splink__blocking_input"
+        ).to_arrow_table()
+        for i in expressions:
+            values[i] = result.column(f"k{i}")
+
+    return values
+
+
+def _dictionary_codes(arrays):
+    # Encodes values from several arrays into one shared set of integer
+    # codes, with -1 for nulls
+    value_type = arrays[0].type
+    combined = pa.chunked_array(
+        [chunk.cast(value_type) for array in arrays for chunk in array.chunks],
+        type=value_type,
+    )
+    encoded = combined.combine_chunks().dictionary_encode()
+    codes = pc.fill_null(encoded.indices, -1).to_numpy(zero_copy_only=False)
+    return codes.astype(np.int64), len(encoded.dictionary)
+
+
+def key_codes(tables, keys_per_table):
+    """Encodes the blocking key values of each record as a single integer.
+
+    Records have the same code if and only if their keys are equal, across
+    all of the tables. Records with a null in any key get the code -1, as
+    they can never be matched by an equality.
+
+    Args:
+        tables (list): The input tables.
+        keys_per_table (list[list[sqlglot.expression]]): The key expressions
+            to evaluate against each table.
+
+    Returns:
+        tuple[list[numpy.ndarray], int]: The codes of the records in each
+            table, and the number of distinct codes.
+    """
+    tables = [as_arrow_table(t) for t in tables]
+    lengths = [t.num_rows for t in tables]
+    values = [evaluate_keys(t, keys) for t, keys in zip(tables, keys_per_table)]
+
+    # With no keys, every record is in a single group
+    codes = np.zeros(sum(lengths), dtype=np.int64)
+    num_codes = 1
+    for k in range(len(keys_per_table[0])):
+        codes_k, size_k = _dictionary_codes([v[k] for v in values])
+        # Combine with the previous keys, then compact the codes so they stay
+        # small however many keys there are
+        valid = (codes >= 0) & (codes_k >= 0)
+        unique, inverse = np.unique(
+            codes[valid] * size_k + codes_k[valid], return_inverse=True
+        )
+        codes = np.full(len(codes), -1, dtype=np.int64)
+        codes[valid] = inverse
+        num_codes = len(unique)
+
+    splits = np.cumsum(lengths)[:-1]
+    return np.split(codes, splits), num_codes
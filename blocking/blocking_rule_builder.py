@@ -1,9 +1,28 @@
-import os
-os.chdir("../")
+import sys
+sys.path.append("../")
 
 from dataclasses import dataclass
-import sqlglot
-from splink.sql_transform import add_quotes_and_table_prefix
+from splink.sql_transform import add_quotes_and_table_prefix, parse_one_cached
+from comp_level_factories.dialect_factories.dialect_base_classes import (
+    _dialect_base_factory,
+)
+from comp_level_factories.dialect_factories.dialect_bases.dialect_base import (
+    DialectBase,
+)
+
+# A random number in [0, 1) for each input record, used to salt joins
+SALT_COLUMN_NAME = "__splink__salt"
+
+
+def add_salt_column_sql(table_name):
+    return f"select *, random() as {SALT_COLUMN_NAME} from {table_name}"
+
+
+# The position of each record in the sort order of a sorted neighbourhood rule
+SORT_RANK_COLUMN_NAME = "__splink__sort_rank"
+
+# Prefix of the band key columns of a MinHash LSH rule
+BAND_COLUMN_PREFIX = "__splink__band_"
 
 
 class BlockingRule:
@@ -40,6 +59,40 @@ class BlockingRule:
         # underlying BR class...
         pass
 
+    @property
+    def is_salted(self):
+        return self.salting_partitions > 1
+
+    def salt_predicate(self, partition):
+        """The condition selecting one salting partition of the pairs.
+
+        Pairs are split on the salt of their left record, so the partitions
+        are disjoint and together make up all of the rule's pairs.
+
+        Args:
+            partition (int): The partition, from 0 to salting_partitions - 1.
+
+        Returns:
+            str: The sql condition.
+        """
+        return (
+            f"ceiling(l.{SALT_COLUMN_NAME} * {self.salting_partitions}) "
+            f"= {partition + 1}"
+        )
+
+    @property
+    def salted_blocking_rules(self):
+        """The rule's sql for each salting partition. Each can be run as a
+        separate join, over input tables with a salt column (see
+        add_salt_column_sql), and the results unioned.
+        """
+        if not self.is_salted:
+            return [self.blocking_rule]
+        return [
+            f"({self.blocking_rule}) and {self.salt_predicate(partition)}"
+            for partition in range(self.salting_partitions)
+        ]
+
 
 @dataclass
 class exact_match_rule(BlockingRule):
@@ -50,7 +103,10 @@ class exact_match_rule(BlockingRule):
     @property
     def generate_sql(self):
         if self._sql_dialect:
-            syntax_tree = sqlglot.parse_one(self.col_name, read=self._sql_dialect)
+            # add_quotes_and_table_prefix copies the tree, so no copy needed
+            syntax_tree = parse_one_cached(
+                self.col_name, self._sql_dialect, copy=False
+            )
 
             l_col = add_quotes_and_table_prefix(syntax_tree, "l").sql(self._sql_dialect)
             r_col = add_quotes_and_table_prefix(syntax_tree, "r").sql(self._sql_dialect)
@@ -58,10 +114,14 @@ class exact_match_rule(BlockingRule):
             blocking_rule = f"{l_col} = {r_col}"
             self._description = "Exact match"
 
+            # Keep the dialect and any preceding rules across regeneration
+            preceding_rules = getattr(self, "preceding_rules", [])
             super().__init__(
                 blocking_rule,
                 salting_partitions=self.salting_partitions,
+                sqlglot_dialect=self._sql_dialect,
             )
+            self.preceding_rules = preceding_rules
         else:
             raise ValueError("No SQL dialect found. Please ensure you supply a dialect.")
 
@@ -73,14 +133,288 @@ class exact_match_rule(BlockingRule):
         return f"<Exact match blocking on '{sql}'>"
 
 
-t = exact_match_rule("test")
-t.sql_dialect # blank
+@dataclass
+class sorted_neighbourhood_rule(BlockingRule):
+    """Sorts records on a key and pairs each record with the next
+    `window_size` records in the sort order, so the number of pairs is at
+    most n * window_size. Unlike exact_match_rule, records whose keys are
+    close but not equal, e.g. because of a typo, can still be paired.
+
+    Ties are broken on the unique id. Records with a null key are not
+    paired, and within each pair the record earlier in the sort order is on
+    the left.
+
+    > rule = sorted_neighbourhood_rule("surname", window_size=4)
+    > rule.sql_dialect = "duckdb"
+    > rule.pairs_sql("people")
+    """
+
+    col_name: str
+    window_size: int = 5
+    salting_partitions: int = 1
+
+    @property
+    def generate_sql(self):
+        if self._sql_dialect:
+            syntax_tree = parse_one_cached(
+                self.col_name, self._sql_dialect, copy=False
+            )
+            self._key_sql = add_quotes_and_table_prefix(syntax_tree, None).sql(
+                self._sql_dialect
+            )
+
+            # The pairs as a band join on the sort rank, for use in a join of
+            # tables with a rank column (see rank_sql)
+            rank_l = f'l."{SORT_RANK_COLUMN_NAME}"'
+            rank_r = f'r."{SORT_RANK_COLUMN_NAME}"'
+            blocking_rule = (
+                f"{rank_r} > {rank_l} and {rank_r} <= {rank_l} + {self.window_size}"
+            )
+            self._description = "Sorted neighbourhood"
+
+            preceding_rules = getattr(self, "preceding_rules", [])
+            super().__init__(
+                blocking_rule,
+                salting_partitions=self.salting_partitions,
+                sqlglot_dialect=self._sql_dialect,
+            )
+            self.preceding_rules = preceding_rules
+        else:
+            raise ValueError(
+                "No SQL dialect found. Please ensure you supply a dialect."
+            )
+
+    @property
+    def key_sql(self):
+        """The sort key, as sql on an unprefixed input table."""
+        self._require_sql()
+        return self._key_sql
+
+    def _require_sql(self):
+        if getattr(self, "_blocking_rule", None) is None:
+            raise ValueError(
+                "No SQL dialect found. Please ensure you supply a dialect."
+            )
+
+    def _dialect_base(self):
+        try:
+            return _dialect_base_factory(self._sql_dialect)()
+        except ValueError:
+            return DialectBase()
+
+    def rank_sql(self, table_name, unique_id_column_name="unique_id"):
+        """Sql adding the sort rank of each record to an input table, with a
+        window function. Records with a null key are dropped.
+        """
+        self._require_sql()
+        return f"""
+            select
+                *,
+                row_number() over (
+                    order by {self._key_sql}, "{unique_id_column_name}"
+                ) as "{SORT_RANK_COLUMN_NAME}"
+            from {table_name}
+            where ({self._key_sql}) is not null
+        """
+
+    def pairs_sql(self, table_name, unique_id_column_name="unique_id"):
+        """Sql generating the unique ids of each pair.
+
+        Rather than the band join in `blocking_rule`, each record is joined
+        to the records at each offset of the window with an equi-join on the
+        rank, using a table of offsets from the dialect base. Pairs generated
+        by `preceding_rules` are excluded.
+        """
+        self._require_sql()
+        offsets = self._dialect_base()._offsets_table_sql(
+            self.window_size, "__splink__offsets", "__splink__offset"
+        )
+        # Preceding rules may be BlockingRules or sql strings
+        preceding_sql = [getattr(r, "blocking_rule", r) for r in self.preceding_rules]
+        exclusions = "".join(
+            f"\n            and not coalesce(({sql}), false)" for sql in preceding_sql
+        )
+        uid = f'"{unique_id_column_name}"'
+        rank = f'"{SORT_RANK_COLUMN_NAME}"'
+        return f"""
+            with __splink__ranked as (
+                {self.rank_sql(table_name, unique_id_column_name)}
+            )
+            select l.{uid} as "{unique_id_column_name}_l",
+                r.{uid} as "{unique_id_column_name}_r"
+            from __splink__ranked as l
+            cross join {offsets}
+            inner join __splink__ranked as r
+            on r.{rank} = l.{rank} + __splink__offsets.__splink__offset
+            where true{exclusions}
+        """
+
+    def __repr__(self):
+        return (
+            f"<Sorted neighbourhood blocking on '{self.col_name}', "
+            f"window size {self.window_size}>"
+        )
+
+
+@dataclass
+class minhash_lsh_rule(BlockingRule):
+    """Blocks on the MinHash signatures of the character n-grams of a
+    column, for free text such as addresses, where exact matches are rare
+    but a cartesian product is too large.
+
+    Each record's signature is made up of `num_bands * rows_per_band`
+    MinHashes, each the minimum over its n-grams of a differently seeded
+    hash. Two records are paired if every MinHash in any one band is equal.
+    A pair of records with Jaccard similarity s on their n-grams is paired
+    with probability 1 - (1 - s ** rows_per_band) ** num_bands, so more rows
+    per band make the rule stricter, and more bands make it looser.
+
+    Each band is an equi-join on a band key, added to the input tables with
+    band_keys_sql, and each band's join excludes the pairs of the bands
+    before it.
+
+    > rule = minhash_lsh_rule("address", num_bands=20, rows_per_band=4)
+    > rule.sql_dialect = "duckdb"
+    > rule.band_keys_sql("people")
+    > rule.band_blocking_rules  # one equi-join per band
+
+    Records with a null value are not paired.
+    """
+
+    col_name: str
+    num_bands: int = 20
+    rows_per_band: int = 5
+    ngram_size: int = 3
+    seed: int = 0
+    salting_partitions: int = 1
+
+    @property
+    def generate_sql(self):
+        if self._sql_dialect:
+            syntax_tree = parse_one_cached(
+                self.col_name, self._sql_dialect, copy=False
+            )
+            self._key_sql = add_quotes_and_table_prefix(syntax_tree, None).sql(
+                self._sql_dialect
+            )
+
+            # A single condition describing the whole rule. Run
+            # band_blocking_rules instead, as a single join on this would
+            # need a nested loop.
+            blocking_rule = " or ".join(
+                f"({self._band_sql(band)})" for band in range(self.num_bands)
+            )
+            self._description = "MinHash LSH"
+
+            preceding_rules = getattr(self, "preceding_rules", [])
+            super().__init__(
+                blocking_rule,
+                salting_partitions=self.salting_partitions,
+                sqlglot_dialect=self._sql_dialect,
+            )
+            self.preceding_rules = preceding_rules
+        else:
+            raise ValueError(
+                "No SQL dialect found. Please ensure you supply a dialect."
+            )
+
+    def _require_sql(self):
+        if getattr(self, "_blocking_rule", None) is None:
+            raise ValueError(
+                "No SQL dialect found. Please ensure you supply a dialect."
+            )
+
+    @property
+    def num_hashes(self):
+        return self.num_bands * self.rows_per_band
+
+    @property
+    def band_column_names(self):
+        return [f"{BAND_COLUMN_PREFIX}{band}" for band in range(self.num_bands)]
+
+    def hash_seeds(self, band):
+        """The seeds of the hashes making up one band of the signature."""
+        first = self.seed * self.num_hashes + band * self.rows_per_band
+        return list(range(first, first + self.rows_per_band))
+
+    def candidate_probability(self, jaccard_similarity):
+        """The probability that a pair with the given Jaccard similarity on
+        their n-grams is paired by the rule."""
+        s = jaccard_similarity**self.rows_per_band
+        return 1 - (1 - s) ** self.num_bands
+
+    @property
+    def similarity_threshold(self):
+        """The approximate Jaccard similarity at which pairs go from
+        unlikely to likely to be paired."""
+        return (1 / self.num_bands) ** (1 / self.rows_per_band)
+
+    def _band_sql(self, band):
+        column = self.band_column_names[band]
+        return f'l."{column}" = r."{column}"'
+
+    def band_keys_sql(self, table_name, unique_id_column_name="unique_id"):
+        """Sql adding a band key column for each band to an input table,
+        using the MinHash functions of the rule's dialect base. Run
+        band_blocking_rules against the result.
+        """
+        self._require_sql()
+        try:
+            dialect_base = _dialect_base_factory(self._sql_dialect)()
+        except ValueError:
+            dialect_base = DialectBase()
+        bands = [
+            (column, self.hash_seeds(band))
+            for band, column in enumerate(self.band_column_names)
+        ]
+        band_keys = dialect_base._minhash_band_keys_sql(
+            table_name,
+            unique_id_column_name,
+            self._key_sql,
+            self.ngram_size,
+            bands,
+        )
+        columns = ", ".join(f'b."{column}"' for column, _ in bands)
+        return f"""
+            select t.*, {columns}
+            from {table_name} as t
+            left join ({band_keys}) as b
+            using ("{unique_id_column_name}")
+        """
+
+    @property
+    def band_blocking_rules(self):
+        """One equi-join rule per band, each excluding the pairs generated
+        by the bands before it."""
+        self._require_sql()
+        rules = []
+        for band in range(self.num_bands):
+            rule = BlockingRule(
+                self._band_sql(band),
+                salting_partitions=self.salting_partitions,
+                sqlglot_dialect=self._sql_dialect,
+            )
+            rule.preceding_rules = self.preceding_rules + rules
+            rules.append(rule)
+        return rules
+
+    def __repr__(self):
+        return (
+            f"<MinHash LSH blocking on '{self.col_name}', {self.num_bands} "
+            f"bands of {self.rows_per_band} rows>"
+        )
+
+
+# Scratch examples, only run when this file is run directly
+if __name__ == "__main__":
+    t = exact_match_rule("test")
+    t.sql_dialect # blank
 
-# Set the dialect to "duckdb"
-t.sql_dialect = "duckdb"
-t.blocking_rule
-t
+    # Set the dialect to "duckdb"
+    t.sql_dialect = "duckdb"
+    t.blocking_rule
+    t
 
-# Dynamically change the sql
-t.sql_dialect = "spark"
-t.blocking_rule
+    # Dynamically change the sql
+    t.sql_dialect = "spark"
+    t.blocking_rule
@@ -0,0 +1,344 @@
+"""Blocking rules composed from AND and OR of exact matches on keys.
+
+> rule = or_(
+>     and_("first_name", "surname"),
+>     and_(substr_key("postcode", 1, 4), "dob"),
+> )
+> rule.sql_dialect = "duckdb"
+> rule.blocking_rules  # one equi-join per branch
+
+A rule is held in disjunctive normal form, as a list of branches, each of
+which is an AND of key equalities. Duplicate keys within a branch and
+branches implied by others are removed, and each branch is compiled into its
+own equi-join, with the earlier branches as its `preceding_rules`. As every
+branch has at least one key equality, no join ever needs a cartesian
+product, unlike a single join on `... or ...`, which most engines run as a
+nested loop.
+"""
+
+from dataclasses import dataclass
+
+import sqlglot.expressions as exp
+from sqlglot.optimizer.normalize import normalize
+
+from blocking.blocking_keys import blocking_keys
+from blocking.blocking_rule_builder import BlockingRule, exact_match_rule
+from comp_level_factories.dialect_factories.dialect_base_classes import (
+    _dialect_base_factory,
+)
+from splink.sql_transform import add_quotes_and_table_prefix, parse_one_cached
+
+# Prefix of the key columns added by CompositeBlockingRule.key_columns_sql
+KEY_COLUMN_PREFIX = "__splink__key_"
+
+
+@dataclass(frozen=True)
+class BlockingKey:
+    """A key expression on a single record, e.g. the first four characters
+    of a postcode. Two records match on a key if their keys are equal.
+    """
+
+    col_name: str
+
+    def _expression(self, dialect_base):
+        return self.col_name
+
+    def expression(self, sql_dialect):
+        """The key as sql on an unprefixed input table."""
+        dialect_base = None
+        try:
+            dialect_base = _dialect_base_factory(sql_dialect)()
+        except ValueError:
+            # Keys which don't need dialect specific functions can still be
+            # rendered in any sqlglot dialect
+            pass
+        tree = parse_one_cached(self._expression(dialect_base), sql_dialect)
+        return tree.sql(sql_dialect)
+
+    def sql(self, table_name, sql_dialect):
+        """The key as sql on a prefixed table, e.g. l."surname"."""
+        syntax_tree = parse_one_cached(self.expression(sql_dialect), sql_dialect)
+        return add_quotes_and_table_prefix(syntax_tree, table_name).sql(sql_dialect)
+
+    def _require_dialect_base(self, dialect_base):
+        if dialect_base is None:
+            raise ValueError(
+                f"{type(self).__name__} needs a dialect with a dialect base, "
+                "e.g. duckdb or postgres."
+            )
+        return dialect_base
+
+
+@dataclass(frozen=True)
+class column_key(BlockingKey):
+    pass
+
+
+@dataclass(frozen=True)
+class substr_key(BlockingKey):
+    start: int = 1
+    length: int = 1
+
+    def _expression(self, dialect_base):
+        return f"substr({self.col_name}, {self.start}, {self.length})"
+
+
+@dataclass(frozen=True)
+class soundex_key(BlockingKey):
+    def _expression(self, dialect_base):
+        dialect_base = self._require_dialect_base(dialect_base)
+        return f"{dialect_base._soundex_function_name}({self.col_name})"
+
+
+@dataclass(frozen=True)
+class regex_extract_key(BlockingKey):
+    regex: str = ""
+
+    def _expression(self, dialect_base):
+        dialect_base = self._require_dialect_base(dialect_base)
+        return dialect_base._regex_extract_function(self.col_name, self.regex).strip()
+
+
+def _branches(rule):
+    # The rule in disjunctive normal form, as a list of tuples of keys
+    if isinstance(rule, CompositeBlockingRule):
+        return list(rule.branches)
+    if isinstance(rule, BlockingKey):
+        return [(rule,)]
+    if isinstance(rule, exact_match_rule):
+        return [(column_key(rule.col_name),)]
+    if isinstance(rule, str):
+        return [(column_key(rule),)]
+    raise TypeError(
+        f"Cannot compose {rule!r}. Use split_or_blocking_rule for blocking "
+        "rules written in sql."
+    )
+
+
+def _minimal_branches(branches):
+    # Removes duplicate keys within each branch, and any branch whose keys
+    # include all of the keys of another, as its pairs are a subset of the
+    # other's
+    branches = [tuple(dict.fromkeys(b)) for b in branches]
+    minimal = []
+    for branch in branches:
+        keys = set(branch)
+        if any(set(other) <= keys for other in minimal):
+            continue
+        minimal = [other for other in minimal if not keys <= set(other)]
+        minimal.append(branch)
+    return minimal
+
+
+def _dialect_of(rules):
+    for rule in rules:
+        dialect = getattr(rule, "sql_dialect", None)
+        if dialect:
+            return dialect
+    return None
+
+
+class CompositeBlockingRule(BlockingRule):
+    """An OR of branches, each an AND of exact matches on keys. Build with
+    and_ and or_ rather than directly.
+
+    Args:
+        branches (list[tuple[BlockingKey]]): The branches of the rule.
+        salting_partitions (int, optional): Defaults to 1.
+        sqlglot_dialect (str, optional): Defaults to None.
+    """
+
+    def __init__(self, branches, salting_partitions=1, sqlglot_dialect=None):
+        self.branches = _minimal_branches(branches)
+        if not self.branches or not all(self.branches):
+            raise ValueError(
+                "Every branch of a composite blocking rule needs at least one "
+                "key, or it would need a cartesian product."
+            )
+        super().__init__(
+            None,
+            salting_partitions=salting_partitions,
+            sqlglot_dialect=sqlglot_dialect,
+        )
+        if sqlglot_dialect:
+            self.generate_sql
+
+    @property
+    def distinct_keys(self):
+        """Every key used by the rule, each once, however many branches use
+        it."""
+        return list(dict.fromkeys(k for branch in self.branches for k in branch))
+
+    def _branch_sql(self, branch, key_sql):
+        return " and ".join(f"{key_sql(k, 'l')} = {key_sql(k, 'r')}" for k in branch)
+
+    def _rules_from_branches(self, key_sql):
+        rules = []
+        for branch in self.branches:
+            rule = BlockingRule(
+                self._branch_sql(branch, key_sql),
+                salting_partitions=self.salting_partitions,
+                sqlglot_dialect=self._sql_dialect,
+            )
+            rule.preceding_rules = self.preceding_rules + rules
+            rules.append(rule)
+        return rules
+
+    @property
+    def generate_sql(self):
+        if not self._sql_dialect:
+            raise ValueError(
+                "No SQL dialect found. Please ensure you supply a dialect."
+            )
+
+        dialect = self._sql_dialect
+        self._key_sql = {
+            (key, side): key.sql(side, dialect)
+            for key in self.distinct_keys
+            for side in ("l", "r")
+        }
+        # A single condition describing the whole rule. Run blocking_rules
+        # instead, as a single join on this would need a nested loop.
+        self._blocking_rule = " or ".join(
+            f"({self._branch_sql(branch, self._key_sql_for)})"
+            for branch in self.branches
+        )
+
+    def _key_sql_for(self, key, side):
+        return self._key_sql[(key, side)]
+
+    @property
+    def blocking_rules(self):
+        """One equi-join rule per branch, each excluding the pairs generated
+        by the branches before it."""
+        if self._blocking_rule is None:
+            raise ValueError(
+                "No SQL dialect found. Please ensure you supply a dialect."
+            )
+        return self._rules_from_branches(self._key_sql_for)
+
+    def key_column_name(self, key):
+        return f"{KEY_COLUMN_PREFIX}{self.distinct_keys.index(key)}"
+
+    def key_columns_sql(self, table_name):
+        """Sql adding a column for each distinct key to an input table, so
+        each key is computed once per record rather than once per branch and
+        side of every join using it. Run keyed_blocking_rules against the
+        result.
+        """
+        columns = [
+            f'{key.expression(self._sql_dialect)} as "{self.key_column_name(key)}"'
+            for key in self.distinct_keys
+        ]
+        return f"select *, {', '.join(columns)} from {table_name}"
+
+    @property
+    def keyed_blocking_rules(self):
+        """As blocking_rules, but joining on the columns added by
+        key_columns_sql."""
+        return self._rules_from_branches(
+            lambda key, side: f'{side}."{self.key_column_name(key)}"'
+        )
+
+    def __repr__(self):
+        branches = " OR ".join(
+            "(" + " AND ".join(repr(k) for k in branch) + ")"
+            for branch in self.branches
+        )
+        return f"<Composite blocking on {branches}>"
+
+
+def and_(*rules, salting_partitions=1) -> CompositeBlockingRule:
+    """Blocks on pairs matching all of the rules.
+
+    Args:
+        *rules: Column names, BlockingKeys, exact_match_rules or composite
+            rules.
+        salting_partitions (int, optional): Defaults to 1.
+
+    Returns:
+        CompositeBlockingRule: The combined rule.
+    """
+    branches = [()]
+    for rule in rules:
+        branches = [a + b for a in branches for b in _branches(rule)]
+    return CompositeBlockingRule(branches, salting_partitions, _dialect_of(rules))
+
+
+def or_(*rules, salting_partitions=1) -> CompositeBlockingRule:
+    """Blocks on pairs matching any of the rules.
+
+    Args:
+        *rules: Column names, BlockingKeys, exact_match_rules or composite
+            rules.
+        salting_partitions (int, optional): Defaults to 1.
+
+    Returns:
+        CompositeBlockingRule: The combined rule.
+    """
+    branches = [b for rule in rules for b in _branches(rule)]
+    return CompositeBlockingRule(branches, salting_partitions, _dialect_of(rules))
+
+
+def _or_terms(tree):
+    if isinstance(tree, exp.Paren):
+        return _or_terms(tree.this)
+    if isinstance(tree, exp.Or):
+        return _or_terms(tree.left) + _or_terms(tree.right)
+    return [tree]
+
+
+def split_or_blocking_rule(blocking_rule, sql_dialect=None, salting_partitions=1):
+    """Splits a blocking rule written in sql with ORs into a list of
+    equi-join rules, each excluding the pairs of the ones before it.
+
+    > split_or_blocking_rule(
+    >     "l.dob = r.dob and (l.surname = r.surname or l.postcode = r.postcode)",
+    >     "duckdb",
+    > )
+    > -> rules on `l.dob = r.dob and l.surname = r.surname` and
+    >    `l.dob = r.dob and l.postcode = r.postcode`
+
+    Args:
+        blocking_rule (str): The blocking rule's sql.
+        sql_dialect (str, optional): The dialect of the sql. Defaults to None.
+        salting_partitions (int, optional): Defaults to 1.
+
+    Returns:
+        list[BlockingRule]: The rules.
+
+    Raises:
+        ValueError: If a branch of the rule has no equality between the left
+            and right records, as its join would need a cartesian product.
+    """
+    tree = normalize(parse_one_cached(blocking_rule, sql_dialect), dnf=True)
+
+    branches = []
+    for term in _or_terms(tree):
+        sql = term.sql(sql_dialect)
+        if not blocking_keys(sql, sql_dialect).keys_l:
+            raise ValueError(
+                f"The branch `{sql}` of blocking rule `{blocking_rule}` has no "
+                "equality between l and r, so would need a cartesian product."
+            )
+        conditions = term.flatten() if isinstance(term, exp.And) else [term]
+        branches.append(
+            (frozenset(c.sql(sql_dialect) for c in conditions), sql)
+        )
+
+    # As in _minimal_branches, drop branches implied by another
+    minimal = []
+    for conditions, sql in branches:
+        if any(other <= conditions for other, _ in minimal):
+            continue
+        minimal = [(o, s) for o, s in minimal if not conditions <= o]
+        minimal.append((conditions, sql))
+
+    rules = []
+    for _, sql in minimal:
+        rule = BlockingRule(
+            sql, salting_partitions=salting_partitions, sqlglot_dialect=sql_dialect
+        )
+        rule.preceding_rules = list(rules)
+        rules.append(rule)
+    return rules
@@ -0,0 +1,405 @@
+"""Generates the candidate pairs of a blocking rule locally, without a sql
+self-join.
+
+Records are indexed on the codes of their blocking keys (see
+blocking_keys.key_codes), by sorting them so each key group is contiguous.
+Pairs are then generated group by group, in order, as a flat sequence that
+is cut into batches of a fixed size, so memory is bounded by the batch size
+however large the groups are.
+
+Pairs already generated by a rule's `preceding_rules` are skipped by
+comparing the records' key codes for those rules, so no anti-join against
+the earlier rules' output is needed. Only conditions other than key
+equalities, e.g. `l.dob < r.dob`, are checked with sql, on each batch.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+from blocking.blocking_keys import as_arrow_table, blocking_keys, key_codes
+from blocking.blocking_rule_builder import SALT_COLUMN_NAME
+
+# Default number of pairs generated per record batch
+DEFAULT_BATCH_SIZE = 1_000_000
+
+
+class _PairIndex:
+    # Each record's partners form a contiguous run of sorted positions on
+    # the other side. Records are numbered by their sorted position, and the
+    # pairs of record p are (p, first_partner[p] + k) for k < num_partners[p].
+
+    def __init__(self, first_partner, num_partners, order_l, order_r):
+        self.first_partner = first_partner
+        self.ends = np.cumsum(num_partners)
+        self.starts = self.ends - num_partners
+        self.order_l = order_l
+        self.order_r = order_r
+
+    @property
+    def num_pairs(self):
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    def pairs(self, start, end):
+        # The rows of pairs [start, end) of the flat sequence of pairs
+        flat = np.arange(start, end)
+        record = np.searchsorted(self.ends, flat, side="right")
+        partner = self.first_partner[record] + (flat - self.starts[record])
+        return self.order_l[record], self.order_r[partner]
+
+    def restricted_to(self, records):
+        # Keeps only the pairs of some records, given as a mask over their
+        # sorted positions
+        num_partners = np.where(records, self.ends - self.starts, 0)
+        return _PairIndex(self.first_partner, num_partners, self.order_l, self.order_r)
+
+
+def _sorted_groups(codes):
+    # Sorts the non-null records by key code, so each group is contiguous
+    order = np.flatnonzero(codes >= 0)
+    order = order[np.argsort(codes[order], kind="stable")]
+    return order, codes[order]
+
+
+def _dedupe_index(codes):
+    order, sorted_codes = _sorted_groups(codes)
+    positions = np.arange(len(order))
+    # Each record is paired with the records after it in its group
+    group_end = np.searchsorted(sorted_codes, sorted_codes, side="right")
+    return _PairIndex(positions + 1, group_end - positions - 1, order, order)
+
+
+def _link_index(codes_l, codes_r):
+    order_l, sorted_l = _sorted_groups(codes_l)
+    order_r, sorted_r = _sorted_groups(codes_r)
+    # Each left record is paired with every right record in its group
+    group_start = np.searchsorted(sorted_r, sorted_l, side="left")
+    group_end = np.searchsorted(sorted_r, sorted_l, side="right")
+    return _PairIndex(group_start, group_end - group_start, order_l, order_r)
+
+
+def _salt_partitions(table, num_partitions):
+    # The salting partition of each record, from its salt column as in
+    # BlockingRule.salt_predicate, or if it has none from salts drawn with a
+    # fixed seed, so that separate processes agree on the partitions
+    if SALT_COLUMN_NAME in table.column_names:
+        salt = table.column(SALT_COLUMN_NAME).to_numpy()
+    else:
+        salt = np.random.default_rng(0).random(table.num_rows)
+    partitions = np.ceil(salt * num_partitions).astype(np.int64) - 1
+    return np.maximum(partitions, 0)
+
+
+def _preceding_rules(blocking_rule, preceding_rules, sql_dialect):
+    if preceding_rules is None:
+        preceding_rules = getattr(blocking_rule, "preceding_rules", [])
+    return [blocking_keys(rule, sql_dialect) for rule in preceding_rules]
+
+
+def _residual_filter_sql(keys, preceding_keys):
+    # Conditions which can't be checked from key codes are checked with sql
+    # on each batch: the rule's own residual conditions, and whether a
+    # preceding rule with residual conditions has already generated the pair
+    conditions = []
+    if keys.has_residual:
+        conditions.append(keys.residual_sql_on_pairs("duckdb"))
+    for preceding in preceding_keys:
+        preceding_sql = preceding.rule_sql_on_pairs("duckdb")
+        conditions.append(f"not coalesce({preceding_sql}, false)")
+    return " and ".join(conditions) if conditions else None
+
+
+def _pair_table(table_l, table_r, rows_l, rows_r, columns):
+    left = table_l.select(columns).take(rows_l)
+    right = table_r.select(columns).take(rows_r)
+    arrays, names = [], []
+    for col in columns:
+        arrays.extend([left.column(col), right.column(col)])
+        names.extend([f"{col}_l", f"{col}_r"])
+    return pa.table(arrays, names=names)
+
+
+class _LocalJoin:
+    # The blocking index of a rule over a set of records, and everything
+    # needed to turn ranges of its pairs into record batches. Workers in
+    # block_pairs_salted each receive a copy, so only the parent process
+    # indexes the records.
+
+    def __init__(
+        self,
+        blocking_rule,
+        table,
+        table_r=None,
+        columns=None,
+        unique_id_column_name="unique_id",
+        preceding_rules=None,
+        sql_dialect=None,
+    ):
+        keys = blocking_keys(blocking_rule, sql_dialect)
+        preceding_keys = _preceding_rules(blocking_rule, preceding_rules, sql_dialect)
+
+        self.table_l = as_arrow_table(table)
+        self.table_r = (
+            self.table_l if table_r is None else as_arrow_table(table_r)
+        )
+        self.is_dedupe = self.table_r is self.table_l
+        self.is_symmetric_dedupe = self.is_dedupe and keys.is_symmetric
+
+        if columns is None:
+            columns = [
+                c for c in self.table_l.column_names if c != SALT_COLUMN_NAME
+            ]
+        self.columns = list(columns)
+        if unique_id_column_name not in self.columns:
+            self.columns.insert(0, unique_id_column_name)
+
+        # Kept so that later rules can skip this rule's pairs without
+        # encoding its keys again, as in block_pairs_minhash
+        self.codes = codes_l, codes_r = self._codes(keys)
+        if self.is_symmetric_dedupe:
+            self.index = _dedupe_index(codes_l)
+        else:
+            # Deduplicating with keys which differ between the sides, e.g.
+            # l.first_name = r.surname, each pair is generated in both orders
+            self.index = _link_index(codes_l, codes_r)
+
+        # Preceding rules made up only of key equalities are checked from key
+        # codes, and any others with sql
+        self.preceding_codes = [
+            self._codes(p) for p in preceding_keys if not p.has_residual
+        ]
+        self.filter_sql = _residual_filter_sql(
+            keys, [p for p in preceding_keys if p.has_residual]
+        )
+        self.filter_columns = self.columns
+        if self.filter_sql:
+            self.filter_columns = list(
+                dict.fromkeys(self.columns + self.table_l.column_names)
+            )
+
+        self.uid_l = self.table_l.column(unique_id_column_name).to_numpy()
+        self.uid_r = self.table_r.column(unique_id_column_name).to_numpy()
+
+    def _codes(self, rule_keys):
+        if self.is_dedupe and rule_keys.is_symmetric:
+            (codes,), _ = key_codes([self.table_l], [rule_keys.keys_l])
+            return codes, codes
+        (codes_l, codes_r), _ = key_codes(
+            [self.table_l, self.table_r], [rule_keys.keys_l, rule_keys.keys_r]
+        )
+        return codes_l, codes_r
+
+    def salted_index(self, partition, num_partitions):
+        salt_partitions = _salt_partitions(self.table_l, num_partitions)
+        return self.index.restricted_to(
+            salt_partitions[self.index.order_l] == partition
+        )
+
+    def pairs(self, index, start, end):
+        # The pairs [start, end) of the index, as a table
+        rows_l, rows_r = index.pairs(start, end)
+        uid_l, uid_r = self.uid_l, self.uid_r
+
+        if self.is_symmetric_dedupe:
+            # Put the lower unique id on the left
+            swap = uid_l[rows_l] > uid_r[rows_r]
+            rows_l, rows_r = (
+                np.where(swap, rows_r, rows_l),
+                np.where(swap, rows_l, rows_r),
+            )
+            keep = np.ones(len(rows_l), dtype=bool)
+        elif self.is_dedupe:
+            # Keep the order with the lower unique id on the left, which also
+            # drops records paired with themselves
+            keep = uid_l[rows_l] < uid_r[rows_r]
+        else:
+            keep = np.ones(len(rows_l), dtype=bool)
+
+        for preceding_l, preceding_r in self.preceding_codes:
+            preceding_code = preceding_l[rows_l]
+            keep &= ~((preceding_code >= 0) & (preceding_code == preceding_r[rows_r]))
+        rows_l, rows_r = rows_l[keep], rows_r[keep]
+
+        pairs = _pair_table(
+            self.table_l, self.table_r, rows_l, rows_r, self.filter_columns
+        )
+        if self.filter_sql and len(rows_l):
+            con = duckdb.connect()
+            con.register("__splink__local_pairs", pairs)
+            pairs = con.execute(
+                f"select * from __splink__local_pairs where {self.filter_sql}"
+            ).to_arrow_table()
+        return pairs.select(
+            [f"{col}_{side}" for col in self.columns for side in ("l", "r")]
+        )
+
+    def batches(self, index, start, end, batch_size):
+        for batch_start in range(start, end, batch_size):
+            pairs = self.pairs(index, batch_start, min(batch_start + batch_size, end))
+            if pairs.num_rows:
+                yield from pairs.to_batches()
+
+
+def block_pairs_local(
+    blocking_rule,
+    table,
+    table_r=None,
+    columns=None,
+    unique_id_column_name="unique_id",
+    preceding_rules=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    sql_dialect=None,
+    salt_partition=None,
+):
+    """Generates the candidate pairs of a blocking rule, as a stream of
+    record batches.
+
+    Each batch has `_l` and `_r` versions of the requested columns, as
+    expected by the comparison engines in `execution`, e.g.
+
+    > rule = exact_match_rule("surname")
+    > rule.sql_dialect = "duckdb"
+    > for batch in block_pairs_local(rule, people):
+    >     engine.compute_comparison_vectors(batch, comparisons)
+
+    Deduplicating, each pair is generated once, with the lower unique id on
+    the left.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records to
+            deduplicate, or the left records to link.
+        table_r (pyarrow.Table | pandas.DataFrame | dict, optional): The
+            right records to link to. Defaults to None, which deduplicates
+            `table`.
+        columns (list[str], optional): The columns to include in each pair.
+            Defaults to all columns.
+        unique_id_column_name (str, optional): The unique id column.
+            Defaults to "unique_id".
+        preceding_rules (list, optional): Rules whose pairs should be
+            skipped. Defaults to the blocking rule's `preceding_rules`.
+        batch_size (int, optional): The number of pairs generated per batch.
+            Batches are smaller where pairs are skipped or filtered out.
+            Defaults to 1,000,000.
+        sql_dialect (str, optional): The dialect of any sql strings passed.
+            Defaults to None.
+        salt_partition (tuple[int, int], optional): A (partition,
+            num_partitions) pair. If set, only generate the pairs in this
+            salting partition. Defaults to None.
+
+    Yields:
+        pyarrow.RecordBatch: Batches of candidate pairs.
+    """
+    join = _LocalJoin(
+        blocking_rule,
+        table,
+        table_r,
+        columns,
+        unique_id_column_name,
+        preceding_rules,
+        sql_dialect,
+    )
+    index = join.index
+    if salt_partition is not None:
+        index = join.salted_index(*salt_partition)
+    yield from join.batches(index, 0, index.num_pairs, batch_size)
+
+
+# The join each worker process generates pairs from, sent once per process
+# rather than with every task, and its index for each salting partition
+_worker_state = {}
+
+
+def _init_worker(join, num_partitions):
+    _worker_state["join"] = join
+    _worker_state["num_partitions"] = num_partitions
+    _worker_state["indexes"] = {}
+
+
+def _pairs_task(partition, start, end, batch_size):
+    join, indexes = _worker_state["join"], _worker_state["indexes"]
+    if partition not in indexes:
+        indexes[partition] = join.salted_index(
+            partition, _worker_state["num_partitions"]
+        )
+    return list(join.batches(indexes[partition], start, end, batch_size))
+
+
+def block_pairs_salted(
+    blocking_rule,
+    table,
+    table_r=None,
+    salting_partitions=None,
+    max_workers=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    **kwargs,
+):
+    """Generates the candidate pairs of a salted blocking rule, running the
+    salting partitions concurrently on a process pool.
+
+    Each partition holds the pairs whose left record has a salt in that
+    partition, as in BlockingRule.salted_blocking_rules, so the records of a
+    large key group are spread across every partition rather than all being
+    paired up by one process. Records are indexed once, in this process, and
+    each partition is then generated as a series of tasks of `batch_size`
+    pairs. Only a few tasks per worker are in flight at once, so memory use
+    is bounded by the batch size rather than the size of a partition.
+
+    > rule = exact_match_rule("surname", salting_partitions=8)
+    > rule.sql_dialect = "duckdb"
+    > for batch in block_pairs_salted(rule, people, max_workers=8):
+    >     ...
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records to
+            deduplicate, or the left records to link.
+        table_r (pyarrow.Table | pandas.DataFrame | dict, optional): The
+            right records to link to. Defaults to None, which deduplicates
+            `table`.
+        salting_partitions (int, optional): The number of partitions.
+            Defaults to the rule's `salting_partitions`.
+        max_workers (int, optional): The number of worker processes.
+            Defaults to the number of processors.
+        batch_size (int, optional): The number of pairs generated per batch.
+            Defaults to 1,000,000.
+        **kwargs: Passed on to block_pairs_local, e.g. `columns`.
+
+    Yields:
+        pyarrow.RecordBatch: Batches of candidate pairs, in the order they
+            complete.
+    """
+    if salting_partitions is None:
+        salting_partitions = getattr(blocking_rule, "salting_partitions", 1)
+
+    join = _LocalJoin(blocking_rule, table, table_r, **kwargs)
+    tasks = []
+    for partition in range(salting_partitions):
+        num_pairs = join.salted_index(partition, salting_partitions).num_pairs
+        for start in range(0, num_pairs, batch_size):
+            end = min(start + batch_size, num_pairs)
+            tasks.append((partition, start, end, batch_size))
+
+    max_workers = max_workers or os.cpu_count()
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(join, salting_partitions),
+    ) as executor:
+        max_in_flight = 2 * max_workers
+        pending = set()
+        tasks = iter(tasks)
+        while True:
+            for task in tasks:
+                pending.add(executor.submit(_pairs_task, *task))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
@@ -0,0 +1,219 @@
+"""Generates the pairs of a minhash_lsh_rule locally.
+
+Strings are concatenated into a single array of code points, so the hash of
+every character n-gram of every string is computed at once, and each
+MinHash is a `np.minimum.reduceat` of a seeded permutation of the n-gram
+hashes over each string's run of n-grams. Each distinct string is hashed once.
+
+The MinHashes of each band are then hashed together into a band key column,
+and each band is blocked on as an equi-join, skipping the pairs of earlier
+bands, so each pair is generated once. Each band's key codes are computed
+once, by its own join, and reused to skip its pairs in the later bands.
+
+The hashes differ from those of DuckDB's `hash`, so the band keys, and hence
+the pairs of rare near misses, differ from those of rule.band_keys_sql, but
+the probability of a pair being generated is the same.
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from blocking.blocking_keys import as_arrow_table, evaluate_keys
+from blocking.blocking_rule_builder import BlockingRule, SALT_COLUMN_NAME
+from blocking.local_join import DEFAULT_BATCH_SIZE, _LocalJoin
+from splink.sql_transform import parse_one_cached
+
+# Multipliers of the splitmix64 finaliser, used to mix hashes
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+# Multiplier combining a sequence of values into a single hash
+_COMBINE = np.uint64(0x100000001B3)
+
+# Strings hashed per chunk, bounding the memory used by their n-grams
+_CHUNK_SIZE = 100_000
+
+
+def _mix(x):
+    # Overflow wraps, as wanted, for uint64 arrays
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+def _ngram_hashes(strings, ngram_size):
+    # The hash of every n-gram of the strings, and the index of each string's
+    # first n-gram. Strings are separated by ngram_size - 1 null characters,
+    # so strings shorter than ngram_size give a single n-gram padded with
+    # nulls, and no n-gram spans two strings.
+    padding = "\0" * (ngram_size - 1)
+    text = padding.join(strings) + padding
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    codes = codes.astype(np.uint64)
+
+    lengths = np.fromiter((len(s) for s in strings), np.int64, len(strings))
+    string_starts = np.cumsum(lengths + ngram_size - 1) - (lengths + ngram_size - 1)
+    num_ngrams = np.maximum(lengths - ngram_size + 1, 1)
+    ngram_starts = np.cumsum(num_ngrams) - num_ngrams
+
+    offsets = np.arange(num_ngrams.sum()) - np.repeat(ngram_starts, num_ngrams)
+    positions = np.repeat(string_starts, num_ngrams) + offsets
+
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(ngram_size):
+        hashes = hashes * _COMBINE + codes[positions + j]
+    return _mix(hashes), ngram_starts
+
+
+def hash_seeds(blocking_rule):
+    """The seeds of the rule's hashes, as mixed uint64s, one row per band."""
+    seeds = np.arange(blocking_rule.num_hashes, dtype=np.uint64)
+    seeds += np.uint64(blocking_rule.seed * blocking_rule.num_hashes)
+    return _mix(seeds + _MIX_2).reshape(
+        blocking_rule.num_bands, blocking_rule.rows_per_band
+    )
+
+
+def minhash_signatures(strings, ngram_size, seeds):
+    """The MinHash signature of each string.
+
+    Args:
+        strings (list[str]): The strings.
+        ngram_size (int): The number of characters in each n-gram.
+        seeds (numpy.ndarray): A uint64 seed for each MinHash.
+
+    Returns:
+        numpy.ndarray: A uint64 array of shape (len(strings), len(seeds)).
+    """
+    seeds = np.asarray(seeds, dtype=np.uint64).ravel()
+    # As the n-gram hashes are already mixed, each MinHash permutes them with
+    # a multiply-add, an odd multiplier making it a bijection. This is a few
+    # times faster than mixing them again for every seed.
+    multipliers = seeds | np.uint64(1)
+    increments = _mix(seeds)
+    signatures = np.empty((len(strings), len(seeds)), dtype=np.uint64)
+    for start in range(0, len(strings), _CHUNK_SIZE):
+        end = min(start + _CHUNK_SIZE, len(strings))
+        hashes, ngram_starts = _ngram_hashes(strings[start:end], ngram_size)
+        for k in range(len(seeds)):
+            signatures[start:end, k] = np.minimum.reduceat(
+                hashes * multipliers[k] + increments[k], ngram_starts
+            )
+    return signatures
+
+
+def band_keys(signatures, rows_per_band):
+    """Hashes the MinHashes of each band of the signatures into a key.
+
+    Returns:
+        numpy.ndarray: A uint64 array with a column per band.
+    """
+    num_bands = signatures.shape[1] // rows_per_band
+    bands = signatures.reshape(len(signatures), num_bands, rows_per_band)
+    keys = np.zeros((len(signatures), num_bands), dtype=np.uint64)
+    for j in range(rows_per_band):
+        keys = _mix(keys * _COMBINE + bands[:, :, j])
+    return keys
+
+
+def add_band_keys(blocking_rule, table):
+    """Adds the rule's band key columns to a table, null for null values.
+
+    Args:
+        blocking_rule (minhash_lsh_rule): The rule.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records.
+
+    Returns:
+        pyarrow.Table: The records with a column for each band.
+    """
+    table = as_arrow_table(table)
+    key = parse_one_cached(blocking_rule.col_name, blocking_rule.sql_dialect)
+    (values,) = evaluate_keys(table, [key])
+    values = pc.cast(values, pa.string())
+    valid = pc.is_valid(values).to_numpy(zero_copy_only=False)
+
+    # Hash each distinct string once
+    encoded = pc.dictionary_encode(values).combine_chunks()
+    strings = encoded.dictionary.to_pylist()
+    signatures = minhash_signatures(
+        strings, blocking_rule.ngram_size, hash_seeds(blocking_rule)
+    )
+    keys = band_keys(signatures, blocking_rule.rows_per_band)
+    indices = encoded.indices.fill_null(0).to_numpy()
+
+    mask = ~valid
+    for band, column in enumerate(blocking_rule.band_column_names):
+        band_key = (
+            keys[indices, band] if len(strings) else np.zeros(len(valid), np.uint64)
+        )
+        table = table.append_column(
+            column, pa.array(band_key, type=pa.uint64(), mask=mask)
+        )
+    return table
+
+
+def block_pairs_minhash(
+    blocking_rule,
+    table,
+    table_r=None,
+    columns=None,
+    unique_id_column_name="unique_id",
+    preceding_rules=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    """Generates the pairs of a minhash_lsh_rule, as a stream of record
+    batches.
+
+    > rule = minhash_lsh_rule("address", num_bands=20, rows_per_band=4)
+    > rule.sql_dialect = "duckdb"
+    > for batch in block_pairs_minhash(rule, people):
+    >     ...
+
+    Args:
+        blocking_rule (minhash_lsh_rule): The rule.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records to
+            deduplicate, or the left records to link.
+        table_r (pyarrow.Table | pandas.DataFrame | dict, optional): The
+            right records to link to. Defaults to None, which deduplicates
+            `table`.
+        columns (list[str], optional): The columns to include in each pair.
+            Defaults to all columns.
+        unique_id_column_name (str, optional): The unique id column.
+            Defaults to "unique_id".
+        preceding_rules (list, optional): Rules whose pairs should be
+            skipped. Defaults to the blocking rule's `preceding_rules`.
+        batch_size (int, optional): The number of pairs generated per batch.
+            Defaults to 1,000,000.
+
+    Yields:
+        pyarrow.RecordBatch: Batches of candidate pairs.
+    """
+    table = as_arrow_table(table)
+    if columns is None:
+        columns = [c for c in table.column_names if c != SALT_COLUMN_NAME]
+    if preceding_rules is None:
+        preceding_rules = blocking_rule.preceding_rules
+
+    table = add_band_keys(blocking_rule, table)
+    if table_r is not None:
+        table_r = add_band_keys(blocking_rule, table_r)
+
+    # As blocking_rule.band_blocking_rules, but rather than passing the
+    # earlier bands as preceding rules, whose keys would be encoded again for
+    # every later band, their codes are reused
+    band_codes = []
+    for band in range(blocking_rule.num_bands):
+        band_rule = BlockingRule(
+            blocking_rule._band_sql(band), sqlglot_dialect=blocking_rule.sql_dialect
+        )
+        join = _LocalJoin(
+            band_rule,
+            table,
+            table_r,
+            columns,
+            unique_id_column_name,
+            list(preceding_rules),
+        )
+        join.preceding_codes += band_codes
+        yield from join.batches(join.index, 0, join.index.num_pairs, batch_size)
+        band_codes.append(join.codes)
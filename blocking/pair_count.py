@@ -0,0 +1,170 @@
+"""Counts the candidate pairs a blocking rule will generate, without running
+the join.
+
+The pairs generated by an equi-join are determined by the sizes of its key
+groups. Deduplicating a table, a group of n records gives n * (n - 1) / 2
+pairs, and linking two tables, a group of n_l and n_r records gives
+n_l * n_r pairs. So the count needs only a single GROUP BY, or a count of
+unique keys on local data.
+
+Where a rule has conditions other than the key equalities, e.g.
+`l.surname = r.surname and l.dob < r.dob`, the count is an upper bound, as
+it includes pairs the residual conditions would remove. The count is of the
+pairs generated by the rule on its own, so also ignores `preceding_rules`.
+
+Deduplicating with keys that differ between the sides, e.g.
+`l.first_name = r.surname`, the count is an estimate.
+"""
+
+import numpy as np
+
+from blocking.blocking_keys import blocking_keys, key_codes
+
+
+def _check_max_pairs(num_pairs, max_pairs, blocking_rule):
+    if max_pairs is not None and num_pairs > max_pairs:
+        raise ValueError(
+            f"Blocking rule {blocking_rule!r} would generate {num_pairs:,} "
+            f"pairs, more than the maximum of {max_pairs:,}."
+        )
+    return num_pairs
+
+
+def _null_filter(keys_sql):
+    if not keys_sql:
+        return ""
+    return "where " + " and ".join(f"({k}) is not null" for k in keys_sql)
+
+
+def count_pairs_sql(blocking_rule, table_name, table_name_r=None, sql_dialect=None):
+    """The sql to count the pairs generated by a blocking rule.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table_name (str): The table to deduplicate, or the left table to link.
+        table_name_r (str, optional): The right table to link to. Defaults to
+            None, which deduplicates `table_name`.
+        sql_dialect (str, optional): The dialect of the rule's sql, if a
+            string is passed. Defaults to None.
+
+    Returns:
+        str: DuckDB sql returning a single row with a `num_pairs` column.
+    """
+    keys = blocking_keys(blocking_rule, sql_dialect)
+    keys_l = keys.keys_sql("l", "duckdb")
+    keys_r = keys.keys_sql("r", "duckdb")
+
+    def group_counts(table, keys_sql, count_name):
+        select = [f"{k} as k{i}" for i, k in enumerate(keys_sql)]
+        group_by = ""
+        if keys_sql:
+            group_by = "group by " + ", ".join(keys_sql)
+        return f"""
+            select {", ".join(select + [f"count(*) as {count_name}"])}
+            from {table}
+            {_null_filter(keys_sql)}
+            {group_by}
+        """
+
+    if table_name_r is None and keys.is_symmetric:
+        return f"""
+        select coalesce(sum(cast(n as hugeint) * (n - 1) // 2), 0) as num_pairs
+        from ({group_counts(table_name, keys_l, "n")})
+        """
+
+    # Linking, or keys which differ between the sides, e.g.
+    # l.first_name = r.surname, pair up groups on the two sides
+    key_join = " and ".join(f"l.k{i} = r.k{i}" for i in range(len(keys_l)))
+    on = f"on {key_join}" if key_join else "on true"
+    num_pairs = "sum(cast(l.n_l as hugeint) * r.n_r)"
+    if table_name_r is None:
+        # Deduplicating, pairs are counted in both orders, so halve the count.
+        # As the key sides differ, this is an estimate rather than exact.
+        num_pairs = f"{num_pairs} // 2"
+    return f"""
+        select coalesce({num_pairs}, 0) as num_pairs
+        from ({group_counts(table_name, keys_l, "n_l")}) as l
+        join ({group_counts(table_name_r or table_name, keys_r, "n_r")}) as r
+        {on}
+    """
+
+
+def count_pairs_duckdb(
+    blocking_rule,
+    table_name,
+    connection,
+    table_name_r=None,
+    sql_dialect=None,
+    max_pairs=None,
+):
+    """Counts the pairs a blocking rule will generate, with a single GROUP
+    BY in DuckDB.
+
+    > rule = exact_match_rule("surname")
+    > rule.sql_dialect = "duckdb"
+    > count_pairs_duckdb(rule, "people", con, max_pairs=1e9)
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table_name (str): The table to deduplicate, or the left table to link.
+        connection (duckdb.DuckDBPyConnection): A connection holding the
+            tables.
+        table_name_r (str, optional): The right table to link to. Defaults to
+            None, which deduplicates `table_name`.
+        sql_dialect (str, optional): The dialect of the rule's sql, if a
+            string is passed. Defaults to None.
+        max_pairs (int, optional): If set, raise a ValueError if the rule
+            would generate more pairs than this. Defaults to None.
+
+    Returns:
+        int: The number of pairs.
+    """
+    sql = count_pairs_sql(blocking_rule, table_name, table_name_r, sql_dialect)
+    num_pairs = int(connection.execute(sql).fetchone()[0])
+    return _check_max_pairs(num_pairs, max_pairs, blocking_rule)
+
+
+def count_pairs_local(
+    blocking_rule,
+    table,
+    table_r=None,
+    sql_dialect=None,
+    max_pairs=None,
+):
+    """Counts the pairs a blocking rule will generate on local data, from
+    counts of its unique keys.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records to
+            deduplicate, or the left records to link.
+        table_r (pyarrow.Table | pandas.DataFrame | dict, optional): The
+            right records to link to. Defaults to None, which deduplicates
+            `table`.
+        sql_dialect (str, optional): The dialect of the rule's sql, if a
+            string is passed. Defaults to None.
+        max_pairs (int, optional): If set, raise a ValueError if the rule
+            would generate more pairs than this. Defaults to None.
+
+    Returns:
+        int: The number of pairs.
+    """
+    keys = blocking_keys(blocking_rule, sql_dialect)
+
+    if table_r is None and keys.is_symmetric:
+        (codes,), num_codes = key_codes([table], [keys.keys_l])
+        counts = np.bincount(codes[codes >= 0], minlength=num_codes)
+        num_pairs = int((counts * (counts - 1) // 2).sum())
+    else:
+        (codes_l, codes_r), num_codes = key_codes(
+            [table, table if table_r is None else table_r],
+            [keys.keys_l, keys.keys_r],
+        )
+        counts_l = np.bincount(codes_l[codes_l >= 0], minlength=num_codes)
+        counts_r = np.bincount(codes_r[codes_r >= 0], minlength=num_codes)
+        num_pairs = int((counts_l * counts_r).sum())
+        if table_r is None:
+            # See count_pairs_sql
+            num_pairs //= 2
+
+    return _check_max_pairs(num_pairs, max_pairs, blocking_rule)
@@ -0,0 +1,424 @@
+"""Profiles the key distribution of a blocking rule, to find the keys that
+dominate the pairs it generates, and recommends how to salt the rule.
+
+Deduplicating, a key shared by n records generates n * (n - 1) / 2 pairs, so
+a handful of common keys (frequent surnames, default postcodes) can generate
+most of a rule's pairs, and all of a key's pairs are generated by a single
+partition of the join unless the rule is salted.
+
+Two methods are available:
+
+- "exact", the default, counts every key with a GROUP BY. DuckDB's hash
+  aggregate is fast, and the counts are exact.
+- "sketch" makes one streaming pass over hashes of the keys, counting them in
+  a count-min sketch which also estimates the total number of pairs, then
+  counts the few candidate heavy keys exactly in a second scan. This avoids
+  materialising a count for every distinct key, so bounds memory when there
+  are very many distinct keys, but is slower.
+"""
+
+import math
+import os
+from dataclasses import dataclass, field
+from typing import List
+
+import duckdb
+import numpy as np
+
+from blocking.blocking_keys import as_arrow_table, blocking_keys, blocking_rule_sql
+
+# Rows fetched from DuckDB per batch when streaming key hashes
+_HASH_BATCH_SIZE = 1_000_000
+
+# Multipliers of the count-min sketch's hash functions (odd 64 bit constants)
+_SKETCH_MULTIPLIERS = np.array(
+    [
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0xD6E8FEB86659FD93,
+        0xFF51AFD7ED558CCD,
+        0xC4CEB9FE1A85EC53,
+        0x94D049BB133111EB,
+        0xBF58476D1CE4E5B9,
+    ],
+    dtype=np.uint64,
+)
+
+
+class CountMinSketch:
+    """Approximate counts of a stream of 64 bit hashes, in fixed memory.
+
+    Each hash is counted in one cell of each of `depth` rows of `width`
+    cells. The estimated count of a hash is the minimum of its cells, which
+    never underestimates, and overestimates by at most 2 * total / width
+    with high probability.
+
+    Args:
+        width (int, optional): Cells per row, a power of two. Defaults to
+            2 ** 20.
+        depth (int, optional): The number of rows, at most 8. Defaults to 4.
+    """
+
+    def __init__(self, width=2**20, depth=4):
+        if width & (width - 1) or depth > len(_SKETCH_MULTIPLIERS):
+            raise ValueError(
+                "width must be a power of two, and depth at most "
+                f"{len(_SKETCH_MULTIPLIERS)}."
+            )
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._shift = np.uint64(64 - int(math.log2(width)))
+        self._counts = np.zeros((depth, width), dtype=np.int64)
+
+    def _cells(self, hashes):
+        # Multiplicative hashing, keeping the top bits of each product
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        return (hashes[None, :] * _SKETCH_MULTIPLIERS[: self.depth, None]) >> (
+            self._shift
+        )
+
+    def add(self, hashes):
+        for row, cells in enumerate(self._cells(hashes)):
+            self._counts[row] += np.bincount(cells, minlength=self.width)
+        self.total += len(hashes)
+
+    def row_estimate(self, hashes, row=0):
+        # The count in a single row, an upper bound on the estimate
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        cells = (hashes * _SKETCH_MULTIPLIERS[row]) >> self._shift
+        return self._counts[row, cells]
+
+    def estimate(self, hashes):
+        cells = self._cells(hashes)
+        rows = np.arange(self.depth)[:, None]
+        return self._counts[rows, cells].min(axis=0)
+
+    def second_moment(self):
+        """Estimates the sum of the squared counts of every distinct hash.
+
+        Each row's sum of squared cells includes the collisions between
+        hashes, which add (total ** 2 - F2) / width in expectation, so this
+        is subtracted before taking the median over rows.
+        """
+        sums = (self._counts.astype(np.float64) ** 2).sum(axis=1)
+        n, w = float(self.total), float(self.width)
+        estimates = (sums - n * n / w) / (1 - 1 / w)
+        return float(max(np.median(estimates), n))
+
+
+@dataclass
+class HeavyKey:
+    """A blocking key value shared by many records.
+
+    Attributes:
+        values (tuple): The value of each key of the rule.
+        num_records (int): The number of records with this key.
+        num_pairs (int): The number of pairs it generates.
+        share_of_pairs (float): Its share of all of the rule's pairs.
+    """
+
+    values: tuple
+    num_records: int
+    num_pairs: int
+    share_of_pairs: float
+
+
+@dataclass
+class BlockingSkewReport:
+    """The key distribution of a blocking rule.
+
+    Attributes:
+        blocking_rule (str): The rule's sql.
+        keys (list[str]): The rule's key expressions.
+        num_records (int): The number of records with non-null keys.
+        num_pairs (int): The number of pairs the rule generates.
+        heavy_keys (list[HeavyKey]): The keys generating the most pairs,
+            heaviest first.
+        recommended_salting_partitions (int): The number of salting
+            partitions needed to spread the heaviest key's pairs evenly
+            across the available parallelism.
+        keys_to_exclude (list[tuple]): Keys generating so large a share of
+            all pairs that they are likely default or placeholder values,
+            better excluded from the rule than salted.
+        is_estimate (bool): Whether `num_records` and `num_pairs` are
+            estimates, from a sample or a sketch. The counts of the heavy
+            keys are always exact, scaled up for a sample.
+    """
+
+    blocking_rule: str
+    keys: List[str]
+    num_records: int
+    num_pairs: int
+    heavy_keys: List[HeavyKey] = field(default_factory=list)
+    recommended_salting_partitions: int = 1
+    keys_to_exclude: List[tuple] = field(default_factory=list)
+    is_estimate: bool = False
+
+    def __str__(self):
+        estimate = "~" if self.is_estimate else ""
+        lines = [
+            f"Blocking rule: {self.blocking_rule}",
+            f"Records: {estimate}{self.num_records:,}",
+            f"Pairs: {estimate}{self.num_pairs:,}",
+            "Heaviest keys:",
+        ]
+        for key in self.heavy_keys:
+            lines.append(
+                f"  {key.values}: {key.num_records:,} records, "
+                f"{key.num_pairs:,} pairs ({key.share_of_pairs:.1%})"
+            )
+        lines.append(
+            f"Recommended salting_partitions: {self.recommended_salting_partitions}"
+        )
+        if self.keys_to_exclude:
+            lines.append(f"Consider excluding: {self.keys_to_exclude}")
+        return "\n".join(lines)
+
+
+def _pairs(n):
+    return n * (n - 1) // 2
+
+
+def _sampled_table_sql(table_name, sample_fraction):
+    if sample_fraction is None:
+        return table_name
+    return (
+        f"(select * from {table_name} "
+        f"using sample {sample_fraction * 100}% (bernoulli, 0))"
+    )
+
+
+def _exact_heavy_keys(keys_sql, table_name, connection, top_k, sample_fraction):
+    not_null = " and ".join(f"({k}) is not null" for k in keys_sql)
+    key_columns = ", ".join(f"{k} as k{i}" for i, k in enumerate(keys_sql))
+    key_aliases = ", ".join(f"k{i}" for i in range(len(keys_sql)))
+    rows = connection.execute(
+        f"""
+        with counts as (
+            select {key_columns}, count(*) as n
+            from {_sampled_table_sql(table_name, sample_fraction)}
+            where {not_null}
+            group by all
+        )
+        select
+            {key_aliases},
+            n,
+            sum(n) over () as total_records,
+            sum(cast(n as hugeint) * (n - 1) // 2) over () as total_pairs
+        from counts
+        order by n desc
+        limit {top_k}
+        """
+    ).fetchall()
+    if not rows:
+        return 0, 0, []
+    total_records, total_pairs = rows[0][-2:]
+    heavy = [row[:-2] for row in rows]
+    return int(total_records), int(total_pairs), heavy
+
+
+def _sketch_heavy_keys(keys_sql, table_name, connection, top_k, sample_fraction):
+    not_null = " and ".join(f"({k}) is not null" for k in keys_sql)
+    key_hash = f"hash({', '.join(keys_sql)})"
+    result = connection.execute(
+        f"""
+        select {key_hash} as h
+        from {_sampled_table_sql(table_name, sample_fraction)}
+        where {not_null}
+        """
+    )
+    if hasattr(result, "to_arrow_reader"):
+        reader = result.to_arrow_reader(_HASH_BATCH_SIZE)
+    else:
+        reader = result.fetch_record_batch(_HASH_BATCH_SIZE)
+
+    # Candidate heavy keys are those with the highest estimated counts seen
+    # so far. Every time a key appears its estimate is refreshed, so a key
+    # which is heavy overall is a candidate at the end.
+    sketch = CountMinSketch()
+    capacity = 10 * top_k
+    candidates = np.zeros(0, dtype=np.uint64)
+    threshold = 0
+    for batch in reader:
+        hashes = batch.column(0).to_numpy()
+        sketch.add(hashes)
+        # Only keys which could displace a candidate need to be considered.
+        # A single row of the sketch is an upper bound on the estimate, so
+        # is used to discard most keys cheaply.
+        hashes = hashes[sketch.row_estimate(hashes) >= threshold]
+        hashes = hashes[sketch.estimate(hashes) >= threshold]
+        candidates = np.union1d(candidates, hashes)
+        estimates = sketch.estimate(candidates)
+        order = np.argsort(-estimates, kind="stable")[:capacity]
+        candidates = candidates[order]
+        if len(candidates) == capacity:
+            threshold = estimates[order[-1]]
+
+    total_records = sketch.total
+    total_pairs = int(max(sketch.second_moment() - total_records, 0) // 2)
+    if len(candidates) == 0:
+        return total_records, total_pairs, []
+
+    # Count the candidates exactly
+    key_columns = ", ".join(f"{k} as k{i}" for i, k in enumerate(keys_sql))
+    hash_list = ", ".join(str(int(h)) for h in candidates)
+    heavy = connection.execute(
+        f"""
+        select {key_columns}, count(*) as n
+        from {_sampled_table_sql(table_name, sample_fraction)}
+        where {not_null} and {key_hash} in ({hash_list})
+        group by all
+        order by n desc
+        limit {top_k}
+        """
+    ).fetchall()
+    return total_records, total_pairs, heavy
+
+
+def recommend_salting_partitions(
+    heaviest_key_pairs, total_pairs, parallelism, max_salting_partitions=64
+):
+    """The number of salting partitions needed so the heaviest key's pairs,
+    split across the partitions, are no more than an even share of all of
+    the pairs across the available parallelism.
+
+    Args:
+        heaviest_key_pairs (int): The pairs generated by the heaviest key.
+        total_pairs (int): The pairs generated by the rule.
+        parallelism (int): The number of workers the join runs on.
+        max_salting_partitions (int, optional): An upper limit on the
+            recommendation. Defaults to 64.
+
+    Returns:
+        int: The recommended salting_partitions.
+    """
+    if total_pairs <= 0 or parallelism <= 1:
+        return 1
+    even_share = total_pairs / parallelism
+    partitions = math.ceil(heaviest_key_pairs / even_share)
+    return int(min(max(partitions, 1), max_salting_partitions))
+
+
+def profile_blocking_skew(
+    blocking_rule,
+    table_name,
+    connection,
+    method="exact",
+    top_k=10,
+    sample_fraction=None,
+    parallelism=None,
+    exclude_share=0.25,
+    sql_dialect=None,
+) -> BlockingSkewReport:
+    """Profiles the key distribution of a blocking rule in DuckDB, for
+    deduplicating a table.
+
+    > rule = exact_match_rule("surname")
+    > rule.sql_dialect = "duckdb"
+    > print(profile_blocking_skew(rule, "people", con))
+
+    Where the rule's keys differ between the sides, e.g. `l.first_name =
+    r.surname`, the left hand keys are profiled.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table_name (str): The table to profile.
+        connection (duckdb.DuckDBPyConnection): A connection holding the
+            table.
+        method (str, optional): "exact" or "sketch", see the module
+            docstring. Defaults to "exact".
+        top_k (int, optional): The number of heavy keys to report. Defaults
+            to 10.
+        sample_fraction (float, optional): If set, profile a random sample
+            of this fraction of the records, and scale the results up.
+            Defaults to None.
+        parallelism (int, optional): The number of workers the join will run
+            on, used to recommend salting. Defaults to the number of
+            processors.
+        exclude_share (float, optional): Keys generating more than this
+            share of all pairs are suggested for exclusion. Defaults to 0.25.
+        sql_dialect (str, optional): The dialect of the rule's sql, if a
+            string is passed. Defaults to None.
+
+    Returns:
+        BlockingSkewReport: The profile of the rule.
+    """
+    keys = blocking_keys(blocking_rule, sql_dialect)
+    keys_sql = keys.keys_sql("l", "duckdb")
+    if not keys_sql:
+        raise ValueError(
+            f"Blocking rule {blocking_rule!r} has no equi-join keys to profile."
+        )
+
+    if method == "exact":
+        heavy_keys_function = _exact_heavy_keys
+    elif method == "sketch":
+        heavy_keys_function = _sketch_heavy_keys
+    else:
+        raise ValueError(f"Unknown method {method!r}, use 'exact' or 'sketch'.")
+
+    total_records, total_pairs, heavy = heavy_keys_function(
+        keys_sql, table_name, connection, top_k, sample_fraction
+    )
+
+    # Scale counts from a sample up to the whole table
+    scale = 1 / sample_fraction if sample_fraction else 1
+    total_records = round(total_records * scale)
+    total_pairs = round(total_pairs * scale * scale)
+
+    heavy_keys = []
+    for row in heavy:
+        num_records = round(row[-1] * scale)
+        num_pairs = _pairs(num_records)
+        heavy_keys.append(
+            HeavyKey(
+                values=tuple(row[:-1]),
+                num_records=num_records,
+                num_pairs=num_pairs,
+                share_of_pairs=num_pairs / total_pairs if total_pairs else 0.0,
+            )
+        )
+
+    keys_to_exclude = [
+        k.values for k in heavy_keys if k.share_of_pairs > exclude_share
+    ]
+    # Recommend salting for the heaviest key that would remain
+    remaining = [k for k in heavy_keys if k.values not in keys_to_exclude]
+    remaining_pairs = total_pairs - sum(
+        k.num_pairs for k in heavy_keys if k.values in keys_to_exclude
+    )
+    recommended_salting_partitions = recommend_salting_partitions(
+        remaining[0].num_pairs if remaining else 0,
+        remaining_pairs,
+        parallelism or os.cpu_count(),
+    )
+
+    return BlockingSkewReport(
+        blocking_rule=blocking_rule_sql(blocking_rule, sql_dialect)[0],
+        keys=keys.keys_sql("l"),
+        num_records=total_records,
+        num_pairs=total_pairs,
+        heavy_keys=heavy_keys,
+        recommended_salting_partitions=recommended_salting_partitions,
+        keys_to_exclude=keys_to_exclude,
+        is_estimate=method == "sketch" or sample_fraction is not None,
+    )
+
+
+def profile_blocking_skew_local(blocking_rule, table, **kwargs):
+    """Profiles the key distribution of a blocking rule on local data, with
+    an in-process DuckDB connection. See profile_blocking_skew.
+
+    Args:
+        blocking_rule (BlockingRule | str): A blocking rule, or its sql.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records.
+        **kwargs: Passed on to profile_blocking_skew.
+
+    Returns:
+        BlockingSkewReport: The profile of the rule.
+    """
+    con = duckdb.connect()
+    con.register("__splink__skew_input", as_arrow_table(table))
+    return profile_blocking_skew(blocking_rule, "__splink__skew_input", con, **kwargs)
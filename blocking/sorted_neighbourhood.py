@@ -0,0 +1,131 @@
+"""Generates the pairs of a sorted_neighbourhood_rule locally.
+
+Records are sorted on the rule's key with a numpy argsort, ties broken on
+the unique id, and each record is paired with the next `window_size`
+records. The pairs at each offset into the window are two slices of the
+sort order, so pairs are generated offset by offset, in batches, with no
+join at all.
+"""
+
+import duckdb
+import numpy as np
+import pyarrow.compute as pc
+
+from blocking.blocking_keys import (
+    BlockingKeys,
+    as_arrow_table,
+    evaluate_keys,
+    key_codes,
+)
+from blocking.local_join import (
+    DEFAULT_BATCH_SIZE,
+    _pair_table,
+    _preceding_rules,
+    _residual_filter_sql,
+)
+from blocking.blocking_rule_builder import SALT_COLUMN_NAME
+from splink.sql_transform import parse_one_cached
+
+
+def sort_order(table, key, unique_id_column_name="unique_id"):
+    """The rows of the records with a non-null key, in sort order.
+
+    Args:
+        table (pyarrow.Table): The records.
+        key (sqlglot.expression): The sort key, without a table prefix.
+        unique_id_column_name (str, optional): Ties are broken on this
+            column. Defaults to "unique_id".
+
+    Returns:
+        numpy.ndarray: Row numbers, in sort order.
+    """
+    (values,) = evaluate_keys(table, [key])
+    valid = np.flatnonzero(pc.is_valid(values).to_numpy(zero_copy_only=False))
+    values = values.take(valid).to_numpy(zero_copy_only=False)
+    uids = table.column(unique_id_column_name).take(valid).to_numpy()
+    # Rank the keys first, as argsort can't break ties on a second column
+    # of object arrays
+    _, key_ranks = np.unique(values, return_inverse=True)
+    return valid[np.lexsort((uids, key_ranks.ravel()))]
+
+
+def block_pairs_sorted_neighbourhood(
+    blocking_rule,
+    table,
+    columns=None,
+    unique_id_column_name="unique_id",
+    preceding_rules=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    """Generates the pairs of a sorted_neighbourhood_rule, deduplicating a
+    table, as a stream of record batches.
+
+    As with blocking_rule.pairs_sql, within each pair the record earlier in
+    the sort order is on the left.
+
+    Args:
+        blocking_rule (sorted_neighbourhood_rule): The rule.
+        table (pyarrow.Table | pandas.DataFrame | dict): The records.
+        columns (list[str], optional): The columns to include in each pair.
+            Defaults to all columns.
+        unique_id_column_name (str, optional): The unique id column.
+            Defaults to "unique_id".
+        preceding_rules (list, optional): Rules whose pairs should be
+            skipped. Defaults to the blocking rule's `preceding_rules`.
+        batch_size (int, optional): The number of pairs generated per batch.
+            Defaults to 1,000,000.
+
+    Yields:
+        pyarrow.RecordBatch: Batches of candidate pairs.
+    """
+    table = as_arrow_table(table)
+    if columns is None:
+        columns = [c for c in table.column_names if c != SALT_COLUMN_NAME]
+    columns = list(columns)
+    if unique_id_column_name not in columns:
+        columns.insert(0, unique_id_column_name)
+
+    sql_dialect = blocking_rule.sql_dialect
+    key = parse_one_cached(blocking_rule.col_name, sql_dialect)
+    order = sort_order(table, key, unique_id_column_name)
+
+    # As in block_pairs_local, preceding rules made up only of key
+    # equalities are checked from key codes, and any others with sql
+    preceding_keys = _preceding_rules(blocking_rule, preceding_rules, sql_dialect)
+    preceding_codes = []
+    for keys in preceding_keys:
+        if not keys.has_residual:
+            codes, _ = key_codes([table, table], [keys.keys_l, keys.keys_r])
+            preceding_codes.append(codes)
+    filter_sql = _residual_filter_sql(
+        BlockingKeys((), (), ()), [p for p in preceding_keys if p.has_residual]
+    )
+    filter_columns = columns
+    if filter_sql:
+        filter_columns = list(dict.fromkeys(columns + table.column_names))
+
+    for offset in range(1, blocking_rule.window_size + 1):
+        num_pairs = max(len(order) - offset, 0)
+        for start in range(0, num_pairs, batch_size):
+            end = min(start + batch_size, num_pairs)
+            rows_l, rows_r = order[start:end], order[start + offset : end + offset]
+
+            keep = np.ones(len(rows_l), dtype=bool)
+            for codes_l, codes_r in preceding_codes:
+                code = codes_l[rows_l]
+                keep &= ~((code >= 0) & (code == codes_r[rows_r]))
+            rows_l, rows_r = rows_l[keep], rows_r[keep]
+            if len(rows_l) == 0:
+                continue
+
+            pairs = _pair_table(table, table, rows_l, rows_r, filter_columns)
+            if filter_sql:
+                con = duckdb.connect()
+                con.register("__splink__local_pairs", pairs)
+                pairs = con.execute(
+                    f"select * from __splink__local_pairs where {filter_sql}"
+                ).to_arrow_table()
+                pairs = pairs.select(
+                    [f"{col}_{side}" for col in columns for side in ("l", "r")]
+                )
+            yield from pairs.to_batches()
@@ -1,50 +1,26 @@
-# from .dialect_base_classes import _dialect_base_factory
-
-# from ..comparison_level_library import (
-#     ArrayIntersectLevelBase,
-#     ColumnsReversedLevelBase,
-#     DamerauLevenshteinLevelBase,
-#     DatediffLevelBase,
-#     DistanceFunctionLevelBase,
-#     DistanceInKMLevelBase,
-#     ElseLevelBase,
-#     ExactMatchLevelBase,
-#     JaccardLevelBase,
-#     JaroLevelBase,
-#     JaroWinklerLevelBase,
-#     LevenshteinLevelBase,
-#     NullLevelBase,
-#     PercentageDifferenceLevelBase,
-# )
-
-# class null_level(DuckDBBase, NullLevelBase):
-#     pass
-
-
-# class exact_match_level(DuckDBBase, ExactMatchLevelBase):
-#     pass
-
-
-# class else_level(DuckDBBase, ElseLevelBase):
-#     pass
-
-
-# class columns_reversed_level(DuckDBBase, ColumnsReversedLevelBase):
-#     pass
-
-
-# class distance_function_level(DuckDBBase, DistanceFunctionLevelBase):
-#     pass
-
-
-# class levenshtein_level(DuckDBBase, LevenshteinLevelBase):
-#     pass
-
-
-# def _core_comparison_levels(dialect):
-
-#     base_class = _dialect_base_factory(dialect)
-
-#     return {
-#         "null_level":
-#     }
+from splink.comparison_level_library import (
+    DamerauLevenshteinLevelBase,
+    DistanceFunctionLevelBase,
+    ElseLevelBase,
+    ExactMatchLevelBase,
+    NullLevelBase,
+)
+
+from .dialect_base_classes import _dialect_base_factory, _level_class
+
+_core_level_bases = {
+    "null_level": NullLevelBase,
+    "exact_match_level": ExactMatchLevelBase,
+    "else_level": ElseLevelBase,
+    "distance_function_level": DistanceFunctionLevelBase,
+    "damerau_levenshtein_level": DamerauLevenshteinLevelBase,
+}
+
+
+def _core_comparison_levels(dialect):
+    base_class = _dialect_base_factory(dialect)
+
+    return {
+        name: _level_class(base_class, level_base)
+        for name, level_base in _core_level_bases.items()
+    }
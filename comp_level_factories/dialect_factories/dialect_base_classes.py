@@ -1,8 +1,47 @@
 from .dialect_bases.dialect_base import DialectBase
 
 from .dialect_bases.duckdb_base import DuckDBBase
+from .dialect_bases.numpy_base import NumpyBase
 from .dialect_bases.postgres_base import PostgresBase
 
+# Level classes built by mixing a dialect base into a level base, keyed on
+# (dialect base, level base), so each combination is only ever built once
+_level_classes = {}
+
+
+def _new_level(dialect_base, level_base):
+    # Unpickles a level, by rebuilding its class from its two bases
+    level_class = _level_class(dialect_base, level_base)
+    return level_class.__new__(level_class)
+
+
+def _reduce_level(level):
+    # The built classes can't be found by name, so levels are pickled as the
+    # bases their class is built from, e.g. to send them to worker processes
+    # started with spawn or forkserver
+    dialect_base, level_base = type(level).__bases__
+    return _new_level, (dialect_base, level_base), level.__dict__
+
+
+def _level_class(dialect_base, level_base):
+    """Returns the class combining a dialect base with a level base,
+    e.g. (DuckDBBase, ExactMatchLevelBase) -> ExactMatchLevel.
+
+    The class is built on first request and reused thereafter, so levels
+    built for the same dialect share a class and isinstance checks hold.
+    """
+    key = (dialect_base, level_base)
+    level_class = _level_classes.get(key)
+    if level_class is None:
+        name = level_base.__name__
+        if name.endswith("Base"):
+            name = name[: -len("Base")]
+        level_class = _level_classes.setdefault(
+            key,
+            type(name, (dialect_base, level_base), {"__reduce__": _reduce_level}),
+        )
+    return level_class
+
 
 def _dialect_base_factory(dialect) -> DialectBase:
     """Constructs an exporter factory based on the user's preference."""
@@ -10,6 +49,7 @@ def _dialect_base_factory(dialect) -> DialectBase:
     factories = {
         "duckdb": DuckDBBase,
         "postgres": PostgresBase,
+        "numpy": NumpyBase,
     }
 
     if dialect in factories:
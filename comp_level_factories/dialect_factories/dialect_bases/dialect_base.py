@@ -21,4 +21,24 @@ class DialectBase:
     def _damerau_levenshtein_name(self):
         raise NotImplementedError(
             "Demerau lev not available for given backend."
-        )
\ No newline at end of file
+        )
+
+    @property
+    def _soundex_function_name(self):
+        raise NotImplementedError(
+            "Soundex not available for given backend."
+        )
+
+    def _offsets_table_sql(self, size, table_name, column_name):
+        # A table holding the integers 1 to size
+        values = ", ".join(f"({i})" for i in range(1, size + 1))
+        return f"(values {values}) as {table_name}({column_name})"
+
+    def _minhash_band_keys_sql(
+        self, table_name, unique_id_column_name, col_name, ngram_size, bands
+    ):
+        # Sql selecting each record's unique id and a MinHash band key for
+        # each band, given as a list of (column name, list of hash seeds)
+        raise NotImplementedError(
+            "MinHash not available for given backend."
+        )
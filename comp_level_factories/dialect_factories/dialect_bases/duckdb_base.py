@@ -20,3 +20,40 @@ class DuckDBBase(DialectBase):
     @property
     def _damerau_levenshtein_name(self):
         return "damerau_levenshtein"
+
+    def _offsets_table_sql(self, size, table_name, column_name):
+        return f"range(1, {size + 1}) as {table_name}({column_name})"
+
+    def _minhash_band_keys_sql(
+        self, table_name, unique_id_column_name, col_name, ngram_size, bands
+    ):
+        # Unnests the hashes of the character n-grams of each record, then
+        # for each seed of a band takes the minimum of the n-gram hashes
+        # rehashed with the seed, and hashes the minima together into the
+        # band key. Strings shorter than ngram_size are a single n-gram.
+        # Seeding with hash(ngram, seed) instead gives correlated MinHashes,
+        # which underestimate the similarity of strings.
+        uid = f'"{unique_id_column_name}"'
+        num_ngrams = f"greatest(length({col_name}) - {ngram_size - 1}, 1)"
+        minhash = "min(hash(xor(__splink__ngram_hash, {}::ubigint)))"
+        band_keys = ",\n                ".join(
+            "hash("
+            + ", ".join(minhash.format(seed) for seed in seeds)
+            + f') as "{column_name}"'
+            for column_name, seeds in bands
+        )
+        return f"""
+            select
+                {uid},
+                {band_keys}
+            from (
+                select
+                    {uid},
+                    hash(substring(
+                        {col_name}, unnest(range(1, {num_ngrams} + 1)), {ngram_size}
+                    )) as __splink__ngram_hash
+                from {table_name}
+                where ({col_name}) is not null
+            )
+            group by {uid}
+        """
@@ -0,0 +1,31 @@
+from .dialect_base import DialectBase
+
+
+def regex_extract_sql(col_name, regex):
+    return f"regexp_extract({col_name}, '{regex}')"
+
+
+class NumpyBase(DialectBase):
+    """Levels built on this base are evaluated directly on arrays by
+    execution/numpy_engine.py rather than by a sql engine.
+
+    The engine works from the arguments each level was built with, so these
+    are recorded on the level. The level's sql is only descriptive, and as
+    sqlglot has no numpy dialect it is rendered in sqlglot's default dialect.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._numpy_level_args = (args, kwargs)
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _sql_dialect(self):
+        return None
+
+    @property
+    def _regex_extract_function(self):
+        return regex_extract_sql
+
+    @property
+    def _damerau_levenshtein_name(self):
+        return "damerau_levenshtein"
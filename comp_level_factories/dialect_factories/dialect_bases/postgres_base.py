@@ -6,3 +6,8 @@ class PostgresBase(DialectBase):
         return "postgres"
 
     # Doesn't house demarulev...
+
+    @property
+    def _soundex_function_name(self):
+        # Requires the fuzzystrmatch extension
+        return "soundex"
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from comp_level_factories.dialect_factories.dialect_base_classes import (
+    _dialect_base_factory,
+)
+
+
+def _has_fixed_dialect(cls):
+    # Levels built by mixing in a dialect base (e.g. DuckDBBase) take their
+    # dialect from a read-only property, so can't be moved to a new one
+    return isinstance(getattr(cls, "_sql_dialect", None), property)
+
+
+def _compiler_for(cls, dialect, resolve_base):
+    if _has_fixed_dialect(cls):
+        raise TypeError(
+            f"{cls.__name__} has its dialect fixed by its base class, "
+            "so cannot be retargeted."
+        )
+
+    # Lazy comparison levels, e.g. DamerauLevenshteinLevel
+    if hasattr(cls, "_generate_sql_from_base"):
+        base = resolve_base()
+
+        def compile_level(level):
+            level._sql_dialect = dialect
+            level._generate_sql_from_base(base)
+
+        return compile_level
+
+    # Lazy blocking rules, e.g. exact_match_rule
+    if hasattr(cls, "generate_sql"):
+
+        def compile_rule(rule):
+            rule.sql_dialect = dialect
+
+        return compile_rule
+
+    raise TypeError(f"Objects of type {cls.__name__} cannot be retargeted.")
+
+
+def retarget(objects, dialect, max_workers=None):
+    """Switches a collection of lazy comparison levels and blocking rules
+    to a new sql dialect in a single pass.
+
+    Setting `.sql_dialect` on each object in turn resolves the dialect's
+    base class once per object. Here objects are grouped by type, the base
+    class is resolved once for the whole collection, and the sql for every
+    object is then regenerated.
+
+    > levels = [DamerauLevenshteinLevel("first_name", 2), ...]
+    > rules = [exact_match_rule("surname"), ...]
+    > retarget(levels + rules, "duckdb")
+
+    Args:
+        objects (list): Comparison levels and blocking rules to retarget.
+        dialect (str): The sql dialect to switch to, e.g. "duckdb".
+        max_workers (int, optional): If set, regenerate the sql on a thread
+            pool with this many workers. Defaults to None, which regenerates
+            the sql on the calling thread.
+
+    Returns:
+        list: The objects, now generating sql in the requested dialect.
+    """
+    objects = list(objects)
+
+    base = None
+
+    def resolve_base():
+        nonlocal base
+        if base is None:
+            base = _dialect_base_factory(dialect)()
+        return base
+
+    groups = {}
+    for obj in objects:
+        groups.setdefault(type(obj), []).append(obj)
+
+    jobs = []
+    for cls, group in groups.items():
+        compile_obj = _compiler_for(cls, dialect, resolve_base)
+        jobs.extend((compile_obj, obj) for obj in group)
+
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consume the results so any errors are raised here
+            list(executor.map(lambda job: job[0](job[1]), jobs))
+    else:
+        for compile_obj, obj in jobs:
+            compile_obj(obj)
+
+    return objects
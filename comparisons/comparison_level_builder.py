@@ -3,9 +3,12 @@ sys.path.append("../")
 
 from dataclasses import dataclass
 
-from splink.input_column import InputColumn
+from splink.input_column import interned_input_column
 # from comparisons.distance_fn import DistanceFunctionLevelBase
-from comp_level_factories.dialect_factories.dialect_base_classes import _dialect_base_factory
+from comp_level_factories.dialect_factories.dialect_base_classes import (
+    _dialect_base_factory,
+    _level_class,
+)
 
 
 class ComparisonLevel:
@@ -58,7 +61,7 @@ class DistanceFunctionLevelBase(ComparisonLevel):
         m_probability=None,
     ) -> ComparisonLevel:
 
-        col = InputColumn(col_name, sql_dialect=self._sql_dialect)
+        col = interned_input_column(col_name, sql_dialect=self._sql_dialect)
 
         if higher_is_more_similar:
             operator = ">="
@@ -135,7 +138,11 @@ class DamerauLevenshteinLevel(DistanceFunctionLevelBase):
         # Dialect is set by the setter -> triggers this...
         base_class = _dialect_base_factory(self.sql_dialect)()
         # We could also try some Type magic here...
+        self._generate_sql_from_base(base_class)
 
+    def _generate_sql_from_base(self, base_class):
+        # Split out from _generate_sql so a single resolved base class can be
+        # shared by many levels (see comp_level_factories/retarget.py)
         super().__init__(
             self.col_name,
             distance_function_name=base_class._damerau_levenshtein_name,
@@ -152,19 +159,6 @@ class DamerauLevenshteinLevel(DistanceFunctionLevelBase):
 # _dialect_base_factory("postgres")._damerau_levenshtein_name # errors
 
 
-t = DamerauLevenshteinLevel("help", 3)
-t.sql_dialect # blank
-
-# Set the dialect to "duckdb"
-t.sql_dialect = "duckdb"
-t.comparison
-t  # constructs our cll
-
-# errors...
-# t.sql_dialect = "postgres"
-# t.comparison
-
-
 class ComparisonImportsFactory:
     # Will house ALL potential levels. We can then
     # lazily evaluate them and assess if they can be
@@ -176,23 +170,35 @@ class ComparisonImportsFactory:
 
     @property
     def _damerau_levenshtein_level(self):
-        return type(
-            "DamerauLevenshteinLevel",
-            (self.base, DamerauLevenshteinLevel,),
-            {}
-        )
-
-
-# Creates the class needed to use the dam lev level
-# They're not being triggered...
-# Shouldn't the setter be working its magic???
-ComparisonImportsFactory(
-    "duckdb")._damerau_levenshtein_level(
-    "help", 3
-)._sql_dialect
-
-# This errors...
-ComparisonImportsFactory(
-    "postgres")._damerau_levenshtein_level(
-    "help", 3
-)
+        # Built once per dialect and then reused, see
+        # dialect_base_classes._level_class
+        return _level_class(self.base, DamerauLevenshteinLevel)
+
+
+# Scratch examples, only run when this file is run directly
+if __name__ == "__main__":
+    t = DamerauLevenshteinLevel("help", 3)
+    t.sql_dialect # blank
+
+    # Set the dialect to "duckdb"
+    t.sql_dialect = "duckdb"
+    t.comparison
+    t  # constructs our cll
+
+    # errors...
+    # t.sql_dialect = "postgres"
+    # t.comparison
+
+    # Creates the class needed to use the dam lev level
+    # They're not being triggered...
+    # Shouldn't the setter be working its magic???
+    ComparisonImportsFactory(
+        "duckdb")._damerau_levenshtein_level(
+        "help", 3
+    )._sql_dialect
+
+    # This errors...
+    ComparisonImportsFactory(
+        "postgres")._damerau_levenshtein_level(
+        "help", 3
+    )
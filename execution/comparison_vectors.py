@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def assign_comparison_vector_values(levels):
+    """Gives each level its comparison vector value, in the same way as a
+    splink Comparison: null levels get -1 and the remaining levels count down
+    to 0, in order.
+
+    Levels that already belong to a Comparison keep the values they have.
+
+    Args:
+        levels (list[ComparisonLevel]): The levels of a single comparison.
+
+    Returns:
+        list[ComparisonLevel]: The levels.
+    """
+    if all(level._comparison_vector_value is not None for level in levels):
+        return levels
+
+    num_levels = sum(1 for level in levels if not level.is_null_level)
+    counter = num_levels - 1
+    for level in levels:
+        if level.is_null_level:
+            level._comparison_vector_value = -1
+        else:
+            level._comparison_vector_value = counter
+            counter -= 1
+    return levels
+
+
+def gamma_column_name(comparison_name):
+    return f"gamma_{comparison_name}"
+
+
+def _num_rows(pairs):
+    if hasattr(pairs, "num_rows"):
+        return pairs.num_rows
+    if hasattr(pairs, "shape"):
+        return pairs.shape[0]
+    lengths = [np.size(v) for v in pairs.values() if np.ndim(v) > 0]
+    return max(lengths, default=1)
+
+
+def comparison_vector_case_sql(levels, output_column_name):
+    """Assembles the levels of a comparison into a single CASE expression.
+
+    > comparison_vector_case_sql([null_level, exact_level, else_level], "gamma_x")
+    CASE WHEN "x_l" IS NULL OR "x_r" IS NULL THEN -1
+    WHEN "x_l" = "x_r" THEN 1 ELSE 0 END as "gamma_x"
+
+    Args:
+        levels (list[ComparisonLevel]): The levels of a single comparison.
+        output_column_name (str): The name of the resulting column.
+
+    Returns:
+        str: The CASE expression, aliased to the output column name.
+    """
+    assign_comparison_vector_values(levels)
+    when_thens = "\n".join(
+        level._when_then_comparison_vector_value_sql for level in levels
+    )
+    return f'CASE\n{when_thens}\nEND as "{output_column_name}"'
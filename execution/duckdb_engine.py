@@ -0,0 +1,120 @@
+import duckdb
+import pyarrow as pa
+
+from execution.comparison_vectors import (
+    comparison_vector_case_sql,
+    gamma_column_name,
+)
+
+
+class DuckDBComparisonEngine:
+    """Evaluates comparison levels in-process with DuckDB.
+
+    The levels of each comparison are assembled into a single CASE
+    expression, which is run over a table of record pairs holding `_l` and
+    `_r` versions of each input column, e.g. first_name_l, first_name_r.
+
+    > levels = _core_comparison_levels("duckdb")
+    > comparison = [
+    >     levels["null_level"]("first_name"),
+    >     levels["exact_match_level"]("first_name"),
+    >     levels["damerau_levenshtein_level"]("first_name", 1),
+    >     levels["else_level"](),
+    > ]
+    > engine = DuckDBComparisonEngine()
+    > engine.compute_comparison_vectors(pairs, {"first_name": comparison})
+
+    Args:
+        connection (duckdb.DuckDBPyConnection, optional): The connection to
+            execute on. Defaults to a new in-memory connection.
+    """
+
+    _pairs_table_name = "__splink__record_pairs"
+
+    def __init__(self, connection=None):
+        self._con = connection if connection is not None else duckdb.connect()
+
+    @property
+    def connection(self):
+        return self._con
+
+    def comparison_vectors_sql(self, comparisons, table_name=None):
+        """The sql to compute a gamma column for each comparison.
+
+        Args:
+            comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+                comparison, keyed on the comparison's output column name.
+            table_name (str, optional): The table of record pairs to select
+                from. Defaults to the table registered by this engine.
+
+        Returns:
+            str: A select statement with one gamma column per comparison.
+        """
+        table_name = table_name or self._pairs_table_name
+
+        case_statements = []
+        for name, levels in comparisons.items():
+            _validate_dialect(levels)
+            case_statements.append(
+                comparison_vector_case_sql(levels, gamma_column_name(name))
+            )
+        case_sql = ",\n".join(case_statements)
+        return f"select\n{case_sql}\nfrom {table_name}"
+
+    def compute_comparison_vectors(self, pairs, comparisons) -> pa.Table:
+        """Computes the comparison vectors of a table of record pairs.
+
+        Args:
+            pairs (pyarrow.Table | pandas.DataFrame): The record pairs.
+            comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+                comparison, keyed on the comparison's output column name.
+
+        Returns:
+            pyarrow.Table: One gamma column per comparison, in the same row
+                order as `pairs`.
+        """
+        sql = self.comparison_vectors_sql(comparisons)
+        return self._execute_on_pairs(pairs, sql)
+
+    def compile_comparisons(self, comparisons):
+        """Prepares comparisons for evaluation, so that evaluating them on
+        many sets of record pairs only assembles their sql once.
+
+        Args:
+            comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+                comparison, keyed on the comparison's output column name.
+
+        Returns:
+            str: The compiled comparisons, for compute_compiled.
+        """
+        return self.comparison_vectors_sql(comparisons)
+
+    def compute_compiled(self, pairs, compiled) -> pa.Table:
+        """As compute_comparison_vectors, for comparisons prepared with
+        compile_comparisons."""
+        return self._execute_on_pairs(pairs, compiled)
+
+    def compute_gamma(self, pairs, levels, name="comparison") -> pa.ChunkedArray:
+        """Computes the gamma values of a single comparison.
+
+        Returns:
+            pyarrow.ChunkedArray: The gamma value of each record pair.
+        """
+        vectors = self.compute_comparison_vectors(pairs, {name: levels})
+        return vectors.column(gamma_column_name(name))
+
+    def _execute_on_pairs(self, pairs, sql):
+        self._con.register(self._pairs_table_name, pairs)
+        try:
+            return self._con.execute(sql).to_arrow_table()
+        finally:
+            self._con.unregister(self._pairs_table_name)
+
+
+def _validate_dialect(levels):
+    for level in levels:
+        if level.sql_dialect not in (None, "duckdb"):
+            raise ValueError(
+                f"Comparison level {level!r} uses the {level.sql_dialect} "
+                "dialect, but only duckdb levels can be run in DuckDB."
+            )
@@ -0,0 +1,191 @@
+import numpy as np
+
+# Padding codes, chosen so padding on one side never matches the other side
+_PAD_L = -1
+_PAD_R = -2
+
+# Upper bound on the number of matrix cells held in memory at once. Pairs are
+# processed in batches of similar length sized to stay within this
+_MAX_BATCH_CELLS = 1 << 22
+
+
+def _encode(strings, pad):
+    # Encodes strings as rows of UTF-8 bytes, padded to equal length. DuckDB's
+    # edit distances count bytes rather than characters, e.g. 'café' and
+    # 'cafe' are 2 apart, and levels should put a pair in the same level
+    # whichever engine evaluates them
+    encoded = [s.encode("utf-8") for s in strings]
+    lengths = np.fromiter((len(s) for s in encoded), dtype=np.int64, count=len(encoded))
+    max_len = int(lengths.max(initial=0))
+    codes = np.full((len(encoded), max_len), pad, dtype=np.int64)
+    for i, s in enumerate(encoded):
+        if s:
+            codes[i, : len(s)] = np.frombuffer(s, dtype=np.uint8)
+    return codes, lengths
+
+
+def _bounded_distance_batch(codes_l, len_l, codes_r, len_r, k, transpositions, size):
+    # Lowrance-Wagner recurrence for the (unrestricted) Damerau-Levenshtein
+    # distance, restricted to a band of width 2k + 1 around the diagonal and
+    # with every value capped at k + 1. Without transpositions this is the
+    # Levenshtein distance.
+    n, max_l = codes_l.shape
+    max_r = codes_r.shape[1]
+    cap = k + 1
+    distance = np.full(n, cap, dtype=np.int32)
+    idx = np.arange(n)
+
+    # h[:, i + 1, j + 1] is the distance between the first i characters of
+    # the left string and the first j characters of the right string. Row and
+    # column 0 are a border, and cells outside the band are left at the cap.
+    h = np.full((n, max_l + 2, max_r + 2), cap, dtype=np.int32)
+    h[:, 1, 1:] = np.minimum(np.arange(max_r + 1), cap)
+    h[:, 1:, 1] = np.minimum(np.arange(max_l + 1), cap)
+
+    # The last row in which each character appeared in the left string
+    last_row = np.zeros((n, size), dtype=np.int32)
+
+    finishing = len_l == 0
+    distance[finishing] = h[finishing, 1, len_r[finishing] + 1]
+
+    for i in range(1, max_l + 1):
+        if len(idx) == 0:
+            break
+
+        rows = np.arange(len(idx))
+        char_l = codes_l[:, i - 1]
+        # The last column in this row in which the characters matched
+        last_match_col = np.zeros(len(idx), dtype=np.int32)
+
+        for j in range(max(1, i - k), min(max_r, i + k) + 1):
+            char_r = codes_r[:, j - 1]
+            cost = char_l != char_r
+            best = np.minimum(h[:, i, j] + cost, h[:, i + 1, j] + 1)
+            best = np.minimum(best, h[:, i, j + 1] + 1)
+            if transpositions:
+                k_row = last_row[rows, char_r]
+                l_col = last_match_col
+                swap = h[rows, k_row, l_col] + (i - k_row - 1) + 1 + (j - l_col - 1)
+                best = np.minimum(best, swap)
+                last_match_col = np.where(cost, last_match_col, j)
+            h[:, i + 1, j + 1] = np.minimum(best, cap)
+
+        if transpositions:
+            last_row[rows, char_l] = i
+
+        finishing = len_l == i
+        distance[idx[finishing]] = h[finishing, i + 1, len_r[finishing] + 1]
+
+        # A cell can be derived from the cells above and to its left, and via a
+        # transposition from any earlier row, at a cost of at least the number
+        # of rows skipped. So once the last k + 1 rows are all at the cap, no
+        # later cell can fall below it and the pair can be dropped.
+        first_row = max(1, i + 1 - cap) if transpositions else i + 1
+        hopeless = h[:, first_row : i + 2, 1:].min(axis=(1, 2)) >= cap
+
+        live = (len_l > i) & ~hopeless
+        if not live.all():
+            idx, h, last_row = idx[live], h[live], last_row[live]
+            codes_l, len_l = codes_l[live], len_l[live]
+            codes_r, len_r = codes_r[live], len_r[live]
+
+    return distance
+
+
+def bounded_edit_distance(strings_l, strings_r, max_distance, transpositions=True):
+    """Computes the edit distance between each pair of strings, up to a bound.
+
+    Distances greater than `max_distance` are all reported as
+    `max_distance + 1`. This allows the distance to be computed in a band of
+    width 2 * max_distance + 1 around the diagonal of the dynamic programming
+    matrix (Ukkonen's cut-off), as any cell further from the diagonal already
+    exceeds the bound. Pairs whose lengths differ by more than the bound are
+    never compared.
+
+    Pairs are processed together, one cell of the band at a time across a
+    batch of pairs of similar length, and a pair is dropped as soon as its
+    distance can no longer come within the bound.
+
+    As every distance up to the bound is exact, a single call answers any
+    number of thresholds up to `max_distance`, e.g. the <= 1 and <= 2 levels
+    of a comparison.
+
+    With transpositions this is the Damerau-Levenshtein distance, matching
+    DuckDB's damerau_levenshtein, and without it is the Levenshtein distance,
+    matching DuckDB's levenshtein. As in DuckDB, strings are compared as UTF-8
+    bytes, not characters, so a change to a non-ASCII character may count as
+    two edits, e.g. 'café' and 'cafe' are 2 apart.
+
+    Args:
+        strings_l (sequence[str]): The left hand strings.
+        strings_r (sequence[str]): The right hand strings.
+        max_distance (int): The largest distance that needs to be exact.
+        transpositions (bool, optional): Whether to count a transposition of
+            adjacent characters as a single edit. Defaults to True.
+
+    Returns:
+        numpy.ndarray: The distance of each pair, capped at max_distance + 1.
+    """
+    k = int(max_distance)
+    distance = np.full(len(strings_l), k + 1, dtype=np.int64)
+
+    codes_l, len_l = _encode(strings_l, _PAD_L)
+    codes_r, len_r = _encode(strings_r, _PAD_R)
+
+    # The distance is at least the difference in length
+    idx = np.flatnonzero(np.abs(len_l - len_r) <= k)
+    if len(idx) == 0:
+        return distance
+
+    codes_l, len_l = codes_l[idx], len_l[idx]
+    codes_r, len_r = codes_r[idx], len_r[idx]
+
+    # Replace bytes with a compact alphabet, so the last row of each byte
+    # can be held in a small array per pair
+    alphabet, inverse = np.unique(
+        np.concatenate([codes_l.ravel(), codes_r.ravel()]), return_inverse=True
+    )
+    num_codes_l = codes_l.size
+    codes_l = inverse[:num_codes_l].reshape(codes_l.shape)
+    codes_r = inverse[num_codes_l:].reshape(codes_r.shape)
+
+    # Batch pairs of similar length together, longest first, to limit padding
+    order = np.argsort(-(len_l + len_r), kind="stable")
+    start = 0
+    while start < len(order):
+        longest = len_l[order[start]] + len_r[order[start]]
+        batch_size = max(1, _MAX_BATCH_CELLS // int((longest + 2) ** 2))
+        batch = order[start : start + batch_size]
+        max_l, max_r = int(len_l[batch].max()), int(len_r[batch].max())
+        distance[idx[batch]] = _bounded_distance_batch(
+            codes_l[batch, :max_l],
+            len_l[batch],
+            codes_r[batch, :max_r],
+            len_r[batch],
+            k,
+            transpositions,
+            len(alphabet),
+        )
+        start += batch_size
+
+    return distance
+
+
+def bounded_damerau_levenshtein(strings_l, strings_r, max_distance):
+    return bounded_edit_distance(
+        strings_l, strings_r, max_distance, transpositions=True
+    )
+
+
+def bounded_levenshtein(strings_l, strings_r, max_distance):
+    return bounded_edit_distance(
+        strings_l, strings_r, max_distance, transpositions=False
+    )
+
+
+def damerau_levenshtein_within(strings_l, strings_r, threshold):
+    return bounded_damerau_levenshtein(strings_l, strings_r, threshold) <= threshold
+
+
+def levenshtein_within(strings_l, strings_r, threshold):
+    return bounded_levenshtein(strings_l, strings_r, threshold) <= threshold
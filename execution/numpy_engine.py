@@ -0,0 +1,338 @@
+import inspect
+import re
+
+import numpy as np
+import pyarrow as pa
+
+from comp_level_factories.dialect_factories.dialect_bases.numpy_base import NumpyBase
+from execution.comparison_vectors import (
+    _num_rows,
+    assign_comparison_vector_values,
+    gamma_column_name,
+)
+from execution.edit_distance import (
+    bounded_damerau_levenshtein,
+    bounded_levenshtein,
+)
+from splink.comparison_level import ComparisonLevel
+from splink.comparison_level_library import (
+    DamerauLevenshteinLevelBase,
+    DistanceFunctionLevelBase,
+    ElseLevelBase,
+    ExactMatchLevelBase,
+    NullLevelBase,
+)
+from splink.input_column import interned_input_column
+
+# Distance functions available to a DistanceFunctionLevel, as functions of
+# (strings_l, strings_r, max_distance) -> distances capped at max_distance + 1
+_bounded_distance_functions = {
+    "damerau_levenshtein": bounded_damerau_levenshtein,
+    "levenshtein": bounded_levenshtein,
+}
+
+
+def _is_null(values):
+    return np.fromiter(
+        (v is None or v != v for v in values), dtype=bool, count=len(values)
+    )
+
+
+class _PairColumns:
+    # The columns of a set of record pairs as numpy object arrays, converted
+    # on first use and shared by every level that reads them
+
+    def __init__(self, pairs):
+        self._pairs = pairs
+        self._columns = {}
+        self.num_rows = _num_rows(pairs)
+        # Bounded distances, keyed on the distance function and the inputs
+        # it's applied to, and the largest threshold they're needed for
+        self._distances = {}
+        self.distance_bounds = {}
+
+    def _raw(self, name):
+        if name not in self._columns:
+            values = _column_values(self._pairs, name)
+            if values.ndim == 0:
+                values = np.full(self.num_rows, values.item(), dtype=object)
+            self._columns[name] = values
+        return self._columns[name]
+
+    def values(self, col_name, set_to_lowercase=False, regex=None):
+        key = (col_name, set_to_lowercase, regex)
+        if key not in self._columns:
+            values = self._raw(col_name)
+            if set_to_lowercase:
+                values = _map_non_null(values, str.lower)
+            if regex:
+                pattern = re.compile(regex)
+                values = _map_non_null(values, lambda v: _regex_extract(pattern, v))
+            self._columns[key] = values
+        return self._columns[key]
+
+    def bounded_distances(self, distance_key, rows):
+        # Distances are computed once, up to the largest threshold of any
+        # level that uses them, and then shared by all of those levels
+        distance_function_name, name_l, name_r, set_to_lowercase, regex = distance_key
+        bound = self.distance_bounds[distance_key]
+
+        cached_bound, distances = self._distances.get(distance_key, (None, None))
+        if cached_bound is None or cached_bound < bound:
+            # -1 marks rows that haven't been computed yet
+            distances = np.full(self.num_rows, -1, dtype=np.int64)
+            self._distances[distance_key] = (bound, distances)
+        else:
+            bound = cached_bound
+
+        missing = rows[distances[rows] < 0]
+        if len(missing):
+            values_l = self.values(name_l, set_to_lowercase, regex)[missing]
+            values_r = self.values(name_r, set_to_lowercase, regex)[missing]
+            not_null = ~(_is_null(values_l) | _is_null(values_r))
+            computed = np.full(len(missing), bound + 1, dtype=np.int64)
+            bounded_distance = _bounded_distance_functions[distance_function_name]
+            computed[not_null] = bounded_distance(
+                values_l[not_null], values_r[not_null], bound
+            )
+            distances[missing] = computed
+        return distances[rows]
+
+
+def _column_values(pairs, name):
+    column = pairs[name]
+    if np.ndim(column) > 0 and not isinstance(column, (pa.Array, pa.ChunkedArray)):
+        # Through arrow, so pandas' nulls, None, NaN and pd.NA, all become
+        # None, which _is_null can test for
+        try:
+            column = pa.array(column, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return np.asarray(column, dtype=object)
+    if isinstance(column, (pa.Array, pa.ChunkedArray)):
+        # pyarrow needs zero_copy_only=False to convert strings
+        return column.to_numpy(zero_copy_only=False).astype(object)
+    return np.asarray(column, dtype=object)
+
+
+def _map_non_null(values, func):
+    nulls = _is_null(values)
+    mapped = values.copy()
+    mapped[~nulls] = [func(v) for v in values[~nulls]]
+    return mapped
+
+
+def _regex_extract(pattern, value):
+    # Matches the behaviour of regexp_extract, which gives '' on no match
+    match = pattern.search(value)
+    return match.group(0) if match else ""
+
+
+def _level_arguments(level):
+    # The arguments the level was built with, bound to its level base
+    # signature, e.g. {"col_name": "first_name", "distance_threshold": 1, ...}
+    for cls in type(level).__mro__:
+        if (
+            issubclass(cls, ComparisonLevel)
+            and not issubclass(cls, NumpyBase)
+            and "__init__" in cls.__dict__
+        ):
+            break
+    args, kwargs = level._numpy_level_args
+    bound = inspect.signature(cls.__init__).bind(level, *args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def _l_r_values(columns, args, regex_key="regex_extract"):
+    col = interned_input_column(args["col_name"]).unquote()
+    set_to_lowercase = args.get("set_to_lowercase", False)
+    regex = args.get(regex_key)
+    return (
+        columns.values(col.name_l(), set_to_lowercase, regex),
+        columns.values(col.name_r(), set_to_lowercase, regex),
+    )
+
+
+def _null_condition(columns, rows, args, level):
+    values_l, values_r = _l_r_values(columns, args, "valid_string_pattern")
+    values_l, values_r = values_l[rows], values_r[rows]
+    condition = _is_null(values_l) | _is_null(values_r)
+    if args["valid_string_pattern"]:
+        condition |= (values_l == "") | (values_r == "")
+    return condition
+
+
+def _exact_match_condition(columns, rows, args, level):
+    values_l, values_r = _l_r_values(columns, args)
+    values_l, values_r = values_l[rows], values_r[rows]
+    not_null = ~(_is_null(values_l) | _is_null(values_r))
+    condition = np.zeros(len(rows), dtype=bool)
+    condition[not_null] = values_l[not_null] == values_r[not_null]
+    return condition
+
+
+def _else_condition(columns, rows, args, level):
+    return np.ones(len(rows), dtype=bool)
+
+
+def _distance_key(level, args):
+    # Identifies the distances a distance level needs, so that levels using
+    # the same function on the same inputs can share them
+    if isinstance(level, DamerauLevenshteinLevelBase):
+        distance_function_name = "damerau_levenshtein"
+    else:
+        distance_function_name = args["distance_function_name"]
+
+    if distance_function_name not in _bounded_distance_functions or args.get(
+        "higher_is_more_similar"
+    ):
+        raise NotImplementedError(
+            f"Distance function {distance_function_name} is not supported "
+            "by the numpy engine."
+        )
+
+    col = interned_input_column(args["col_name"]).unquote()
+    return (
+        distance_function_name,
+        col.name_l(),
+        col.name_r(),
+        args["set_to_lowercase"],
+        args["regex_extract"],
+    )
+
+
+def _distance_condition(columns, rows, args, level):
+    distances = columns.bounded_distances(_distance_key(level, args), rows)
+    return distances <= args["distance_threshold"]
+
+
+# Checked in order, so subclasses must come before their base classes
+_level_conditions = [
+    (NullLevelBase, _null_condition),
+    (ExactMatchLevelBase, _exact_match_condition),
+    (ElseLevelBase, _else_condition),
+    (DistanceFunctionLevelBase, _distance_condition),
+]
+
+
+def _condition_function(level):
+    if not isinstance(level, NumpyBase):
+        raise ValueError(
+            f"Comparison level {level!r} was not built with the numpy dialect, "
+            "so cannot be evaluated by the numpy engine."
+        )
+    for level_base, condition in _level_conditions:
+        if isinstance(level, level_base):
+            return condition
+    raise NotImplementedError(
+        f"{type(level).__name__} is not supported by the numpy engine."
+    )
+
+
+class _CompiledLevels:
+    # The condition of each level of a comparison, with the arguments it was
+    # built with, ready to be evaluated on any number of sets of record pairs
+
+    def __init__(self, levels):
+        assign_comparison_vector_values(levels)
+        self.conditions = [
+            (_condition_function(level), level, _level_arguments(level))
+            for level in levels
+        ]
+        if not isinstance(levels[-1], ElseLevelBase):
+            raise ValueError(
+                "The numpy engine requires the last level of each comparison "
+                "to be an else level."
+            )
+
+        # Each distance only needs to be exact up to the largest threshold
+        # it is compared against
+        self.distance_bounds = {}
+        for condition, level, args in self.conditions:
+            if condition is _distance_condition:
+                key = _distance_key(level, args)
+                bound = int(args["distance_threshold"])
+                if bound > self.distance_bounds.get(key, -1):
+                    self.distance_bounds[key] = bound
+
+    def gamma(self, columns):
+        for key, bound in self.distance_bounds.items():
+            if bound > columns.distance_bounds.get(key, -1):
+                columns.distance_bounds[key] = bound
+
+        gamma = np.empty(columns.num_rows, dtype=np.int8)
+        # As in a CASE expression, each pair takes the first level it matches,
+        # so each level is only evaluated on pairs unmatched by earlier levels
+        remaining = np.arange(columns.num_rows)
+        for condition, level, args in self.conditions:
+            if len(remaining) == 0:
+                break
+            matched = condition(columns, remaining, args, level)
+            gamma[remaining[matched]] = level._comparison_vector_value
+            remaining = remaining[~matched]
+        return gamma
+
+
+class NumpyComparisonEngine:
+    """Evaluates comparison levels built with the numpy dialect directly on
+    arrays, with no sql engine involved.
+
+    Record pairs can be a pandas DataFrame, a pyarrow Table or a dict of
+    arrays holding `_l` and `_r` versions of each input column. Scalars in a
+    dict are broadcast, so a single record can be compared against many
+    candidates:
+
+    > levels = _core_comparison_levels("numpy")
+    > comparison = [
+    >     levels["null_level"]("first_name"),
+    >     levels["exact_match_level"]("first_name"),
+    >     levels["damerau_levenshtein_level"]("first_name", 1),
+    >     levels["else_level"](),
+    > ]
+    > pairs = {"first_name_l": "robin", "first_name_r": candidate_names}
+    > NumpyComparisonEngine().compute_gamma(pairs, comparison)
+    """
+
+    def compute_comparison_vectors(self, pairs, comparisons):
+        """Computes the comparison vectors of a set of record pairs.
+
+        Args:
+            pairs (pandas.DataFrame | pyarrow.Table | dict): The record pairs.
+            comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+                comparison, keyed on the comparison's output column name.
+
+        Returns:
+            dict[str, numpy.ndarray]: The gamma values of each comparison,
+                keyed on the gamma column name.
+        """
+        return self.compute_compiled(pairs, self.compile_comparisons(comparisons))
+
+    def compute_gamma(self, pairs, levels):
+        """Computes the gamma values of a single comparison.
+
+        Returns:
+            numpy.ndarray: The gamma value of each record pair.
+        """
+        return _CompiledLevels(levels).gamma(_PairColumns(pairs))
+
+    def compile_comparisons(self, comparisons):
+        """Prepares comparisons for evaluation, so that evaluating them on
+        many sets of record pairs only inspects their levels once.
+
+        Args:
+            comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+                comparison, keyed on the comparison's output column name.
+
+        Returns:
+            dict: The compiled comparisons, for compute_compiled.
+        """
+        return {name: _CompiledLevels(levels) for name, levels in comparisons.items()}
+
+    def compute_compiled(self, pairs, compiled):
+        """As compute_comparison_vectors, for comparisons prepared with
+        compile_comparisons."""
+        columns = _PairColumns(pairs)
+        return {
+            gamma_column_name(name): levels.gamma(columns)
+            for name, levels in compiled.items()
+        }
@@ -0,0 +1,179 @@
+"""Scores comparison vectors with lookup tables of bayes factors.
+
+Rather than a CASE expression per comparison mapping each gamma value to its
+bayes factor (see ComparisonLevel._bayes_factor_sql), the bayes factors and
+log2 bayes factors of each comparison are held in a dense array indexed by
+comparison vector value + 1, so the null level's value of -1 is index 0.
+Scoring is then a single gather into the arrays of every comparison and a
+single sum of log2 bayes factors, or in sql a join of each comparison to a
+small VALUES table:
+
+> scorer = BayesFactorScorer(comparisons, 0.0001)
+> for vectors in stream_comparison_vectors(pairs, comparisons):
+>     scores = scorer.score(vectors)
+"""
+
+import math
+
+import numpy as np
+
+from execution.comparison_vectors import (
+    assign_comparison_vector_values,
+    gamma_column_name,
+)
+
+
+def _float_sql(value):
+    value = float(value)
+    if math.isnan(value):
+        return "cast('NaN' as float8)"
+    if math.isinf(value):
+        return f"cast('{'-' if value < 0 else ''}Infinity' as float8)"
+    return f"cast({value!r} as float8)"
+
+
+class BayesFactorLookup:
+    """The bayes factors of the levels of a comparison, indexed by
+    comparison vector value + 1. Values which no level has are NaN.
+
+    Args:
+        levels (list[ComparisonLevel]): The levels of a single comparison.
+    """
+
+    def __init__(self, levels):
+        assign_comparison_vector_values(levels)
+        values = [level._comparison_vector_value for level in levels]
+        self.bayes_factors = np.full(max(values) + 2, np.nan)
+        for level in levels:
+            bayes_factor = level._bayes_factor
+            if bayes_factor is None:
+                raise ValueError(
+                    f"Comparison level {level!r} has no m or u probability, "
+                    "so cannot be scored."
+                )
+            self.bayes_factors[level._comparison_vector_value + 1] = bayes_factor
+        # log2 of a bayes factor of 0 is -inf, rather than an error as in
+        # ComparisonLevel._log2_bayes_factor
+        with np.errstate(divide="ignore"):
+            self.log2_bayes_factors = np.log2(self.bayes_factors)
+
+    def values_sql(self, table_name):
+        """The lookup as a VALUES table, with columns gamma, bayes_factor and
+        log2_bayes_factor."""
+        rows = ", ".join(
+            f"({index - 1}, {_float_sql(bf)}, {_float_sql(log2_bf)})"
+            for index, (bf, log2_bf) in enumerate(
+                zip(self.bayes_factors, self.log2_bayes_factors)
+            )
+        )
+        return (
+            f"(values {rows}) as "
+            f"{table_name}(gamma, bayes_factor, log2_bayes_factor)"
+        )
+
+
+class BayesFactorScorer:
+    """Scores comparison vectors against the m and u probabilities of their
+    comparisons' levels.
+
+    Args:
+        comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+            comparison, keyed on the comparison's output column name.
+        probability_two_random_records_match (float): The prior probability
+            of a match.
+    """
+
+    def __init__(self, comparisons, probability_two_random_records_match):
+        self.lookups = {
+            name: BayesFactorLookup(levels) for name, levels in comparisons.items()
+        }
+        p = probability_two_random_records_match
+        self.prior_match_weight = math.log2(p / (1 - p))
+
+        # The log2 bayes factors of every comparison, concatenated, so that
+        # all of them can be looked up with a single take
+        sizes = [len(lookup.log2_bayes_factors) for lookup in self.lookups.values()]
+        self._offsets = np.cumsum([0] + sizes[:-1]).astype(np.int64)[:, None] + 1
+        self._log2_bayes_factors = np.concatenate(
+            [lookup.log2_bayes_factors for lookup in self.lookups.values()]
+        )
+
+    def _gammas(self, vectors):
+        # The gamma values as a (comparisons, pairs) matrix
+        return np.stack(
+            [
+                np.asarray(vectors[gamma_column_name(name)], dtype=np.int64)
+                for name in self.lookups
+            ]
+        )
+
+    def match_weights(self, vectors, match_weight_adjustments=None):
+        """The match weight of each comparison vector.
+
+        Args:
+            vectors (pyarrow.Table | pyarrow.RecordBatch | pandas.DataFrame |
+                dict): Comparison vectors, with a gamma column per
+                comparison, as produced by the comparison engines.
+            match_weight_adjustments (numpy.ndarray, optional): Adjustments
+                to add to each match weight, e.g. term frequency adjustments
+                from TermFrequencyAdjuster. Defaults to None.
+
+        Returns:
+            numpy.ndarray: The match weights.
+        """
+        log2_bayes_factors = np.take(
+            self._log2_bayes_factors, self._gammas(vectors) + self._offsets
+        )
+        match_weights = self.prior_match_weight + log2_bayes_factors.sum(axis=0)
+        if match_weight_adjustments is not None:
+            match_weights += match_weight_adjustments
+        return match_weights
+
+    def score(self, vectors, match_weight_adjustments=None):
+        """The match weight and match probability of each comparison vector.
+
+        Returns:
+            dict[str, numpy.ndarray]: The match_weight and match_probability
+                of each vector.
+        """
+        match_weights = self.match_weights(vectors, match_weight_adjustments)
+        with np.errstate(over="ignore"):
+            match_probabilities = 1 / (1 + np.exp2(-match_weights))
+        return {
+            "match_weight": match_weights,
+            "match_probability": match_probabilities,
+        }
+
+    def score_sql(self, table_name):
+        """Sql scoring a table of comparison vectors, joining each gamma
+        column to its comparison's lookup table.
+
+        Args:
+            table_name (str): The table of comparison vectors.
+
+        Returns:
+            str: A select of the table's columns, with match_weight and
+                match_probability added.
+        """
+        joins = []
+        log2_bayes_factors = []
+        for i, (name, lookup) in enumerate(self.lookups.items()):
+            lookup_name = f"__splink__bf_{i}"
+            joins.append(
+                f"left join {lookup.values_sql(lookup_name)}\n"
+                f'on v."{gamma_column_name(name)}" = {lookup_name}.gamma'
+            )
+            log2_bayes_factors.append(f"{lookup_name}.log2_bayes_factor")
+
+        match_weight = " + ".join(
+            [_float_sql(self.prior_match_weight)] + log2_bayes_factors
+        )
+        joins_sql = "\n".join(joins)
+        return f"""
+            select *, 1 / (1 + pow(2, -match_weight)) as match_probability
+            from (
+                select v.*, {match_weight} as match_weight
+                from {table_name} as v
+                {joins_sql}
+            )
+        """
@@ -0,0 +1,92 @@
+"""Computes comparison vectors over a stream of chunks of record pairs.
+
+The comparisons are compiled once, into sql for DuckDB or into condition
+functions for the numpy engine, and each chunk is then evaluated in turn by
+a single engine, so a candidate set of any size is scored in memory bounded
+by the chunk size:
+
+> levels = _core_comparison_levels("duckdb")
+> comparisons = {"first_name": [...], "surname": [...]}
+> pairs = block_pairs_local(rule, people, batch_size=500_000)
+> for batch in stream_comparison_vectors(pairs, comparisons):
+>     ...
+"""
+
+import pyarrow as pa
+
+from comp_level_factories.dialect_factories.dialect_bases.numpy_base import NumpyBase
+from execution.duckdb_engine import DuckDBComparisonEngine
+from execution.numpy_engine import NumpyComparisonEngine
+
+
+def _default_engine(comparisons):
+    # Numpy levels have no sql dialect, as sqlglot has no numpy dialect, so
+    # are recognised by their base
+    levels = [level for levels in comparisons.values() for level in levels]
+    if levels and all(isinstance(level, NumpyBase) for level in levels):
+        return NumpyComparisonEngine()
+    return DuckDBComparisonEngine()
+
+
+def _column(chunk, name):
+    column = chunk[name]
+    if isinstance(column, (pa.Array, pa.ChunkedArray)):
+        return column
+    # A pandas Series
+    return pa.array(column, from_pandas=True)
+
+
+def stream_comparison_vectors(
+    pair_chunks,
+    comparisons,
+    engine=None,
+    retain_columns=None,
+):
+    """Lazily computes the comparison vectors of a stream of chunks of
+    record pairs, one output batch per chunk.
+
+    Args:
+        pair_chunks (Iterable): Chunks of record pairs, as pyarrow
+            RecordBatches or Tables, or pandas DataFrames, each holding `_l`
+            and `_r` versions of the input columns.
+        comparisons (dict[str, list[ComparisonLevel]] | list[ComparisonLevel]):
+            The levels of each comparison, keyed on the comparison's output
+            column name, or the levels of a single comparison, named
+            "comparison".
+        engine (DuckDBComparisonEngine | NumpyComparisonEngine, optional):
+            The engine to evaluate every chunk with. Defaults to a
+            NumpyComparisonEngine if every level uses the numpy dialect, and
+            otherwise a DuckDBComparisonEngine with a new connection.
+        retain_columns (list[str], optional): Columns of the chunks to copy
+            into the output, e.g. ["unique_id_l", "unique_id_r"]. Defaults to
+            None.
+
+    Yields:
+        pyarrow.RecordBatch: The retained columns, then one gamma column per
+            comparison, in the same row order as the chunk.
+    """
+    if not isinstance(comparisons, dict):
+        comparisons = {"comparison": comparisons}
+    if engine is None:
+        engine = _default_engine(comparisons)
+    retain_columns = list(retain_columns or [])
+
+    compiled = engine.compile_comparisons(comparisons)
+
+    for chunk in pair_chunks:
+        if len(chunk) == 0:
+            continue
+        vectors = engine.compute_compiled(chunk, compiled)
+        if isinstance(vectors, pa.Table):
+            names = vectors.column_names
+            arrays = [vectors.column(name).combine_chunks() for name in names]
+        else:
+            names = list(vectors)
+            arrays = [pa.array(vectors[name]) for name in names]
+
+        retained = [_column(chunk, name) for name in retain_columns]
+        retained = [
+            c.combine_chunks() if isinstance(c, pa.ChunkedArray) else c
+            for c in retained
+        ]
+        yield pa.record_batch(retained + arrays, names=retain_columns + names)
@@ -0,0 +1,312 @@
+"""Term frequency tables, and term frequency adjustments applied to arrays.
+
+The term frequencies of every tf adjustment column are computed in a single
+scan of the input records, with one GROUP BY GROUPING SETS query, and each
+is held as a TermFrequencyTable: a dictionary of the column's distinct
+values, and an array of their frequencies. Tables can be saved to and loaded
+from Parquet.
+
+Rather than the nested CASE of ComparisonLevel._tf_adjustment_sql, each
+comparison's tf adjustment parameters are held in arrays indexed by
+comparison vector value + 1, as in execution.scoring, and the adjustment is
+applied to a batch of pairs as a lookup of each side's value in the
+dictionary, followed by a single np.power:
+
+> tf_tables = compute_term_frequency_tables(people, ["first_name", "surname"])
+> adjuster = TermFrequencyAdjuster(comparisons, tf_tables)
+> scorer = BayesFactorScorer(comparisons, 0.0001)
+> for pairs in block_pairs_local(rule, people):
+>     vectors = engine.compute_comparison_vectors(pairs, comparisons)
+>     scores = scorer.score(
+>         vectors, adjuster.match_weight_adjustments(pairs, vectors)
+>     )
+"""
+
+import os
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from execution.comparison_vectors import (
+    _num_rows,
+    assign_comparison_vector_values,
+    gamma_column_name,
+)
+from splink.input_column import interned_input_column
+
+
+def _unquoted(column_name):
+    return interned_input_column(column_name).unquote()
+
+
+class TermFrequencyTable:
+    """The term frequency of each distinct value of a column: the share of
+    the records with a non-null value that have that value.
+
+    Args:
+        column_name (str): The column.
+        values (pyarrow.Array): The distinct values.
+        frequencies (numpy.ndarray): The frequency of each value.
+    """
+
+    def __init__(self, column_name, values, frequencies):
+        self.column_name = column_name
+        self.values = values
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)
+
+    @property
+    def tf_column_name(self):
+        return _unquoted(self.column_name).tf_name()
+
+    def lookup(self, values):
+        """The term frequency of each of an array of values.
+
+        Args:
+            values (pyarrow.Array | pyarrow.ChunkedArray | numpy.ndarray):
+                The values to look up.
+
+        Returns:
+            numpy.ndarray: The frequencies, NaN for nulls and values not in
+                the table.
+        """
+        if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+            values = pa.array(values, from_pandas=True)
+        if values.type != self.values.type:
+            values = values.cast(self.values.type)
+        indices = pc.index_in(values, value_set=self.values)
+        # Append a NaN for nulls and values not found to index into
+        indices = indices.fill_null(len(self.frequencies))
+        frequencies = np.append(self.frequencies, np.nan)
+        return frequencies[indices.to_numpy()]
+
+    def to_arrow(self):
+        return pa.table(
+            {
+                _unquoted(self.column_name).name(): self.values,
+                self.tf_column_name: self.frequencies,
+            }
+        )
+
+    @classmethod
+    def from_arrow(cls, column_name, table):
+        tf_column_name = _unquoted(column_name).tf_name()
+        return cls(
+            column_name,
+            table.column(_unquoted(column_name).name()).combine_chunks(),
+            table.column(tf_column_name).to_numpy(),
+        )
+
+    def __repr__(self):
+        return (
+            f"<Term frequencies of '{self.column_name}', "
+            f"{len(self.values):,} values>"
+        )
+
+
+def term_frequency_tables_sql(table_name, column_names):
+    """Sql counting the values of every column in a single scan, with one
+    grouping set per column.
+
+    Args:
+        table_name (str): The input records.
+        column_names (list[str]): The tf adjustment columns.
+
+    Returns:
+        str: Sql returning the columns, a `__splink__grouping` column giving
+            the index of the column counted by each row, and a `__splink__n`
+            count.
+    """
+    columns = [f'"{_unquoted(c).name()}"' for c in column_names]
+    grouping_sets = ", ".join(f"({c})" for c in columns)
+    # grouping(c) is 0 in the rows of c's own grouping set
+    grouping_index = "case " + " ".join(
+        f"when grouping({c}) = 0 then {i}" for i, c in enumerate(columns)
+    ) + " end"
+    return f"""
+        select
+            {", ".join(columns)},
+            {grouping_index} as __splink__grouping,
+            count(*) as __splink__n
+        from {table_name}
+        group by grouping sets ({grouping_sets})
+    """
+
+
+def compute_term_frequency_tables(table, column_names, connection=None):
+    """Computes the term frequencies of each of a set of columns, in a single
+    scan of the records.
+
+    Args:
+        table (str | pyarrow.Table | pandas.DataFrame): The input records, or
+            the name of a table in `connection`.
+        column_names (list[str]): The tf adjustment columns.
+        connection (duckdb.DuckDBPyConnection, optional): The connection to
+            run the scan on. Defaults to a new in-memory connection.
+
+    Returns:
+        dict[str, TermFrequencyTable]: The table of each column.
+    """
+    con = connection if connection is not None else duckdb.connect()
+    table_name = table
+    registered = not isinstance(table, str)
+    if registered:
+        table_name = "__splink__tf_input"
+        con.register(table_name, table)
+    try:
+        counts = con.execute(
+            term_frequency_tables_sql(table_name, column_names)
+        ).to_arrow_table()
+    finally:
+        if registered:
+            con.unregister(table_name)
+
+    grouping = counts.column("__splink__grouping")
+    tf_tables = {}
+    for i, column_name in enumerate(column_names):
+        name = _unquoted(column_name).name()
+        rows = counts.filter(pc.equal(grouping, i))
+        rows = rows.filter(pc.is_valid(rows.column(name)))
+        n = rows.column("__splink__n").to_numpy().astype(np.float64)
+        tf_tables[column_name] = TermFrequencyTable(
+            column_name, rows.column(name).combine_chunks(), n / n.sum()
+        )
+    return tf_tables
+
+
+def save_term_frequency_tables(tf_tables, directory):
+    """Saves term frequency tables, as a Parquet file per column."""
+    os.makedirs(directory, exist_ok=True)
+    for tf_table in tf_tables.values():
+        path = os.path.join(directory, f"{tf_table.tf_column_name}.parquet")
+        pq.write_table(tf_table.to_arrow(), path)
+
+
+def load_term_frequency_tables(directory, column_names):
+    """Loads term frequency tables saved with save_term_frequency_tables."""
+    tf_tables = {}
+    for column_name in column_names:
+        tf_column_name = _unquoted(column_name).tf_name()
+        path = os.path.join(directory, f"{tf_column_name}.parquet")
+        tf_tables[column_name] = TermFrequencyTable.from_arrow(
+            column_name, pq.read_table(path)
+        )
+    return tf_tables
+
+
+class _ComparisonAdjustment:
+    # The tf adjustment parameters of the levels of a comparison which are
+    # adjusted on one column, indexed by comparison vector value + 1. Levels
+    # which aren't adjusted have a weight of 0.
+
+    def __init__(self, name, levels, column_name):
+        self.gamma_column_name = gamma_column_name(name)
+        size = max(level._comparison_vector_value for level in levels) + 2
+        self.weights = np.zeros(size)
+        self.u_exact = np.ones(size)
+        self.minimum_u = np.zeros(size)
+        for level in levels:
+            index = level._comparison_vector_value + 1
+            self.weights[index] = level._tf_adjustment_weight
+            self.u_exact[index] = level._u_probability_corresponding_to_exact_match
+            self.minimum_u[index] = level._tf_minimum_u_value
+        col = _unquoted(column_name)
+        self.column_name = col.name()
+        self.name_l, self.name_r = col.name_l(), col.name_r()
+
+    def bayes_factors(self, pairs, vectors, tf_table):
+        index = np.asarray(vectors[self.gamma_column_name], dtype=np.int64) + 1
+        tf_l = tf_table.lookup(pairs[self.name_l])
+        tf_r = tf_table.lookup(pairs[self.name_r])
+        # As the coalesces in _tf_adjustment_sql, use whichever side exists
+        tf_l, tf_r = np.where(np.isnan(tf_l), tf_r, tf_l), np.where(
+            np.isnan(tf_r), tf_l, tf_r
+        )
+        divisor = np.fmax(np.maximum(tf_l, tf_r), self.minimum_u[index])
+
+        weights = self.weights[index]
+        adjusted = (weights != 0) & ~np.isnan(tf_l)
+        bayes_factors = np.ones(len(index))
+        bayes_factors[adjusted] = np.power(
+            self.u_exact[index][adjusted] / divisor[adjusted], weights[adjusted]
+        )
+        return bayes_factors
+
+
+class TermFrequencyAdjuster:
+    """Applies the term frequency adjustments of a set of comparisons to
+    batches of record pairs.
+
+    Args:
+        comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+            comparison, keyed on the comparison's output column name. Levels
+            must belong to a Comparison, so that the u probability of their
+            exact match level can be found.
+        tf_tables (dict[str, TermFrequencyTable]): The term frequency table
+            of each tf adjustment column.
+    """
+
+    def __init__(self, comparisons, tf_tables):
+        # Keyed on the unquoted column name, as levels quote their columns
+        self.tf_tables = {
+            _unquoted(column_name).name(): tf_table
+            for column_name, tf_table in tf_tables.items()
+        }
+        self._adjustments = []
+        for name, levels in comparisons.items():
+            assign_comparison_vector_values(levels)
+            # As in _tf_adjustment_sql, null and else levels aren't adjusted
+            adjusted_levels = [
+                level
+                for level in levels
+                if level._has_tf_adjustments
+                and level._tf_adjustment_weight != 0
+                and not level.is_null_level
+                and not level._is_else_level
+            ]
+            columns = {
+                level._tf_adjustment_input_column.input_name: None
+                for level in adjusted_levels
+            }
+            for column_name in columns:
+                column_levels = [
+                    level
+                    for level in adjusted_levels
+                    if level._tf_adjustment_input_column.input_name == column_name
+                ]
+                if _unquoted(column_name).name() not in self.tf_tables:
+                    raise ValueError(
+                        f"No term frequency table for column '{column_name}', "
+                        f"used by comparison {name}."
+                    )
+                self._adjustments.append(
+                    _ComparisonAdjustment(name, column_levels, column_name)
+                )
+
+    def bayes_factor_adjustments(self, pairs, vectors):
+        """The product of the tf adjustments of every comparison, for each
+        pair.
+
+        Args:
+            pairs (pyarrow.Table | pyarrow.RecordBatch | pandas.DataFrame |
+                dict): The record pairs, with `_l` and `_r` versions of the
+                tf adjustment columns.
+            vectors (pyarrow.Table | pandas.DataFrame | dict): The pairs'
+                comparison vectors, in the same row order.
+
+        Returns:
+            numpy.ndarray: A bayes factor multiplier for each pair.
+        """
+        bayes_factors = np.ones(_num_rows(pairs))
+        for adjustment in self._adjustments:
+            bayes_factors *= adjustment.bayes_factors(
+                pairs, vectors, self.tf_tables[adjustment.column_name]
+            )
+        return bayes_factors
+
+    def match_weight_adjustments(self, pairs, vectors):
+        """As bayes_factor_adjustments, as log2 match weight adjustments."""
+        with np.errstate(divide="ignore"):
+            return np.log2(self.bayes_factor_adjustments(pairs, vectors))
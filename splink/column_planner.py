@@ -0,0 +1,142 @@
+"""Plans the columns a model selects from its input records, across every
+comparison at once.
+
+ComparisonLevel._columns_to_select_for_blocking gives the `l.x as x_l,
+r.x as x_r` columns of a single level, so building the select list of a
+model means rendering and deduplicating the same columns for every level
+that uses them. plan_columns instead collects the InputColumns and term
+frequency columns of every level of every comparison in one pass, keyed on
+their rendered names, and renders each column's select expressions once.
+
+The plan also gives the source columns the model reads, so that inputs can
+be pruned to them when scanned:
+
+> plan = plan_columns(comparisons, additional_columns=["unique_id"])
+> pq.read_table(path, columns=plan.source_columns)
+> sql = f"select {plan.select_sql} from ..."
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import sqlglot.expressions as exp
+
+from .input_column import InputColumn, interned_input_column
+from .misc import dedupe_preserving_order
+
+
+def _source_column(input_column: InputColumn) -> str:
+    # The top level column a possibly nested column, e.g. geocode['lat'], is
+    # read from
+    column = input_column.input_name_as_tree.find(exp.Column)
+    if column is None:
+        return input_column.unquote().name()
+    return column.name
+
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    """The columns used by the levels of a model.
+
+    Attributes:
+        input_columns (tuple[InputColumn]): The distinct input columns, in
+            the order levels first use them, after any additional columns.
+        tf_columns (tuple[InputColumn]): The distinct columns with term
+            frequency adjustments.
+        columns_to_select (tuple[str]): The select expressions of the input
+            and tf columns, e.g. `"l"."first_name" as "first_name_l"`, each
+            once, in the same order as concatenating the
+            _columns_to_select_for_blocking of every level and
+            deduplicating.
+        source_columns (tuple[str]): The unquoted names of the columns read
+            from the input records, for pruning scans.
+        tf_source_columns (tuple[str]): The unquoted names of the term
+            frequency columns, e.g. tf_first_name.
+    """
+
+    input_columns: tuple
+    tf_columns: tuple
+    columns_to_select: tuple
+    source_columns: tuple
+    tf_source_columns: tuple
+
+    @property
+    def select_sql(self) -> str:
+        return ", ".join(self.columns_to_select)
+
+    def read_parquet_sql(self, path: str) -> str:
+        """DuckDB sql reading only the source columns from Parquet files."""
+        columns = ", ".join(f'"{c}"' for c in self.source_columns)
+        # Quotes in the path are doubled, to escape them in the string literal
+        path = path.replace("'", "''")
+        return f"select {columns} from read_parquet('{path}')"
+
+
+def plan_columns(
+    comparisons, additional_columns=None, sql_dialect=None
+) -> ColumnPlan:
+    """Collects the columns used by every level of a model.
+
+    Args:
+        comparisons (dict[str, list[ComparisonLevel]] | list): The levels of
+            each comparison, as a dict or a list of lists of levels.
+        additional_columns (list[str], optional): Further columns to select
+            ahead of the levels' columns, e.g. the unique id and source
+            dataset columns. Defaults to None.
+        sql_dialect (str, optional): The dialect to render the additional
+            columns in. Defaults to None.
+
+    Returns:
+        ColumnPlan: The plan.
+    """
+    if isinstance(comparisons, dict):
+        comparisons = comparisons.values()
+
+    # Keyed on the rendered name, as levels in different dialects, or with
+    # different quoting, can refer to the same column
+    input_columns: dict[str, InputColumn] = {}
+    tf_columns: dict[str, InputColumn] = {}
+    columns_to_select: dict[str, None] = {}
+
+    def add_input_column(column):
+        name = column.name()
+        if name not in input_columns:
+            input_columns[name] = column
+            columns_to_select.update(dict.fromkeys(column.l_r_names_as_l_r()))
+
+    for name in additional_columns or []:
+        add_input_column(interned_input_column(name, sql_dialect=sql_dialect))
+
+    for levels in comparisons:
+        for level in levels:
+            # Only the columns are needed, not the level's full compiled plan
+            level_columns = level._input_columns_used_by_sql_condition
+            if not level_columns:
+                continue
+            tf_column = level._tf_adjustment_input_column
+            for column in level_columns:
+                add_input_column(column)
+                # As in _render_columns_to_select_for_blocking, the tf columns
+                # follow each of the level's input columns
+                if tf_column:
+                    tf_name = tf_column.tf_name()
+                    if tf_name not in tf_columns:
+                        tf_columns[tf_name] = tf_column
+                        columns_to_select.update(
+                            dict.fromkeys(tf_column.l_r_tf_names_as_l_r())
+                        )
+
+    return ColumnPlan(
+        input_columns=tuple(input_columns.values()),
+        tf_columns=tuple(tf_columns.values()),
+        columns_to_select=tuple(columns_to_select),
+        source_columns=tuple(
+            dedupe_preserving_order(
+                [_source_column(c) for c in input_columns.values()]
+            )
+        ),
+        tf_source_columns=tuple(
+            c.unquote().tf_name() for c in tf_columns.values()
+        ),
+    )
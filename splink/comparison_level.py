@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 import math
 import re
-from statistics import median
+from dataclasses import dataclass
 from textwrap import dedent
 from typing import TYPE_CHECKING
 
@@ -13,7 +13,7 @@ from sqlglot.optimizer.normalize import normalize
 
 from .constants import LEVEL_NOT_OBSERVED_TEXT
 from .default_from_jsonschema import default_value_from_schema
-from .input_column import InputColumn, sqlglot_tree_signature
+from .input_column import InputColumn, interned_input_column, sqlglot_tree_signature
 from .misc import (
     dedupe_preserving_order,
     interpolate,
@@ -21,6 +21,8 @@ from .misc import (
     match_weight_to_bayes_factor,
 )
 from .parse_sql import get_columns_used_from_sql
+from .sql_transform import parse_one_cached
+from .trained_probabilities import TrainedProbabilityStore
 
 # https://stackoverflow.com/questions/39740632/python-type-hinting-without-cyclic-imports
 if TYPE_CHECKING:
@@ -101,6 +103,27 @@ def _default_u_values(num_levels):
     return u_vals
 
 
+@dataclass(frozen=True)
+class ComparisonLevelPlan:
+    """The sql fragments and analysis of a ComparisonLevel, rendered once for
+    its current dialect, comparison vector value and m and u probabilities.
+    See ComparisonLevel.compile.
+
+    The bayes factor and tf adjustment sql are None if the level doesn't
+    belong to a Comparison, as they can't be rendered without one.
+    """
+
+    sql_dialect: str
+    comparison_vector_value: int
+    when_then_comparison_vector_value_sql: str
+    bayes_factor_sql: str | None
+    tf_adjustment_sql: str | None
+    columns_to_select_for_blocking: tuple
+    input_columns: tuple
+    is_exact_match: bool
+    exact_match_colnames: tuple | None
+
+
 class ComparisonLevel:
     """Each ComparisonLevel defines a gradation (category) of similarity within a
     `Comparison`.
@@ -162,13 +185,24 @@ class ComparisonLevel:
         self._comparison_vector_value: int = None
         self._max_level: bool = None
 
-        # Enable the level to 'know' when it's been trained
-        self._trained_m_probabilities: list = []
-        self._trained_u_probabilities: list = []
+        # Enable the level to 'know' when it's been trained. Trained values
+        # are kept in a store, shared by every level of a model once
+        # share_trained_probability_store has been called, see
+        # _trained_probability_store
+        self._trained_store: TrainedProbabilityStore = None
+        self._trained_store_id: int = None
         # controls warnings from model training - ensures we only send once
         self._m_warning_sent = False
         self._u_warning_sent = False
 
+        # Values derived from parsing the sql condition, see _memoised
+        self._sql_memo: dict = {}
+        self._sql_memo_dialect = self.sql_dialect
+
+        # The compiled plan, and the state it was compiled from, see compile
+        self._plan: ComparisonLevelPlan = None
+        self._plan_key = None
+
         self._validate()
 
     @property
@@ -183,6 +217,18 @@ class ComparisonLevel:
     def sql_condition(self) -> str:
         return self._sql_condition
 
+    def _memoised(self, key, compute):
+        # Caches values derived from the sql condition, such as its parsed
+        # syntax tree. These depend on the dialect used to read the sql, so
+        # the cache is discarded whenever the dialect changes.
+        dialect = self.sql_dialect
+        if self._sql_memo_dialect != dialect:
+            self._sql_memo = {}
+            self._sql_memo_dialect = dialect
+        if key not in self._sql_memo:
+            self._sql_memo[key] = compute()
+        return self._sql_memo[key]
+
     def _level_dict_val_else_default(self, key):
         val = self._level_dict.get(key)
         if not val:
@@ -193,7 +239,7 @@ class ComparisonLevel:
     def _tf_adjustment_input_column(self):
         val = self._level_dict_val_else_default("tf_adjustment_column")
         if val:
-            return InputColumn(val, sql_dialect=self.sql_dialect)
+            return interned_input_column(val, sql_dialect=self.sql_dialect)
         else:
             return None
 
@@ -236,6 +282,7 @@ class ComparisonLevel:
                 self._m_warning_sent = True
 
         self._m_probability = value
+        self._plan = None
 
     @property
     def u_probability(self):
@@ -263,6 +310,7 @@ class ComparisonLevel:
                 )
                 self._u_warning_sent = True
         self._u_probability = value
+        self._plan = None
 
     @property
     def _m_probability_description(self):
@@ -282,31 +330,49 @@ class ComparisonLevel:
                 f"{self.label_for_charts.lower()} comparison level"
             )
 
+    @property
+    def _trained_probability_store(self):
+        if self._trained_store is None:
+            self._use_trained_probability_store(TrainedProbabilityStore())
+        return self._trained_store
+
+    def _use_trained_probability_store(self, store):
+        # Moves this level's trained values into another store
+        if self._trained_store is store:
+            return
+        if self._trained_store is None:
+            self._trained_store_id = store.register_level(self)
+        else:
+            self._trained_store_id = self._trained_store.move_level(
+                self._trained_store_id, store
+            )
+        self._trained_store = store
+
+    @property
+    def _trained_m_probabilities(self):
+        return self._trained_probability_store.values(self._trained_store_id, "m")
+
+    @property
+    def _trained_u_probabilities(self):
+        return self._trained_probability_store.values(self._trained_store_id, "u")
+
     def _add_trained_u_probability(self, val, desc="no description given"):
-        self._trained_u_probabilities.append(
-            {"probability": val, "description": desc, "m_or_u": "u"}
-        )
+        self._trained_probability_store.add(self._trained_store_id, "u", val, desc)
 
     def _add_trained_m_probability(self, val, desc="no description given"):
-        self._trained_m_probabilities.append(
-            {"probability": val, "description": desc, "m_or_u": "m"}
-        )
+        self._trained_probability_store.add(self._trained_store_id, "m", val, desc)
 
     @property
     def _has_estimated_u_values(self):
         if self.is_null_level:
             return True
-        vals = [r["probability"] for r in self._trained_u_probabilities]
-        vals = [v for v in vals if isinstance(v, (int, float))]
-        return len(vals) > 0
+        return self._trained_probability_store.has_values(self._trained_store_id, "u")
 
     @property
     def _has_estimated_m_values(self):
         if self.is_null_level:
             return True
-        vals = [r["probability"] for r in self._trained_m_probabilities]
-        vals = [v for v in vals if isinstance(v, (int, float))]
-        return len(vals) > 0
+        return self._trained_probability_store.has_values(self._trained_store_id, "m")
 
     @property
     def _has_estimated_values(self):
@@ -314,19 +380,11 @@ class ComparisonLevel:
 
     @property
     def _trained_m_median(self):
-        vals = [r["probability"] for r in self._trained_m_probabilities]
-        vals = [v for v in vals if isinstance(v, (int, float))]
-        if len(vals) == 0:
-            return None
-        return median(vals)
+        return self._trained_probability_store.median(self._trained_store_id, "m")
 
     @property
     def _trained_u_median(self):
-        vals = [r["probability"] for r in self._trained_u_probabilities]
-        vals = [v for v in vals if isinstance(v, (int, float))]
-        if len(vals) == 0:
-            return None
-        return median(vals)
+        return self._trained_probability_store.median(self._trained_store_id, "u")
 
     @property
     def _m_is_trained(self):
@@ -427,7 +485,7 @@ class ComparisonLevel:
         if dialect is None:
             dialect = "spark"
         try:
-            sqlglot.parse_one(sql, read=dialect)
+            parse_one_cached(sql, dialect, copy=False)
         except sqlglot.ParseError as e:
             raise ValueError(f"Error parsing sql_statement:\n{sql}") from e
 
@@ -440,12 +498,17 @@ class ComparisonLevel:
         if self._is_else_level:
             return []
 
-        cols = get_columns_used_from_sql(self.sql_condition, dialect=self.sql_dialect)
-        # Parsed order seems to be roughly in reverse order of apearance
-        cols = cols[::-1]
+        def input_colnames():
+            cols = get_columns_used_from_sql(
+                self.sql_condition, dialect=self.sql_dialect
+            )
+            # Parsed order seems to be roughly in reverse order of apearance
+            cols = cols[::-1]
+
+            cols = [re.sub(r"_L$|_R$", "", c, flags=re.IGNORECASE) for c in cols]
+            return tuple(dedupe_preserving_order(cols))
 
-        cols = [re.sub(r"_L$|_R$", "", c, flags=re.IGNORECASE) for c in cols]
-        cols = dedupe_preserving_order(cols)
+        cols = self._memoised("input_colnames", input_colnames)
 
         input_cols = []
         for c in cols:
@@ -453,13 +516,16 @@ class ComparisonLevel:
             # If so, we want to set the tf adjustments against the surname col,
             # not the dmeta_surname one
 
-            input_cols.append(InputColumn(c, sql_dialect=self.sql_dialect))
+            input_cols.append(interned_input_column(c, sql_dialect=self.sql_dialect))
 
         return input_cols
 
     @property
     def _columns_to_select_for_blocking(self):
         # e.g. l.first_name as first_name_l, r.first_name as first_name_r
+        return list(self.compile().columns_to_select_for_blocking)
+
+    def _render_columns_to_select_for_blocking(self):
         output_cols = []
         cols = self._input_columns_used_by_sql_condition
 
@@ -475,6 +541,9 @@ class ComparisonLevel:
     @property
     def _when_then_comparison_vector_value_sql(self):
         # e.g. when first_name_l = first_name_r then 1
+        return self.compile().when_then_comparison_vector_value_sql
+
+    def _render_when_then_comparison_vector_value_sql(self):
         if not hasattr(self, "_comparison_vector_value"):
             raise ValueError(
                 "Cannot get the 'when .. then ...' sql expression because "
@@ -488,48 +557,59 @@ class ComparisonLevel:
             return f"WHEN {self.sql_condition} THEN {self._comparison_vector_value}"
 
     @property
-    def _is_exact_match(self):
-        if self._is_else_level:
-            return False
-
-        sql_syntax_tree = sqlglot.parse_one(
-            self.sql_condition.lower(), read=self.sql_dialect
-        )
-        sql_cnf = normalize(sql_syntax_tree)
+    def _sql_condition_cnf_subclauses(self):
+        # The sql condition in conjunctive normal form, split on top-level 'AND'
+        def cnf_subclauses():
+            sql_syntax_tree = parse_one_cached(
+                self.sql_condition.lower(), self.sql_dialect
+            )
+            sql_cnf = normalize(sql_syntax_tree)
+            return _get_and_subclauses(sql_cnf)
 
-        exprs = _get_and_subclauses(sql_cnf)
-        for expr in exprs:
-            if not _is_exact_match(expr):
-                return False
-        return True
+        return self._memoised("cnf_subclauses", cnf_subclauses)
 
     @property
-    def _exact_match_colnames(self):
-        sql_syntax_tree = sqlglot.parse_one(
-            self.sql_condition.lower(), read=self.sql_dialect
-        )
-        sql_cnf = normalize(sql_syntax_tree)
+    def _exact_match_analysis(self):
+        # Returns (is_exact_match, exact_match_colnames), where the colnames
+        # are None if the level is not an exact match
+        def exact_match_analysis():
+            if self._is_else_level:
+                return False, None
 
-        exprs = _get_and_subclauses(sql_cnf)
-        for expr in exprs:
-            if not _is_exact_match(expr):
-                raise ValueError(
-                    "sql_cond not an exact match so can't get exact match column name"
-                )
+            exprs = self._sql_condition_cnf_subclauses
+            for expr in exprs:
+                if not _is_exact_match(expr):
+                    return False, None
+
+            # _exact_match_colname modifies the tree it is given
+            cols = [_exact_match_colname(expr.copy()) for expr in exprs]
+            return True, tuple(cols)
 
-        cols = []
-        for expr in exprs:
-            col = _exact_match_colname(expr)
-            cols.append(col)
-        return cols
+        return self._memoised("exact_match_analysis", exact_match_analysis)
 
     @property
-    def _u_probability_corresponding_to_exact_match(self):
+    def _is_exact_match(self):
+        is_exact_match, _ = self._exact_match_analysis
+        return is_exact_match
+
+    @property
+    def _exact_match_colnames(self):
+        is_exact_match, cols = self._exact_match_analysis
+        if not is_exact_match:
+            raise ValueError(
+                "sql_cond not an exact match so can't get exact match column name"
+            )
+        return list(cols)
+
+    @property
+    def _exact_match_level_for_tf_adjustment(self):
+        # The sibling level which is an exact match on the tf adjustment
+        # column. Not cached, as _is_exact_match is memoised, so the scan is
+        # cheap, and the comparison's levels can change.
         levels = self.comparison.comparison_levels
 
         # Find a level with a single exact match colname
         # which is equal to the tf adjustment input colname
-
         for level in levels:
             if not level._is_exact_match:
                 continue
@@ -537,7 +617,14 @@ class ComparisonLevel:
             if len(colnames) != 1:
                 continue
             if colnames[0] == self._tf_adjustment_input_column_name.lower():
-                return level.u_probability
+                return level
+        return None
+
+    @property
+    def _u_probability_corresponding_to_exact_match(self):
+        level = self._exact_match_level_for_tf_adjustment
+        if level is not None:
+            return level.u_probability
         raise ValueError(
             "Could not find an exact match level for "
             f"{self._tf_adjustment_input_column_name}."
@@ -547,6 +634,13 @@ class ComparisonLevel:
 
     @property
     def _bayes_factor_sql(self):
+        bayes_factor_sql = self.compile().bayes_factor_sql
+        if bayes_factor_sql is None:
+            # Not compiled without a comparison, so render to raise the error
+            return self._render_bayes_factor_sql()
+        return bayes_factor_sql
+
+    def _render_bayes_factor_sql(self):
         bayes_factor = (
             self._bayes_factor if self._bayes_factor != math.inf else "'Infinity'"
         )
@@ -559,6 +653,14 @@ class ComparisonLevel:
 
     @property
     def _tf_adjustment_sql(self):
+        tf_adjustment_sql = self.compile().tf_adjustment_sql
+        if tf_adjustment_sql is None:
+            # Not compiled, e.g. as there's no exact match level to find the
+            # u probability of, so render to raise the error
+            return self._render_tf_adjustment_sql()
+        return tf_adjustment_sql
+
+    def _render_tf_adjustment_sql(self):
         gamma_column_name = self.comparison._gamma_column_name
         gamma_colname_value_is_this_level = (
             f"{gamma_column_name} = {self._comparison_vector_value}"
@@ -628,6 +730,72 @@ class ComparisonLevel:
             """
         return dedent(sql).strip()
 
+    def _compile_key(self):
+        # Everything the plan's sql depends on which can change after the
+        # level is created. The sql condition and tf settings can't.
+        key = [
+            self.sql_dialect,
+            self._comparison_vector_value,
+            self._m_probability,
+            self._u_probability,
+        ]
+        if self._has_comparison:
+            key += [
+                self.comparison,
+                self.comparison._gamma_column_name,
+                self.comparison._num_levels,
+            ]
+            if self._has_tf_adjustments:
+                exact_match_level = self._exact_match_level_for_tf_adjustment
+                if exact_match_level is not None:
+                    key += [exact_match_level, exact_match_level._u_probability]
+        return tuple(key)
+
+    def compile(self) -> ComparisonLevelPlan:
+        """Renders the level's sql fragments, and the analysis of its sql
+        condition, into an immutable plan.
+
+        The plan is cached, and only rebuilt when the level's dialect,
+        comparison vector value or comparison, or the m and u probabilities
+        its sql depends on, change. So generating sql for a model, e.g. at
+        each iteration of EM, is string concatenation of cached fragments.
+
+        Returns:
+            ComparisonLevelPlan: The plan.
+        """
+        key = self._compile_key()
+        if self._plan is not None and self._plan_key == key:
+            return self._plan
+
+        bayes_factor_sql = None
+        tf_adjustment_sql = None
+        if self._has_comparison:
+            bayes_factor_sql = self._render_bayes_factor_sql()
+            try:
+                tf_adjustment_sql = self._render_tf_adjustment_sql()
+            except ValueError:
+                # Raised when _tf_adjustment_sql is used
+                pass
+
+        is_exact_match, exact_match_colnames = self._exact_match_analysis
+        self._plan = ComparisonLevelPlan(
+            sql_dialect=self.sql_dialect,
+            comparison_vector_value=self._comparison_vector_value,
+            when_then_comparison_vector_value_sql=(
+                self._render_when_then_comparison_vector_value_sql()
+            ),
+            bayes_factor_sql=bayes_factor_sql,
+            tf_adjustment_sql=tf_adjustment_sql,
+            columns_to_select_for_blocking=tuple(
+                self._render_columns_to_select_for_blocking()
+            ),
+            input_columns=tuple(self._input_columns_used_by_sql_condition),
+            is_exact_match=is_exact_match,
+            exact_match_colnames=exact_match_colnames,
+        )
+        self._plan_key = key
+        return self._plan
+
     def as_dict(self):
         "The minimal representation of this level to use as an input to Splink"
         output = {}
@@ -689,27 +857,9 @@ class ComparisonLevel:
 
     @property
     def _parameter_estimates_as_records(self):
-        output_records = []
-
-        cl_record = self._as_detailed_record
-        trained_values = self._trained_u_probabilities + self._trained_m_probabilities
-        for trained_value in trained_values:
-            record = {}
-            record["m_or_u"] = trained_value["m_or_u"]
-            p = trained_value["probability"]
-            record["estimated_probability"] = p
-            record["estimate_description"] = trained_value["description"]
-            if p is not None and p != LEVEL_NOT_OBSERVED_TEXT and p > 0.0 and p < 1.0:
-                record["estimated_probability_as_log_odds"] = math.log2(p / (1 - p))
-            else:
-                record["estimated_probability_as_log_odds"] = None
-
-            record["sql_condition"] = cl_record["sql_condition"]
-            record["comparison_level_label"] = cl_record["label_for_charts"]
-            record["comparison_vector_value"] = cl_record["comparison_vector_value"]
-            output_records.append(record)
-
-        return output_records
+        return self._trained_probability_store.parameter_estimates_as_records(
+            [self._trained_store_id]
+        )
 
     def _validate(self):
         self._validate_sql()
@@ -3,7 +3,7 @@ from __future__ import annotations
 import warnings
 
 from .comparison_level import ComparisonLevel
-from .input_column import InputColumn
+from .input_column import interned_input_column
 
 
 class NullLevelBase(ComparisonLevel):
@@ -31,7 +31,7 @@ class NullLevelBase(ComparisonLevel):
             )
             valid_string_pattern = valid_string_regex
 
-        col = InputColumn(col_name, sql_dialect=self._sql_dialect)
+        col = interned_input_column(col_name, sql_dialect=self._sql_dialect)
         col_name_l, col_name_r = col.name_l(), col.name_r()
 
         if invalid_dates_as_null:
@@ -67,7 +67,7 @@ class ExactMatchLevelBase(ComparisonLevel):
         manual_col_name_for_charts_label=None,
     ) -> ComparisonLevel:
 
-        col = InputColumn(col_name, sql_dialect=self._sql_dialect)
+        col = interned_input_column(col_name, sql_dialect=self._sql_dialect)
 
         if include_colname_in_charts_label:
             label_suffix = f" {col_name}"
@@ -133,7 +133,7 @@ class DistanceFunctionLevelBase(ComparisonLevel):
         m_probability=None,
     ) -> ComparisonLevel:
 
-        col = InputColumn(col_name, sql_dialect=self._sql_dialect)
+        col = interned_input_column(col_name, sql_dialect=self._sql_dialect)
 
         if higher_is_more_similar:
             operator = ">="
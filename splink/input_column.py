@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from copy import deepcopy
+from copy import copy
+from typing import NamedTuple
 
 import sqlglot
 import sqlglot.expressions as exp
@@ -8,6 +9,14 @@ from sqlglot.errors import ParseError
 
 # from .default_from_jsonschema import default_value_from_schema
 
+# The settings schema's defaults for the column prefixes, used when a column
+# has no settings object
+_DEFAULT_PREFIXES = {
+    "comparison_vector_value_column_prefix": "gamma_",
+    "bayes_factor_column_prefix": "bf_",
+    "term_frequency_adjustment_column_prefix": "tf_",
+}
+
 
 def sqlglot_tree_signature(tree):
     """
@@ -52,6 +61,36 @@ def remove_quotes_from_identifiers(tree):
     return tree
 
 
+class _RenderedNames(NamedTuple):
+    """The rendered _l and _r forms of a column name in a given dialect.
+
+    For instance, for the column first_name:
+        name_l: "first_name_l"
+        name_r: "first_name_r"
+        l_name_as_l: "l"."first_name" as "first_name_l"
+        r_name_as_r: "r"."first_name" as "first_name_r"
+    """
+
+    name_l: str
+    name_r: str
+    l_name_as_l: str
+    r_name_as_r: str
+
+
+def _render_names(tree, dialect) -> _RenderedNames:
+    name_l = add_suffix(tree, suffix="_l").sql(dialect=dialect)
+    name_r = add_suffix(tree, suffix="_r").sql(dialect=dialect)
+    name_with_l_table = add_table(tree, "l").sql(dialect=dialect)
+    name_with_r_table = add_table(tree, "r").sql(dialect=dialect)
+
+    return _RenderedNames(
+        name_l=name_l,
+        name_r=name_r,
+        l_name_as_l=f"{name_with_l_table} as {name_l}",
+        r_name_as_r=f"{name_with_r_table} as {name_r}",
+    )
+
+
 class InputColumn:
     def __init__(self, name, settings_obj=None, sql_dialect=None):
         # If settings_obj is None, then default values will be used
@@ -72,17 +111,51 @@ class InputColumn:
         for identifier in self.input_name_as_tree.find_all(exp.Identifier):
             identifier.args["quoted"] = True
 
+        # Rendered names, keyed on the dialect and prefix used to render them
+        self._rendered = {}
+        # Quoted and unquoted copies of this column, keyed on quoting
+        self._siblings = {}
+
     def quote(self):
-        self_copy = deepcopy(self)
-        for identifier in self_copy.input_name_as_tree.find_all(exp.Identifier):
-            identifier.args["quoted"] = True
-        return self_copy
+        return self._with_quoting(True)
 
     def unquote(self):
-        self_copy = deepcopy(self)
-        for identifier in self_copy.input_name_as_tree.find_all(exp.Identifier):
-            identifier.args["quoted"] = False
-        return self_copy
+        return self._with_quoting(False)
+
+    def _with_quoting(self, quoted):
+        sibling = self._siblings.get(quoted)
+        if sibling is None:
+            sibling = copy(self)
+            sibling.input_name_as_tree = self.input_name_as_tree.copy()
+            for identifier in sibling.input_name_as_tree.find_all(exp.Identifier):
+                identifier.args["quoted"] = quoted
+            sibling._rendered = {}
+            sibling._siblings = {quoted: sibling}
+            self._siblings[quoted] = sibling
+        return sibling
+
+    def _render(self, key, render):
+        key = (key, self._sql_dialect)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = self._rendered[key] = render()
+        return rendered
+
+    @property
+    def _names(self) -> _RenderedNames:
+        return self._render(
+            "names", lambda: _render_names(self.input_name_as_tree, self._sql_dialect)
+        )
+
+    def _tf_tree(self):
+        return add_prefix(self.input_name_as_tree, prefix=self.tf_prefix)
+
+    @property
+    def _tf_names(self) -> _RenderedNames:
+        return self._render(
+            ("tf_names", self.tf_prefix),
+            lambda: _render_names(self._tf_tree(), self._sql_dialect),
+        )
 
     def parse_input_name_to_sqlglot_tree(self):
         # Cases that could occur for self.input_name:
@@ -111,14 +184,14 @@ class InputColumn:
             tree = sqlglot.parse_one(f'"{self.input_name}"', read=self._sql_dialect)
             return tree
 
-    # def from_settings_obj_else_default(self, key, schema_key=None):
-    #     # Covers the case where no settings obj is set on the comparison level
-    #     if self._settings_obj:
-    #         return getattr(self._settings_obj, key)
-    #     else:
-    #         if not schema_key:
-    #             schema_key = key
-    #         return default_value_from_schema(schema_key, "root")
+    def from_settings_obj_else_default(self, key, schema_key=None):
+        # Covers the case where no settings obj is set on the comparison level
+        if self._settings_obj:
+            return getattr(self._settings_obj, key)
+        else:
+            if not schema_key:
+                schema_key = key
+            return _DEFAULT_PREFIXES[schema_key]
 
     @property
     def gamma_prefix(self):
@@ -139,70 +212,57 @@ class InputColumn:
         )
 
     def name(self):
-        return self.input_name_as_tree.sql(dialect=self._sql_dialect)
+        return self._render(
+            "name", lambda: self.input_name_as_tree.sql(dialect=self._sql_dialect)
+        )
 
     def name_l(self):
-        return add_suffix(self.input_name_as_tree, suffix="_l").sql(
-            dialect=self._sql_dialect
-        )
+        return self._names.name_l
 
     def name_r(self):
-        return add_suffix(self.input_name_as_tree, suffix="_r").sql(
-            dialect=self._sql_dialect
-        )
+        return self._names.name_r
 
     def names_l_r(self):
         return [self.name_l(), self.name_r()]
 
     def l_name_as_l(self):
-        name_with_l_table = add_table(self.input_name_as_tree, "l").sql(
-            dialect=self._sql_dialect
-        )
-        return f"{name_with_l_table} as {self.name_l()}"
+        return self._names.l_name_as_l
 
     def r_name_as_r(self):
-        name_with_r_table = add_table(self.input_name_as_tree, "r").sql(
-            dialect=self._sql_dialect
-        )
-        return f"{name_with_r_table} as {self.name_r()}"
+        return self._names.r_name_as_r
 
     def l_r_names_as_l_r(self):
         return [self.l_name_as_l(), self.r_name_as_r()]
 
     def bf_name(self):
-        return add_prefix(self.input_name_as_tree, prefix=self.bf_prefix).sql(
-            dialect=self._sql_dialect
+        bf_prefix = self.bf_prefix
+        return self._render(
+            ("bf_name", bf_prefix),
+            lambda: add_prefix(self.input_name_as_tree, prefix=bf_prefix).sql(
+                dialect=self._sql_dialect
+            ),
         )
 
     def tf_name(self):
-        return add_prefix(self.input_name_as_tree, prefix=self.tf_prefix).sql(
-            dialect=self._sql_dialect
+        return self._render(
+            ("tf_name", self.tf_prefix),
+            lambda: self._tf_tree().sql(dialect=self._sql_dialect),
         )
 
     def tf_name_l(self):
-        tree = add_prefix(self.input_name_as_tree, prefix=self.tf_prefix)
-        return add_suffix(tree, suffix="_l").sql(dialect=self._sql_dialect)
+        return self._tf_names.name_l
 
     def tf_name_r(self):
-        tree = add_prefix(self.input_name_as_tree, prefix=self.tf_prefix)
-        return add_suffix(tree, suffix="_r").sql(dialect=self._sql_dialect)
+        return self._tf_names.name_r
 
     def tf_name_l_r(self):
         return [self.tf_name_l(), self.tf_name_r()]
 
     def l_tf_name_as_l(self):
-        tree = add_prefix(self.input_name_as_tree, prefix=self.tf_prefix)
-        tf_name_with_l_table = add_table(tree, tablename="l").sql(
-            dialect=self._sql_dialect
-        )
-        return f"{tf_name_with_l_table} as {self.tf_name_l()}"
+        return self._tf_names.l_name_as_l
 
     def r_tf_name_as_r(self):
-        tree = add_prefix(self.input_name_as_tree, prefix=self.tf_prefix)
-        tf_name_with_r_table = add_table(tree, tablename="r").sql(
-            dialect=self._sql_dialect
-        )
-        return f"{tf_name_with_r_table} as {self.tf_name_r()}"
+        return self._tf_names.r_name_as_r
 
     def l_r_tf_names_as_l_r(self):
         return [self.l_tf_name_as_l(), self.r_tf_name_as_r()]
@@ -215,6 +275,29 @@ class InputColumn:
         return start + name + end
 
 
+# Shared InputColumns, keyed on (raw name, dialect)
+_interned_input_columns: dict[tuple[str, str], InputColumn] = {}
+
+
+def interned_input_column(name, sql_dialect=None) -> InputColumn:
+    """Returns the shared InputColumn for a column name in a given dialect.
+
+    An InputColumn without a settings object depends only on its name and
+    dialect, so the same instance can be handed to every comparison level that
+    refers to the column, and the name is only parsed once.
+
+    The returned column is shared, so must not be modified. Use `quote()` or
+    `unquote()` to get a differently quoted version of it.
+    """
+    key = (name, sql_dialect)
+    input_column = _interned_input_columns.get(key)
+    if input_column is None:
+        input_column = _interned_input_columns.setdefault(
+            key, InputColumn(name, sql_dialect=sql_dialect)
+        )
+    return input_column
+
+
 def _get_dialect_quotes(dialect):
     start = end = '"'
     if dialect is None:
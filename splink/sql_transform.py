@@ -1,6 +1,36 @@
+from functools import lru_cache
+
 import sqlglot
 import sqlglot.expressions as exp
 
+# Maximum number of distinct (sql, dialect) pairs held by the parse cache
+PARSE_CACHE_MAXSIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_MAXSIZE)
+def _parse_one_cached(sql, dialect):
+    return sqlglot.parse_one(sql, read=dialect)
+
+
+def parse_one_cached(sql, dialect=None, copy=True):
+    """Parses a sql string, reusing the syntax tree from any previous parse
+    of the same (sql, dialect) pair.
+
+    sqlglot syntax trees are mutable, so by default a copy of the cached
+    tree is returned. Only pass `copy=False` if the tree will not be modified.
+
+    Args:
+        sql (str): The sql to parse.
+        dialect (str, optional): The sqlglot dialect to read the sql with.
+        copy (bool, optional): Whether to return a copy of the cached tree.
+            Defaults to True.
+
+    Returns:
+        sqlglot.expression: The parsed syntax tree.
+    """
+    tree = _parse_one_cached(sql, dialect)
+    return tree.copy() if copy else tree
+
 
 def sqlglot_transform_sql(sql, func, dialect=None):
     syntax_tree = sqlglot.parse_one(sql, read=dialect)
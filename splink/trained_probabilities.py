@@ -0,0 +1,294 @@
+"""Columnar storage for the history of trained m and u probabilities.
+
+Each ComparisonLevel records every m and u probability estimated for it, and
+the description of the training session that estimated it. Rather than a
+list of dicts per level, the estimates of every level of a model are held in
+a single TrainedProbabilityStore: parallel columns of the level, m or u,
+probability and description of each estimate, with descriptions interned as
+integer codes. Medians and log odds are then computed over all levels at
+once:
+
+> store = share_trained_probability_store(comparisons)
+> ...train...
+> m_medians = store.medians("m")
+> records = store.parameter_estimates_as_records()
+"""
+
+from __future__ import annotations
+
+import math
+import numbers
+import statistics
+
+import numpy as np
+
+from .constants import LEVEL_NOT_OBSERVED_TEXT
+
+_M_OR_U = {"m": 0, "u": 1}
+
+# How a trained value is stored, as splink records the text
+# LEVEL_NOT_OBSERVED_TEXT, or None, where a level can't be estimated
+_PROBABILITY = 0
+_NOT_OBSERVED = 1
+_NONE = 2
+_OTHER = 3
+
+
+class TrainedProbabilityStore:
+    """The trained m and u probabilities of a set of comparison levels, in
+    the order they were added.
+
+    Levels are registered with register_level, and then referred to by the
+    integer id it returns. Each level keeps an index of its own entries, so
+    the methods taking a level id only look at that level's entries, and
+    the columns are converted to arrays for the methods over every level
+    only when those are called.
+    """
+
+    def __init__(self):
+        self._levels = []
+        # The rows of each level's m and u entries, indexed by level id
+        self._level_rows = []
+        self._descriptions = []
+        self._description_codes = {}
+        self._level_ids = []
+        self._kinds = []
+        self._statuses = []
+        # The probabilities as they were given, and as floats
+        self._values = []
+        self._probabilities = []
+        self._codes = []
+        self._arrays = None
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def levels(self):
+        return list(self._levels)
+
+    def register_level(self, level):
+        """Adds a level to the store, returning its id."""
+        self._levels.append(level)
+        self._level_rows.append(([], []))
+        return len(self._levels) - 1
+
+    def _description_code(self, description):
+        code = self._description_codes.get(description)
+        if code is None:
+            code = len(self._descriptions)
+            self._descriptions.append(description)
+            self._description_codes[description] = code
+        return code
+
+    @staticmethod
+    def _encode(probability):
+        # numbers.Real includes NumPy scalars, e.g. np.float32 and np.int64,
+        # but is a slow check, so plain floats and ints are checked first
+        if isinstance(probability, (float, int)) or isinstance(
+            probability, numbers.Real
+        ):
+            return _PROBABILITY, float(probability)
+        if probability is None:
+            return _NONE, math.nan
+        if probability == LEVEL_NOT_OBSERVED_TEXT:
+            return _NOT_OBSERVED, math.nan
+        # Anything else is kept as it was given, but isn't a probability
+        return _OTHER, math.nan
+
+    def _rows(self, level_id, m_or_u):
+        return self._level_rows[level_id][_M_OR_U[m_or_u]]
+
+    def add(self, level_id, m_or_u, probability, description):
+        """Records a trained probability of a level."""
+        kind = _M_OR_U[m_or_u]
+        status, value = self._encode(probability)
+        self._level_rows[level_id][kind].append(len(self._values))
+        self._level_ids.append(level_id)
+        self._kinds.append(kind)
+        self._statuses.append(status)
+        self._values.append(probability)
+        self._probabilities.append(value)
+        self._codes.append(self._description_code(description))
+        self._arrays = None
+
+    def replace(self, level_id, m_or_u, probability, description):
+        """Replaces the level's latest trained probability with this
+        description, or adds one if it has none."""
+        code = self._description_codes.get(description)
+        if code is not None:
+            for i in reversed(self._rows(level_id, m_or_u)):
+                if self._codes[i] == code:
+                    self._statuses[i], self._probabilities[i] = self._encode(
+                        probability
+                    )
+                    self._values[i] = probability
+                    self._arrays = None
+                    return
+        self.add(level_id, m_or_u, probability, description)
+
+    def _numeric_probabilities(self, level_id, m_or_u):
+        statuses, probabilities = self._statuses, self._probabilities
+        return [
+            probabilities[i]
+            for i in self._rows(level_id, m_or_u)
+            if statuses[i] == _PROBABILITY
+        ]
+
+    def values(self, level_id, m_or_u):
+        """The level's trained probabilities, as the dicts splink records."""
+        return [
+            {
+                "probability": self._values[i],
+                "description": self._descriptions[self._codes[i]],
+                "m_or_u": m_or_u,
+            }
+            for i in self._rows(level_id, m_or_u)
+        ]
+
+    def has_values(self, level_id, m_or_u):
+        """Whether the level has a numeric trained probability."""
+        statuses = self._statuses
+        return any(
+            statuses[i] == _PROBABILITY for i in self._rows(level_id, m_or_u)
+        )
+
+    def median(self, level_id, m_or_u):
+        """The median of the level's numeric trained probabilities, or None
+        if it has none."""
+        probabilities = self._numeric_probabilities(level_id, m_or_u)
+        if not probabilities:
+            return None
+        return statistics.median(probabilities)
+
+    def _as_arrays(self):
+        # The columns as arrays, kept until the next entry is added
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._level_ids, dtype=np.int64),
+                np.array(self._kinds, dtype=np.int8),
+                np.array(self._statuses, dtype=np.int8) == _PROBABILITY,
+                np.array(self._probabilities, dtype=np.float64),
+            )
+        return self._arrays
+
+    def medians(self, m_or_u):
+        """The median of the numeric trained probabilities of every level.
+
+        Returns:
+            numpy.ndarray: The median of each level, indexed by level id. NaN
+                for levels with no numeric trained probabilities.
+        """
+        level_ids, kinds, numeric, probabilities = self._as_arrays()
+        mask = (kinds == _M_OR_U[m_or_u]) & numeric
+        level_ids = level_ids[mask]
+        probabilities = probabilities[mask]
+
+        # Sort each level's probabilities together, then average the middle
+        # one or two of each
+        order = np.lexsort((probabilities, level_ids))
+        probabilities = probabilities[order]
+        counts = np.bincount(level_ids, minlength=len(self._levels))
+        starts = np.cumsum(counts) - counts
+        has_values = counts > 0
+        lower = starts[has_values] + (counts[has_values] - 1) // 2
+        upper = starts[has_values] + counts[has_values] // 2
+
+        medians = np.full(len(self._levels), np.nan)
+        medians[has_values] = (probabilities[lower] + probabilities[upper]) / 2
+        return medians
+
+    def log_odds(self):
+        """The log2 odds of every trained probability, in the order they
+        were added. NaN for probabilities of 0 or 1, and non-numeric ones."""
+        _, _, numeric, p = self._as_arrays()
+        valid = numeric & (p > 0.0) & (p < 1.0)
+        log_odds = np.full(len(p), np.nan)
+        log_odds[valid] = np.log2(p[valid] / (1 - p[valid]))
+        return log_odds
+
+    def move_level(self, level_id, store):
+        """Copies a level's trained probabilities into another store, and
+        registers the level with it, returning its id in that store."""
+        new_id = store.register_level(self._levels[level_id])
+        # In the order added, as the m and u entries may be interleaved
+        rows = sorted(self._rows(level_id, "m") + self._rows(level_id, "u"))
+        for i in rows:
+            store.add(
+                new_id,
+                "m" if self._kinds[i] == _M_OR_U["m"] else "u",
+                self._values[i],
+                self._descriptions[self._codes[i]],
+            )
+        return new_id
+
+    def parameter_estimates_as_records(self, level_ids=None):
+        """The trained probabilities as records, as
+        ComparisonLevel._parameter_estimates_as_records.
+
+        Args:
+            level_ids (list[int], optional): The levels to include. Defaults
+                to every level in the store.
+
+        Returns:
+            list[dict]: The records, level by level, each level's u
+                probabilities before its m probabilities.
+        """
+        if level_ids is None:
+            level_ids = range(len(self._levels))
+
+        statuses, probabilities = self._statuses, self._probabilities
+        records = []
+        for level_id in level_ids:
+            cl_record = self._levels[level_id]._as_detailed_record
+            for m_or_u in ("u", "m"):
+                for i in self._rows(level_id, m_or_u):
+                    p = probabilities[i]
+                    if statuses[i] == _PROBABILITY and 0.0 < p < 1.0:
+                        log_odds = math.log2(p / (1 - p))
+                    else:
+                        log_odds = None
+                    records.append(
+                        {
+                            "m_or_u": m_or_u,
+                            "estimated_probability": self._values[i],
+                            "estimate_description": self._descriptions[
+                                self._codes[i]
+                            ],
+                            "estimated_probability_as_log_odds": log_odds,
+                            "sql_condition": cl_record["sql_condition"],
+                            "comparison_level_label": cl_record["label_for_charts"],
+                            "comparison_vector_value": cl_record[
+                                "comparison_vector_value"
+                            ],
+                        }
+                    )
+        return records
+
+    def __repr__(self):
+        return (
+            f"<{len(self):,} trained probabilities of "
+            f"{len(self._levels):,} comparison levels>"
+        )
+
+
+def share_trained_probability_store(comparisons, store=None):
+    """Moves the trained probabilities of every level of a model into a
+    single store.
+
+    Args:
+        comparisons (dict[str, list[ComparisonLevel]] | list): The levels of
+            each comparison, as a dict or a list of lists of levels.
+        store (TrainedProbabilityStore, optional): Defaults to a new store.
+
+    Returns:
+        TrainedProbabilityStore: The shared store.
+    """
+    if store is None:
+        store = TrainedProbabilityStore()
+    if isinstance(comparisons, dict):
+        comparisons = comparisons.values()
+    for levels in comparisons:
+        for level in levels:
+            level._use_trained_probability_store(store)
+    return store
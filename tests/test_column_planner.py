@@ -0,0 +1,117 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+# The level library and splink.misc aren't part of this tree
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+column_planner = pytest.importorskip("splink.column_planner")
+from splink.comparison_level import ComparisonLevel  # noqa: E402
+from splink.input_column import interned_input_column  # noqa: E402
+
+
+def _custom_level(sql_condition, **level_dict):
+    return ComparisonLevel(
+        {"sql_condition": sql_condition, **level_dict}, sql_dialect="duckdb"
+    )
+
+
+def _comparisons():
+    levels = factories._core_comparison_levels("duckdb")
+    return {
+        "first_name": [
+            levels["null_level"]("first_name"),
+            levels["exact_match_level"]("first_name", term_frequency_adjustments=True),
+            _custom_level(
+                'levenshtein("first_name_l", "first_name_r") <= 2',
+                tf_adjustment_column="first_name",
+                tf_adjustment_weight=0.5,
+            ),
+            levels["else_level"](),
+        ],
+        "name_and_dob": [
+            _custom_level('"surname_l" = "surname_r" AND "dob_l" = "dob_r"'),
+            levels["exact_match_level"]("surname", term_frequency_adjustments=True),
+            _custom_level('"dob_l" = "dob_r"'),
+            levels["else_level"](),
+        ],
+        "location": [
+            _custom_level("abs(geocode_l['lat'] - geocode_r['lat']) < 0.1"),
+            _custom_level('"city_l" = "city_r"'),
+            levels["else_level"](),
+        ],
+    }
+
+
+def _deduped(columns):
+    return list(dict.fromkeys(columns))
+
+
+def _per_level_columns(comparisons):
+    return [
+        column
+        for levels in comparisons.values()
+        for level in levels
+        for column in level._columns_to_select_for_blocking
+    ]
+
+
+def test_plan_matches_deduplicated_level_columns():
+    comparisons = _comparisons()
+    plan = column_planner.plan_columns(comparisons)
+    assert list(plan.columns_to_select) == _deduped(_per_level_columns(comparisons))
+
+    # A list of lists of levels plans the same columns
+    assert column_planner.plan_columns(list(comparisons.values())) == plan
+
+
+def test_additional_columns_come_first():
+    comparisons = _comparisons()
+    plan = column_planner.plan_columns(
+        comparisons, additional_columns=["unique_id", "city"], sql_dialect="duckdb"
+    )
+    additional = [
+        column
+        for name in ["unique_id", "city"]
+        for column in interned_input_column(
+            name, sql_dialect="duckdb"
+        ).l_r_names_as_l_r()
+    ]
+    assert list(plan.columns_to_select) == _deduped(
+        additional + _per_level_columns(comparisons)
+    )
+
+
+def test_source_columns_select_from_parquet(tmp_path):
+    plan = column_planner.plan_columns(
+        _comparisons(), additional_columns=["unique_id"], sql_dialect="duckdb"
+    )
+    assert set(plan.source_columns) == {
+        "unique_id",
+        "first_name",
+        "surname",
+        "dob",
+        "geocode",
+        "city",
+    }
+    assert set(plan.tf_source_columns) == {"tf_first_name", "tf_surname"}
+
+    records = pa.table(
+        {
+            "unique_id": [1, 2],
+            "first_name": ["ann", "bob"],
+            "surname": ["lee", "roe"],
+            "dob": ["2000-01-01", "2001-02-03"],
+            "geocode": [{"lat": 1.0, "lon": 2.0}, {"lat": 3.0, "lon": 4.0}],
+            "city": ["leeds", "york"],
+            "unused": ["x", "y"],
+        }
+    )
+    # A quote in the path has to be escaped in the sql
+    path = tmp_path / "o'brien.parquet"
+    pq.write_table(records, path)
+    read = duckdb.sql(plan.read_parquet_sql(str(path))).to_arrow_table()
+    assert read.column_names == list(plan.source_columns)
+    assert read.num_rows == 2
@@ -0,0 +1,79 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from execution.duckdb_engine import DuckDBComparisonEngine
+
+# The level library and numpy engine need splink modules which aren't part
+# of this tree
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+numpy_engine = pytest.importorskip("execution.numpy_engine")
+
+
+def _comparisons(dialect):
+    levels = factories._core_comparison_levels(dialect)
+    return {
+        "first_name": [
+            levels["null_level"]("first_name"),
+            levels["exact_match_level"]("first_name"),
+            levels["damerau_levenshtein_level"]("first_name", 1),
+            levels["damerau_levenshtein_level"]("first_name", 2),
+            levels["else_level"](),
+        ],
+        "surname": [
+            levels["null_level"]("surname"),
+            levels["exact_match_level"]("surname", set_to_lowercase=True),
+            levels["distance_function_level"](
+                "surname", "levenshtein", 2, higher_is_more_similar=False
+            ),
+            levels["else_level"](),
+        ],
+        "dob": [
+            levels["null_level"]("dob"),
+            levels["exact_match_level"]("dob"),
+            levels["else_level"](),
+        ],
+    }
+
+
+def _pairs(num_pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    # Including non-ASCII names, which both engines compare as UTF-8 bytes
+    names = np.array(
+        ["john", "jon", "joan", "jonathan", "Smith", "smith", "smyth"]
+        + ["josé", "jose", "zoë", "zoe", "Müller", "muller", "mülle"]
+    )
+
+    def column():
+        values = rng.choice(names, num_pairs).astype(object)
+        values[rng.random(num_pairs) < 0.1] = None
+        return values
+
+    dob = rng.integers(0, 5, num_pairs).astype(str).astype(object)
+    return pa.table(
+        {
+            "first_name_l": column(),
+            "first_name_r": column(),
+            "surname_l": column(),
+            "surname_r": column(),
+            "dob_l": dob,
+            "dob_r": rng.permutation(dob),
+        }
+    )
+
+
+def test_numpy_engine_matches_duckdb_engine():
+    pairs = _pairs(5000)
+    expected = DuckDBComparisonEngine().compute_comparison_vectors(
+        pairs, _comparisons("duckdb")
+    )
+    result = numpy_engine.NumpyComparisonEngine().compute_comparison_vectors(
+        pairs, _comparisons("numpy")
+    )
+    for name in ["first_name", "surname", "dob"]:
+        np.testing.assert_array_equal(
+            np.asarray(result[f"gamma_{name}"]),
+            expected.column(f"gamma_{name}").to_numpy(),
+        )
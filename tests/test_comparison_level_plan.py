@@ -0,0 +1,74 @@
+import pytest
+
+# The level library and Comparison are splink modules which aren't part of
+# this tree
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+comparison_module = pytest.importorskip("splink.comparison")
+from splink.comparison_level import ComparisonLevel  # noqa: E402
+
+
+def _comparison():
+    levels = factories._core_comparison_levels("duckdb")
+    comparison_levels = [
+        levels["null_level"]("first_name"),
+        levels["exact_match_level"]("first_name", term_frequency_adjustments=True),
+        ComparisonLevel(
+            {
+                "sql_condition": 'levenshtein("first_name_l", "first_name_r") <= 1',
+                "tf_adjustment_column": "first_name",
+                "tf_adjustment_weight": 0.5,
+            },
+            sql_dialect="duckdb",
+        ),
+        levels["else_level"](),
+    ]
+    comparison = comparison_module.Comparison(comparison_levels, "first_name")
+    for level, m, u in zip(comparison_levels[1:], [0.8, 0.15, 0.05], [0.1, 0.2, 0.7]):
+        level.m_probability = m
+        level.u_probability = u
+    return comparison
+
+
+def _assert_plans_are_current(comparison):
+    # Every cached plan matches the sql rendered from the level's state now
+    for level in comparison.comparison_levels:
+        plan = level.compile()
+        assert plan.bayes_factor_sql == level._render_bayes_factor_sql()
+        assert plan.tf_adjustment_sql == level._render_tf_adjustment_sql()
+        assert plan.comparison_vector_value == level._comparison_vector_value
+
+
+def test_plans_are_cached():
+    comparison = _comparison()
+    for level in comparison.comparison_levels:
+        assert level.compile() is level.compile()
+    _assert_plans_are_current(comparison)
+
+
+def test_plan_is_rebuilt_when_m_or_u_changes():
+    comparison = _comparison()
+    level = comparison.comparison_levels[2]
+    plan = level.compile()
+
+    level.m_probability = 0.3
+    assert level.compile() is not plan
+    _assert_plans_are_current(comparison)
+
+    plan = level.compile()
+    level.u_probability = 0.25
+    assert level.compile() is not plan
+    _assert_plans_are_current(comparison)
+
+
+def test_tf_plan_is_rebuilt_when_the_exact_match_u_changes():
+    comparison = _comparison()
+    exact_match_level, tf_level = comparison.comparison_levels[1:3]
+    plan = tf_level.compile()
+    assert "0.1 as float8" in plan.tf_adjustment_sql
+
+    exact_match_level.u_probability = 0.0625
+    assert tf_level.compile() is not plan
+    assert "0.0625 as float8" in tf_level.compile().tf_adjustment_sql
+    _assert_plans_are_current(comparison)
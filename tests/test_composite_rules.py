@@ -0,0 +1,86 @@
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from blocking.composite_rules import and_, or_, split_or_blocking_rule, substr_key
+from blocking.local_join import block_pairs_local
+
+
+def _people(num_records, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def column(values):
+        column = rng.choice(values, num_records).astype(object)
+        column[rng.random(num_records) < 0.1] = None
+        return column
+
+    return pa.table(
+        {
+            "unique_id": np.arange(num_records),
+            "first_name": column(["john", "jon", "mary", "anne", "tom"]),
+            "surname": column(["smith", "jones", "brown", "green"]),
+            "postcode": column(["ab1 2cd", "ab1 3ef", "xy9 8zz", "xy1 1aa"]),
+            "dob": column(["1990", "1991", "1992"]),
+        }
+    )
+
+
+def _or_join_pairs(rule_sql, people):
+    # The pairs of the whole rule, as a single join on its OR condition
+    con = duckdb.connect()
+    con.register("people", people)
+    rows = con.execute(
+        f"""
+        select l.unique_id, r.unique_id
+        from people as l join people as r
+        on l.unique_id < r.unique_id and ({rule_sql})
+        """
+    ).fetchall()
+    return sorted(rows)
+
+
+def _pairs_of_rules(rules, people):
+    rows = []
+    for rule in rules:
+        for batch in block_pairs_local(rule, people, sql_dialect="duckdb"):
+            rows += zip(
+                batch.column("unique_id_l").to_pylist(),
+                batch.column("unique_id_r").to_pylist(),
+            )
+    return rows
+
+
+def test_composite_rule_matches_or_join():
+    rule = or_(
+        and_("first_name", "surname"),
+        and_(substr_key("postcode", 1, 3), "dob"),
+        # Implied by the first branch, so dropped
+        and_("first_name", "surname", "dob"),
+    )
+    rule.sql_dialect = "duckdb"
+    assert len(rule.blocking_rules) == 2
+
+    people = _people(600)
+    rows = _pairs_of_rules(rule.blocking_rules, people)
+    # Each pair is generated by one branch only
+    assert len(rows) == len(set(rows))
+    assert sorted(rows) == _or_join_pairs(rule.blocking_rule, people)
+
+
+def test_split_or_blocking_rule_matches_or_join():
+    rule_sql = (
+        "l.dob = r.dob and (l.surname = r.surname or l.first_name = r.first_name)"
+    )
+    rules = split_or_blocking_rule(rule_sql, "duckdb")
+    assert len(rules) == 2
+
+    people = _people(600, seed=1)
+    rows = _pairs_of_rules(rules, people)
+    assert len(rows) == len(set(rows))
+    assert sorted(rows) == _or_join_pairs(rule_sql, people)
+
+
+def test_branch_without_equality_is_rejected():
+    with pytest.raises(ValueError, match="cartesian product"):
+        split_or_blocking_rule("l.surname = r.surname or l.dob > r.dob", "duckdb")
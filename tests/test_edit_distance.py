@@ -0,0 +1,138 @@
+import random
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from execution.edit_distance import (
+    bounded_damerau_levenshtein,
+    bounded_edit_distance,
+    bounded_levenshtein,
+    damerau_levenshtein_within,
+)
+
+
+def _levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        previous = current
+    return previous[-1]
+
+
+def _damerau_levenshtein(a, b):
+    # The unrestricted distance, with adjacent transpositions, as computed by
+    # DuckDB's damerau_levenshtein (Lowrance-Wagner)
+    inf = len(a) + len(b)
+    last_row = {}
+    d = [[inf] * (len(b) + 2)]
+    d += [[inf] + list(range(len(b) + 1))]
+    for i in range(1, len(a) + 1):
+        d.append([inf, i] + [0] * len(b))
+        last_match_col = 0
+        for j in range(1, len(b) + 1):
+            i1 = last_row.get(b[j - 1], 0)
+            j1 = last_match_col
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            if cost == 0:
+                last_match_col = j
+            d[i + 1][j + 1] = min(
+                d[i][j] + cost,
+                d[i + 1][j] + 1,
+                d[i][j + 1] + 1,
+                d[i1][j1] + (i - i1 - 1) + 1 + (j - j1 - 1),
+            )
+        last_row[a[i - 1]] = i
+    return d[len(a) + 1][len(b) + 1]
+
+
+def _random_pairs(num_pairs, seed):
+    # Short strings over a small alphabet, with many near misses
+    rng = random.Random(seed)
+    strings_l, strings_r = [], []
+    for _ in range(num_pairs):
+        s = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 8)))
+        t = list(s)
+        for _ in range(rng.randint(0, 3)):
+            edit = rng.randint(0, 3)
+            position = rng.randint(0, len(t))
+            if edit == 0:
+                t.insert(position, rng.choice("abcde"))
+            elif t and edit == 1:
+                del t[min(position, len(t) - 1)]
+            elif t and edit == 2:
+                t[min(position, len(t) - 1)] = rng.choice("abcde")
+            elif len(t) > 1:
+                p = min(position, len(t) - 2)
+                t[p], t[p + 1] = t[p + 1], t[p]
+        strings_l.append(s)
+        strings_r.append("".join(t))
+    return strings_l, strings_r
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3])
+def test_bounded_damerau_levenshtein_matches_reference(max_distance):
+    strings_l, strings_r = _random_pairs(2000, seed=max_distance)
+    expected = [
+        min(_damerau_levenshtein(a, b), max_distance + 1)
+        for a, b in zip(strings_l, strings_r)
+    ]
+    result = bounded_damerau_levenshtein(strings_l, strings_r, max_distance)
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 2, 3])
+def test_bounded_levenshtein_matches_reference(max_distance):
+    strings_l, strings_r = _random_pairs(2000, seed=10 + max_distance)
+    expected = [
+        min(_levenshtein(a, b), max_distance + 1)
+        for a, b in zip(strings_l, strings_r)
+    ]
+    result = bounded_levenshtein(strings_l, strings_r, max_distance)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_transpositions_and_unicode():
+    # Non-ASCII characters are compared as their UTF-8 bytes, as in DuckDB
+    strings_l = ["ab", "ca", "abc", "café", "", "naïve", "é"]
+    strings_r = ["ba", "abc", "ca", "cafe", "", "naive", "é"]
+    np.testing.assert_array_equal(
+        bounded_edit_distance(strings_l, strings_r, 3), [1, 2, 2, 2, 0, 2, 0]
+    )
+    np.testing.assert_array_equal(
+        bounded_edit_distance(strings_l, strings_r, 3, transpositions=False),
+        [2, 3, 3, 2, 0, 2, 0],
+    )
+
+
+@pytest.mark.parametrize("function", ["damerau_levenshtein", "levenshtein"])
+def test_matches_duckdb_on_non_ascii_strings(function):
+    rng = random.Random(5)
+
+    def strings():
+        return [
+            "".join(rng.choice("aeé€ñ") for _ in range(rng.randint(0, 5)))
+            for _ in range(500)
+        ]
+
+    pairs = pa.table({"l": strings(), "r": strings()})
+    con = duckdb.connect()
+    con.register("pairs", pairs)
+    expected = con.execute(f"select least({function}(l, r), 3) from pairs")
+    result = bounded_edit_distance(
+        pairs.column("l").to_pylist(),
+        pairs.column("r").to_pylist(),
+        2,
+        transpositions=function == "damerau_levenshtein",
+    )
+    np.testing.assert_array_equal(result, [row[0] for row in expected.fetchall()])
+
+
+def test_within_threshold():
+    result = damerau_levenshtein_within(["smith", "smith"], ["smyth", "jones"], 1)
+    np.testing.assert_array_equal(result, [True, False])
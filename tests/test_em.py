@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+# EM and the level library need splink modules which aren't part of this tree
+em = pytest.importorskip("training.em")
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+
+M = {"a": [0.05, 0.15, 0.8], "b": [0.1, 0.9], "c": [0.2, 0.3, 0.5]}
+U = {"a": [0.9, 0.08, 0.02], "b": [0.95, 0.05], "c": [0.6, 0.3, 0.1]}
+
+
+def _comparisons():
+    levels = factories._core_comparison_levels("duckdb")
+    comparisons = {}
+    for name in M:
+        comparison = [levels["null_level"](name)]
+        for _ in M[name][1:]:
+            comparison.append(levels["exact_match_level"](name))
+        comparison.append(levels["else_level"]())
+        comparisons[name] = comparison
+    for name, comparison in comparisons.items():
+        em.assign_comparison_vector_values(comparison)
+        # Starting values away from the truth, so EM has to move
+        num_levels = len(comparison) - 1
+        for level in comparison[1:]:
+            value = level._comparison_vector_value
+            level.m_probability = (value + 1) / (num_levels * (num_levels + 1) / 2)
+            level.u_probability = (num_levels - value) / (
+                num_levels * (num_levels + 1) / 2
+            )
+    return comparisons
+
+
+def _vectors(num_pairs, prior, seed=0):
+    rng = np.random.default_rng(seed)
+    is_match = rng.random(num_pairs) < prior
+    vectors = {}
+    for name in M:
+        values = np.arange(len(M[name]))
+        gamma = np.where(
+            is_match,
+            rng.choice(values, num_pairs, p=M[name]),
+            rng.choice(values, num_pairs, p=U[name]),
+        )
+        gamma[rng.random(num_pairs) < 0.05] = -1
+        vectors[f"gamma_{name}"] = gamma.astype(np.int8)
+    return vectors
+
+
+def _per_pair_em(vectors, comparisons, prior, iterations):
+    # EM run directly over every pair, rather than over distinct patterns
+    m, u = {}, {}
+    for name, comparison in comparisons.items():
+        m[name] = np.ones(len(comparison))
+        u[name] = np.ones(len(comparison))
+        for level in comparison[1:]:
+            m[name][level._comparison_vector_value + 1] = level.m_probability
+            u[name][level._comparison_vector_value + 1] = level.u_probability
+
+    for _ in range(iterations):
+        bayes_factor = np.ones(len(vectors["gamma_a"]))
+        for name in comparisons:
+            index = vectors[f"gamma_{name}"].astype(np.int64) + 1
+            bayes_factor *= m[name][index] / u[name][index]
+        match_probability = prior * bayes_factor / (prior * bayes_factor + 1 - prior)
+
+        for name in comparisons:
+            gamma = vectors[f"gamma_{name}"]
+            observed = gamma >= 0
+            for value in range(len(M[name])):
+                in_level = gamma == value
+                m[name][value + 1] = (
+                    match_probability[in_level].sum()
+                    / match_probability[observed].sum()
+                )
+                u[name][value + 1] = (1 - match_probability[in_level]).sum() / (
+                    1 - match_probability[observed]
+                ).sum()
+        prior = match_probability.mean()
+    return m, u, prior
+
+
+def test_em_on_patterns_matches_per_pair_em():
+    vectors = _vectors(20_000, 0.2)
+    comparisons = _comparisons()
+    patterns = em.count_gamma_patterns(vectors, comparisons)
+    result = em.expectation_maximisation(
+        patterns,
+        comparisons,
+        0.5,
+        max_iterations=5,
+        em_convergence=0,
+        fix_u_probabilities=False,
+    )
+    m, u, prior = _per_pair_em(vectors, comparisons, 0.5, 5)
+
+    assert result.iterations == 5
+    assert result.probability_two_random_records_match == pytest.approx(prior)
+    for name in comparisons:
+        for value in range(len(M[name])):
+            assert result.m_probabilities[name][value] == pytest.approx(
+                m[name][value + 1]
+            )
+            assert result.u_probabilities[name][value] == pytest.approx(
+                u[name][value + 1]
+            )
+
+
+def test_em_recovers_true_parameters():
+    vectors = _vectors(200_000, 0.2, seed=1)
+    comparisons = _comparisons()
+    patterns = em.count_gamma_patterns(vectors, comparisons)
+    result = em.expectation_maximisation(
+        patterns, comparisons, 0.5, max_iterations=200, fix_u_probabilities=False
+    )
+    assert result.probability_two_random_records_match == pytest.approx(0.2, abs=0.01)
+    for name in comparisons:
+        for value in range(len(M[name])):
+            assert result.m_probabilities[name][value] == pytest.approx(
+                M[name][value], abs=0.02
+            )
+            assert result.u_probabilities[name][value] == pytest.approx(
+                U[name][value], abs=0.02
+            )
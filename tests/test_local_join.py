@@ -0,0 +1,99 @@
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from blocking.blocking_rule_builder import exact_match_rule
+from blocking.local_join import block_pairs_local, block_pairs_salted
+
+
+def _people(num_records, seed=0, first_id=0):
+    rng = np.random.default_rng(seed)
+
+    def column(values):
+        column = rng.choice(values, num_records).astype(object)
+        column[rng.random(num_records) < 0.1] = None
+        return column
+
+    return pa.table(
+        {
+            "unique_id": np.arange(first_id, first_id + num_records),
+            "first_name": column(["john", "jon", "mary", "anne", "tom"]),
+            "surname": column(["smith", "jones", "brown"]),
+            "city": column(["leeds", "york", "hull", "bath"]),
+        }
+    )
+
+
+def _sql_pairs(rule_sql, table, table_r=None, preceding_rules=()):
+    # The pairs of the same rule, from a join in DuckDB
+    con = duckdb.connect()
+    con.register("l_input", table)
+    con.register("r_input", table if table_r is None else table_r)
+    where = []
+    if table_r is None:
+        where.append("l.unique_id < r.unique_id")
+    where += [f"not coalesce(({rule}), false)" for rule in preceding_rules]
+    where_sql = f"where {' and '.join(where)}" if where else ""
+    rows = con.execute(
+        f"""
+        select l.unique_id, r.unique_id
+        from l_input as l join r_input as r on {rule_sql}
+        {where_sql}
+        """
+    ).fetchall()
+    return sorted(rows)
+
+
+def _local_pairs(batches):
+    rows = []
+    for batch in batches:
+        rows += zip(
+            batch.column("unique_id_l").to_pylist(),
+            batch.column("unique_id_r").to_pylist(),
+        )
+    return sorted(rows)
+
+
+RULES = [
+    "l.surname = r.surname",
+    "l.first_name = r.first_name and l.surname = r.surname",
+    "l.first_name = r.first_name and l.city <> r.city",
+    "substr(l.first_name, 1, 1) = substr(r.first_name, 1, 1)",
+]
+
+
+@pytest.mark.parametrize("rule", RULES)
+def test_dedupe_matches_sql_join(rule):
+    people = _people(500)
+    pairs = block_pairs_local(rule, people, sql_dialect="duckdb", batch_size=1000)
+    assert _local_pairs(pairs) == _sql_pairs(rule, people)
+
+
+@pytest.mark.parametrize("rule", RULES)
+def test_link_matches_sql_join(rule):
+    people_l = _people(300, seed=1)
+    people_r = _people(400, seed=2, first_id=1000)
+    pairs = block_pairs_local(rule, people_l, people_r, sql_dialect="duckdb")
+    assert _local_pairs(pairs) == _sql_pairs(rule, people_l, people_r)
+
+
+def test_preceding_rules_are_skipped():
+    people = _people(500)
+    preceding = ["l.first_name = r.first_name", "l.city = r.city"]
+    pairs = block_pairs_local(
+        "l.surname = r.surname",
+        people,
+        sql_dialect="duckdb",
+        preceding_rules=preceding,
+    )
+    expected = _sql_pairs("l.surname = r.surname", people, preceding_rules=preceding)
+    assert _local_pairs(pairs) == expected
+
+
+def test_salted_matches_sql_join():
+    people = _people(2000)
+    rule = exact_match_rule("surname", salting_partitions=4)
+    rule.sql_dialect = "duckdb"
+    pairs = block_pairs_salted(rule, people, max_workers=2, batch_size=5000)
+    assert _local_pairs(pairs) == _sql_pairs('l."surname" = r."surname"', people)
@@ -0,0 +1,83 @@
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from blocking.blocking_rule_builder import minhash_lsh_rule
+from blocking.minhash import add_band_keys, block_pairs_minhash
+
+
+def _addresses(num_records, seed=0, first_id=0):
+    # Variants of a few addresses, with typos
+    rng = np.random.default_rng(seed)
+    streets = ["12 high street", "3 church lane", "47 station road", "9 mill view"]
+    addresses = []
+    for street in rng.choice(streets, num_records):
+        chars = list(street)
+        for _ in range(rng.integers(0, 3)):
+            chars[rng.integers(len(chars))] = rng.choice(list("abcxyz"))
+        addresses.append("".join(chars))
+    addresses = np.array(addresses, dtype=object)
+    addresses[rng.random(num_records) < 0.1] = None
+    return pa.table(
+        {
+            "unique_id": np.arange(first_id, first_id + num_records),
+            "address": addresses,
+        }
+    )
+
+
+def _rule():
+    rule = minhash_lsh_rule("address", num_bands=6, rows_per_band=3)
+    rule.sql_dialect = "duckdb"
+    return rule
+
+
+def _or_join_pairs(rule, table, table_r=None):
+    # The pairs of a single join on any band's keys being equal
+    con = duckdb.connect()
+    con.register("l_input", add_band_keys(rule, table))
+    con.register("r_input", add_band_keys(rule, table if table_r is None else table_r))
+    any_band = " or ".join(f"l.{c} = r.{c}" for c in rule.band_column_names)
+    dedupe = "l.unique_id < r.unique_id and" if table_r is None else ""
+    rows = con.execute(
+        f"""
+        select l.unique_id, r.unique_id
+        from l_input as l join r_input as r on {dedupe} ({any_band})
+        """
+    ).fetchall()
+    return sorted(rows)
+
+
+def _pairs(batches):
+    rows = []
+    for batch in batches:
+        rows += zip(
+            batch.column("unique_id_l").to_pylist(),
+            batch.column("unique_id_r").to_pylist(),
+        )
+    return rows
+
+
+@pytest.mark.parametrize("link", [False, True])
+def test_pairs_match_or_join_on_band_keys(link):
+    rule = _rule()
+    table = _addresses(300)
+    table_r = _addresses(200, seed=1, first_id=1000) if link else None
+    rows = _pairs(block_pairs_minhash(rule, table, table_r, batch_size=100))
+    # Pairs matching on several bands are generated once
+    assert len(rows) == len(set(rows))
+    assert sorted(rows) == _or_join_pairs(rule, table, table_r)
+    assert rows
+
+
+def test_similar_strings_are_paired():
+    rule = minhash_lsh_rule("address", num_bands=20, rows_per_band=2)
+    rule.sql_dialect = "duckdb"
+    table = pa.table(
+        {
+            "unique_id": [0, 1, 2],
+            "address": ["12 high street", "12 hihg street", "3 church lane"],
+        }
+    )
+    assert _pairs(block_pairs_minhash(rule, table)) == [(0, 1)]
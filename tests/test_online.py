@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+# The estimator and the level library need splink modules which aren't part
+# of this tree
+online = pytest.importorskip("training.online")
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+from execution.comparison_vectors import assign_comparison_vector_values  # noqa: E402
+
+NUM_LEVELS = {"first_name": 3, "surname": 2}
+
+
+def _comparisons(num_levels=NUM_LEVELS):
+    levels = factories._core_comparison_levels("duckdb")
+    comparisons = {}
+    for name, n in num_levels.items():
+        comparison = [levels["null_level"](name)]
+        comparison += [levels["exact_match_level"](name) for _ in range(n - 1)]
+        comparison.append(levels["else_level"]())
+        comparisons[name] = assign_comparison_vector_values(comparison)
+    return comparisons
+
+
+def _vectors(num_pairs, seed):
+    rng = np.random.default_rng(seed)
+    return {
+        f"gamma_{name}": rng.integers(-1, n, num_pairs).astype(np.int8)
+        for name, n in NUM_LEVELS.items()
+    }
+
+
+def _assert_same_estimates(a, b):
+    np.testing.assert_array_equal(a.m, b.m)
+    np.testing.assert_array_equal(a.u, b.u)
+    assert (
+        a.probability_two_random_records_match
+        == b.probability_two_random_records_match
+    )
+
+
+def test_as_dict_from_dict_round_trip():
+    comparisons = _comparisons()
+    estimator = online.OnlineEstimator(
+        comparisons, 0.01, decay=0.9, fix_u_probabilities=False
+    )
+    estimator.update(_vectors(5_000, seed=0), iterations=3)
+    estimator.update_u(_vectors(5_000, seed=1))
+
+    saved = json.loads(json.dumps(estimator.as_dict()))
+    restored = online.OnlineEstimator.from_dict(saved, _comparisons())
+
+    assert restored.as_dict() == estimator.as_dict()
+    _assert_same_estimates(restored, estimator)
+    assert restored.m_probabilities == estimator.m_probabilities
+
+    # A restored estimator carries on exactly as the original would
+    batch = _vectors(2_000, seed=2)
+    estimator.update(batch)
+    restored.update(batch)
+    _assert_same_estimates(restored, estimator)
+
+
+def test_from_dict_rejects_other_comparisons():
+    estimator = online.OnlineEstimator(_comparisons(), 0.01)
+    estimator.update(_vectors(1_000, seed=0))
+    other = _comparisons({"first_name": 4, "surname": 2})
+    with pytest.raises(ValueError, match="first_name"):
+        online.OnlineEstimator.from_dict(estimator.as_dict(), other)
@@ -0,0 +1,74 @@
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from blocking.pair_count import count_pairs_duckdb, count_pairs_local
+
+
+def _people(num_records, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def column(values):
+        column = rng.choice(values, num_records).astype(object)
+        column[rng.random(num_records) < 0.15] = None
+        return column
+
+    return pa.table(
+        {
+            "unique_id": np.arange(num_records),
+            "first_name": column(["john", "jon", "mary", "anne", "tom", "ann"]),
+            "surname": column(["smith", "jones", "brown", "green"]),
+        }
+    )
+
+
+def _brute_force_count(rule, table, table_r=None):
+    # Every pair of records, filtered by the rule
+    con = duckdb.connect()
+    con.register("l_input", table)
+    con.register("r_input", table if table_r is None else table_r)
+    dedupe = "and l.unique_id < r.unique_id" if table_r is None else ""
+    return con.execute(
+        f"""
+        select count(*)
+        from l_input as l cross join r_input as r
+        where coalesce(({rule}), false) {dedupe}
+        """
+    ).fetchone()[0]
+
+
+RULES = [
+    "l.surname = r.surname",
+    "l.first_name = r.first_name and l.surname = r.surname",
+    "substr(l.first_name, 1, 2) = substr(r.first_name, 1, 2)",
+    "lower(l.surname) = lower(r.surname) and l.first_name = r.first_name",
+]
+
+
+@pytest.mark.parametrize("rule", RULES)
+def test_dedupe_count_matches_brute_force(rule):
+    people = _people(400)
+    expected = _brute_force_count(rule, people)
+    assert count_pairs_local(rule, people, sql_dialect="duckdb") == expected
+
+    con = duckdb.connect()
+    con.register("people", people)
+    assert count_pairs_duckdb(rule, "people", con, sql_dialect="duckdb") == expected
+
+
+@pytest.mark.parametrize("rule", RULES + ["l.first_name = r.surname"])
+def test_link_count_matches_brute_force(rule):
+    people_l, people_r = _people(300, seed=1), _people(350, seed=2)
+    expected = _brute_force_count(rule, people_l, people_r)
+    assert count_pairs_local(rule, people_l, people_r, sql_dialect="duckdb") == (
+        expected
+    )
+
+
+def test_max_pairs():
+    people = _people(400)
+    with pytest.raises(ValueError, match="more than the maximum"):
+        count_pairs_local(
+            "l.surname = r.surname", people, sql_dialect="duckdb", max_pairs=10
+        )
@@ -0,0 +1,73 @@
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from execution.scoring import BayesFactorScorer
+
+# The level library needs splink modules which aren't part of this tree
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+
+M = {"first_name": [0.7, 0.2, 0.1], "dob": [0.9, 0.1]}
+U = {"first_name": [0.01, 0.09, 0.9], "dob": [0.05, 0.95]}
+
+
+def _comparisons():
+    levels = factories._core_comparison_levels("duckdb")
+    comparisons = {}
+    for name in M:
+        comparison = [levels["null_level"](name)]
+        comparison += [levels["exact_match_level"](name) for _ in M[name][1:]]
+        comparison.append(levels["else_level"]())
+        for level, m, u in zip(comparison[1:], M[name], U[name]):
+            level.m_probability = m
+            level.u_probability = u
+        comparisons[name] = comparison
+    return comparisons
+
+
+def _vectors(num_pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    return pa.table(
+        {
+            f"gamma_{name}": rng.integers(-1, len(M[name]), num_pairs)
+            for name in M
+        }
+    )
+
+
+def test_score_matches_per_level_bayes_factors():
+    vectors = _vectors(1000)
+    scores = BayesFactorScorer(_comparisons(), 0.01).score(vectors)
+
+    expected = np.full(1000, np.log2(0.01 / 0.99))
+    for name in M:
+        gamma = vectors.column(f"gamma_{name}").to_numpy()
+        # The highest gamma value is the first non-null level, and the null
+        # level, last here, has a bayes factor of 1
+        bayes_factors = np.append(np.array(M[name]) / np.array(U[name]), 1)
+        expected += np.log2(bayes_factors[len(M[name]) - 1 - gamma])
+    np.testing.assert_allclose(scores["match_weight"], expected)
+    np.testing.assert_allclose(
+        scores["match_probability"], 1 / (1 + np.exp2(-expected))
+    )
+
+
+def test_score_matches_score_sql():
+    vectors = _vectors(1000, seed=1)
+    scorer = BayesFactorScorer(_comparisons(), 0.001)
+    con = duckdb.connect()
+    con.register("vectors", vectors.append_column("row", pa.array(range(1000))))
+    result = con.execute(
+        f"select * from ({scorer.score_sql('vectors')}) order by row"
+    ).to_arrow_table()
+
+    scores = scorer.score(vectors)
+    np.testing.assert_allclose(
+        result.column("match_weight").to_numpy(), scores["match_weight"]
+    )
+    np.testing.assert_allclose(
+        result.column("match_probability").to_numpy(), scores["match_probability"]
+    )
@@ -0,0 +1,79 @@
+from collections import Counter
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from blocking.skew import (
+    CountMinSketch,
+    profile_blocking_skew_local,
+    recommend_salting_partitions,
+)
+
+
+def _people(num_records, seed=0):
+    # A few surnames shared by many records, and a long tail of rare ones
+    rng = np.random.default_rng(seed)
+    common = ["smith", "jones", "brown"]
+    rare = [f"name{i}" for i in range(2000)]
+    surnames = np.where(
+        rng.random(num_records) < 0.3,
+        rng.choice(common, num_records, p=[0.6, 0.3, 0.1]),
+        rng.choice(rare, num_records),
+    ).astype(object)
+    surnames[rng.random(num_records) < 0.05] = None
+    return pa.table({"unique_id": np.arange(num_records), "surname": surnames})
+
+
+def _expected(people):
+    counts = Counter(s for s in people.column("surname").to_pylist() if s)
+    num_pairs = sum(n * (n - 1) // 2 for n in counts.values())
+    return counts, num_pairs
+
+
+@pytest.mark.parametrize("method", ["exact", "sketch"])
+def test_heavy_keys_and_pairs(method):
+    people = _people(20_000)
+    counts, num_pairs = _expected(people)
+    report = profile_blocking_skew_local(
+        "l.surname = r.surname",
+        people,
+        method=method,
+        top_k=3,
+        sql_dialect="duckdb",
+        parallelism=4,
+    )
+
+    assert report.num_records == sum(counts.values())
+    if method == "exact":
+        assert report.num_pairs == num_pairs
+        assert not report.is_estimate
+    else:
+        assert report.num_pairs == pytest.approx(num_pairs, rel=0.05)
+        assert report.is_estimate
+    # The heavy keys are counted exactly, with either method
+    assert [(k.values[0], k.num_records) for k in report.heavy_keys] == (
+        counts.most_common(3)
+    )
+    smith = report.heavy_keys[0]
+    assert smith.num_pairs == counts["smith"] * (counts["smith"] - 1) // 2
+    assert smith.share_of_pairs == pytest.approx(smith.num_pairs / report.num_pairs)
+    assert report.keys_to_exclude == [("smith",)]
+
+
+def test_recommend_salting_partitions():
+    # The heaviest key holds half the pairs, across 4 workers
+    assert recommend_salting_partitions(500, 1000, 4) == 2
+    assert recommend_salting_partitions(500, 1000, 1) == 1
+    assert recommend_salting_partitions(10**9, 10**9, 1000) == 64
+
+
+def test_count_min_sketch_never_underestimates():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**63, 5000, dtype=np.uint64)
+    stream = np.repeat(hashes, rng.integers(1, 20, len(hashes)))
+    sketch = CountMinSketch(width=2**10)
+    sketch.add(stream)
+    unique, counts = np.unique(stream, return_counts=True)
+    assert sketch.total == len(stream)
+    assert (sketch.estimate(unique) >= counts).all()
@@ -0,0 +1,55 @@
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+from blocking.blocking_rule_builder import sorted_neighbourhood_rule
+from blocking.sorted_neighbourhood import block_pairs_sorted_neighbourhood
+
+
+def _people(num_records, seed=0):
+    rng = np.random.default_rng(seed)
+    surnames = rng.choice(["smith", "smyth", "jones", "jonas", "brown"], num_records)
+    surnames = surnames.astype(object)
+    surnames[rng.random(num_records) < 0.1] = None
+    return pa.table(
+        {
+            "unique_id": rng.permutation(num_records),
+            "surname": surnames,
+            "city": rng.choice(["leeds", "york"], num_records),
+        }
+    )
+
+
+def _sql_pairs(rule, people):
+    con = duckdb.connect()
+    con.register("people", people)
+    return sorted(con.execute(rule.pairs_sql("people")).fetchall())
+
+
+def _local_pairs(rule, people):
+    rows = []
+    for batch in block_pairs_sorted_neighbourhood(rule, people, batch_size=37):
+        rows += zip(
+            batch.column("unique_id_l").to_pylist(),
+            batch.column("unique_id_r").to_pylist(),
+        )
+    return sorted(rows)
+
+
+def test_local_pairs_match_pairs_sql():
+    rule = sorted_neighbourhood_rule("surname", window_size=4)
+    rule.sql_dialect = "duckdb"
+    people = _people(150)
+    expected = _sql_pairs(rule, people)
+    # Each record with a key is paired with the next window_size records
+    num_keyed = people.column("surname").drop_null().length()
+    assert len(expected) == sum(num_keyed - offset for offset in range(1, 5))
+    assert _local_pairs(rule, people) == expected
+
+
+def test_preceding_rules_are_skipped():
+    rule = sorted_neighbourhood_rule("surname", window_size=3)
+    rule.sql_dialect = "duckdb"
+    rule.preceding_rules = ['l."city" = r."city"']
+    people = _people(150, seed=1)
+    assert _local_pairs(rule, people) == _sql_pairs(rule, people)
@@ -0,0 +1,65 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from execution.duckdb_engine import DuckDBComparisonEngine
+
+# The level library and numpy engine need splink modules which aren't part
+# of this tree
+factories = pytest.importorskip(
+    "comp_level_factories.dialect_factories.comparison_level_factories"
+)
+numpy_engine = pytest.importorskip("execution.numpy_engine")
+streaming = pytest.importorskip("execution.streaming")
+
+
+def _comparisons(dialect):
+    levels = factories._core_comparison_levels(dialect)
+    return {
+        "name": [
+            levels["null_level"]("name"),
+            levels["exact_match_level"]("name"),
+            levels["damerau_levenshtein_level"]("name", 1),
+            levels["else_level"](),
+        ]
+    }
+
+
+@pytest.mark.parametrize(
+    "dialect, engine_class",
+    [
+        ("numpy", numpy_engine.NumpyComparisonEngine),
+        ("duckdb", DuckDBComparisonEngine),
+    ],
+)
+def test_default_engine_follows_dialect(dialect, engine_class):
+    assert type(streaming._default_engine(_comparisons(dialect))) is engine_class
+
+
+def test_stream_matches_single_computation():
+    rng = np.random.default_rng(0)
+    names = np.array(["john", "jon", "joan", None], dtype=object)
+    pairs = pa.table(
+        {
+            "unique_id_l": np.arange(1000),
+            "name_l": rng.choice(names, 1000),
+            "name_r": rng.choice(names, 1000),
+        }
+    )
+    comparisons = _comparisons("numpy")
+    batches = list(
+        streaming.stream_comparison_vectors(
+            pairs.to_batches(max_chunksize=300),
+            comparisons,
+            retain_columns=["unique_id_l"],
+        )
+    )
+    assert [b.num_rows for b in batches] == [300, 300, 300, 100]
+    streamed = pa.Table.from_batches(batches)
+    expected = DuckDBComparisonEngine().compute_comparison_vectors(
+        pairs, _comparisons("duckdb")
+    )
+    assert streamed.column("unique_id_l").to_pylist() == list(range(1000))
+    assert streamed.column("gamma_name").to_pylist() == (
+        expected.column("gamma_name").to_pylist()
+    )
@@ -0,0 +1,201 @@
+from collections import Counter
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from execution.term_frequency import (
+    TermFrequencyAdjuster,
+    compute_term_frequency_tables,
+    load_term_frequency_tables,
+    save_term_frequency_tables,
+)
+
+NAMES = ["john", "john", "john", "jon", "mary", "mary", "ann", None, "zoë", "jo"]
+
+
+def _records():
+    rng = np.random.default_rng(0)
+    return pa.table(
+        {
+            "unique_id": np.arange(500),
+            "first_name": rng.choice(np.array(NAMES, dtype=object), 500),
+            "city": rng.choice(np.array(["leeds", "york", None], dtype=object), 500),
+        }
+    )
+
+
+def _expected_frequencies(values):
+    counts = Counter(v for v in values if v is not None)
+    total = sum(counts.values())
+    return {value: n / total for value, n in counts.items()}
+
+
+def test_tables_match_value_counts():
+    records = _records()
+    tf_tables = compute_term_frequency_tables(records, ["first_name", "city"])
+
+    assert set(tf_tables) == {"first_name", "city"}
+    for column_name, tf_table in tf_tables.items():
+        expected = _expected_frequencies(records.column(column_name).to_pylist())
+        actual = dict(zip(tf_table.values.to_pylist(), tf_table.frequencies))
+        assert actual.keys() == expected.keys()
+        for value, frequency in expected.items():
+            assert actual[value] == pytest.approx(frequency)
+
+    lookup = tf_tables["first_name"].lookup(["mary", None, "unknown"])
+    expected = _expected_frequencies(records.column("first_name").to_pylist())
+    assert lookup[0] == pytest.approx(expected["mary"])
+    assert np.isnan(lookup[1:]).all()
+
+
+def test_tables_from_a_dataframe_or_table_name_agree():
+    records = _records()
+    tf_tables = compute_term_frequency_tables(records, ["first_name"])
+
+    con = duckdb.connect()
+    con.register("people", records)
+    named = compute_term_frequency_tables("people", ["first_name"], connection=con)
+    df = compute_term_frequency_tables(records.to_pandas(), ["first_name"])
+
+    expected = tf_tables["first_name"]
+    for tf_table in named["first_name"], df["first_name"]:
+        np.testing.assert_allclose(
+            tf_table.lookup(expected.values), expected.frequencies
+        )
+
+
+def test_save_and_load_round_trip(tmp_path):
+    tf_tables = compute_term_frequency_tables(_records(), ["first_name", "city"])
+    save_term_frequency_tables(tf_tables, tmp_path / "tf")
+    loaded = load_term_frequency_tables(tmp_path / "tf", ["first_name", "city"])
+
+    for column_name, tf_table in tf_tables.items():
+        assert loaded[column_name].values.equals(tf_table.values)
+        np.testing.assert_array_equal(
+            loaded[column_name].frequencies, tf_table.frequencies
+        )
+
+
+# The adjustments need levels which belong to a Comparison, from splink modules
+# which aren't part of this tree
+
+
+def _comparison():
+    factories = pytest.importorskip(
+        "comp_level_factories.dialect_factories.comparison_level_factories"
+    )
+    comparison_module = pytest.importorskip("splink.comparison")
+    from splink.comparison_level import ComparisonLevel
+
+    levels = factories._core_comparison_levels("duckdb")
+    comparison_levels = [
+        levels["null_level"]("first_name"),
+        levels["exact_match_level"]("first_name", term_frequency_adjustments=True),
+        ComparisonLevel(
+            {
+                "sql_condition": 'levenshtein("first_name_l", "first_name_r") <= 1',
+                "tf_adjustment_column": "first_name",
+                "tf_adjustment_weight": 0.5,
+                "tf_minimum_u_value": 0.15,
+            },
+            sql_dialect="duckdb",
+        ),
+        levels["else_level"](),
+    ]
+    comparison = comparison_module.Comparison(comparison_levels, "first_name")
+    for level, m, u in zip(comparison_levels[1:], [0.8, 0.15, 0.05], [0.1, 0.2, 0.7]):
+        level.m_probability = m
+        level.u_probability = u
+    return comparison
+
+
+def _pairs(num_pairs=2_000):
+    rng = np.random.default_rng(1)
+    # "bob" isn't in the records, so has no term frequency
+    names = np.array(NAMES + ["bob"], dtype=object)
+    pairs = {
+        "first_name_l": rng.choice(names, num_pairs),
+        "first_name_r": rng.choice(names, num_pairs),
+    }
+    is_null = np.array(
+        [a is None or b is None for a, b in zip(*pairs.values())], dtype=bool
+    )
+    gamma = np.where(is_null, -1, rng.integers(0, 3, num_pairs))
+    return pairs, {"gamma_first_name": gamma.astype(np.int8)}
+
+
+def test_adjustments_match_tf_adjustment_sql():
+    comparison = _comparison()
+    tf_tables = compute_term_frequency_tables(_records(), ["first_name"])
+    adjuster = TermFrequencyAdjuster(
+        {"first_name": comparison.comparison_levels}, tf_tables
+    )
+    pairs, vectors = _pairs()
+    bayes_factors = adjuster.bayes_factor_adjustments(pairs, vectors)
+
+    tf_table = tf_tables["first_name"]
+    frame = pa.table(
+        {
+            "gamma_first_name": vectors["gamma_first_name"],
+            "tf_first_name_l": pa.array(
+                tf_table.lookup(pairs["first_name_l"]), from_pandas=True
+            ),
+            "tf_first_name_r": pa.array(
+                tf_table.lookup(pairs["first_name_r"]), from_pandas=True
+            ),
+        }
+    )
+    case = "\n".join(
+        level._tf_adjustment_sql for level in comparison.comparison_levels
+    )
+    con = duckdb.connect()
+    con.register("pairs", frame)
+    expected = con.execute(f"select case {case} end from pairs").fetchnumpy()
+    np.testing.assert_allclose(bayes_factors, next(iter(expected.values())))
+    assert (bayes_factors != 1).any()
+
+    np.testing.assert_allclose(
+        adjuster.match_weight_adjustments(pairs, vectors), np.log2(bayes_factors)
+    )
+
+
+def test_adjustments_follow_the_exact_match_level():
+    comparison = _comparison()
+    tf_tables = compute_term_frequency_tables(_records(), ["first_name"])
+    pairs, vectors = _pairs()
+    before = TermFrequencyAdjuster(
+        {"first_name": comparison.comparison_levels}, tf_tables
+    ).bayes_factor_adjustments(pairs, vectors)
+
+    # Levels can be replaced after the comparison is created
+    exact_match_level = comparison.comparison_levels[1]
+    replacement = type(exact_match_level)(
+        "first_name", term_frequency_adjustments=True
+    )
+    replacement.comparison = comparison
+    replacement._comparison_vector_value = exact_match_level._comparison_vector_value
+    replacement.m_probability = 0.8
+    replacement.u_probability = 0.05
+    comparison.comparison_levels[1] = replacement
+    assert comparison.comparison_levels[2]._exact_match_level_for_tf_adjustment is (
+        replacement
+    )
+
+    after = TermFrequencyAdjuster(
+        {"first_name": comparison.comparison_levels}, tf_tables
+    ).bayes_factor_adjustments(pairs, vectors)
+    adjusted = (vectors["gamma_first_name"] >= 1) & (before != 1)
+    assert adjusted.any()
+    np.testing.assert_allclose(
+        after[adjusted], before[adjusted] * (0.05 / 0.1) ** np.where(
+            vectors["gamma_first_name"][adjusted] == 2, 1.0, 0.5
+        )
+    )
+
+
+def test_missing_table_raises():
+    comparison = _comparison()
+    with pytest.raises(ValueError, match="first_name"):
+        TermFrequencyAdjuster({"first_name": comparison.comparison_levels}, {})
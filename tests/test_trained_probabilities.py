@@ -0,0 +1,180 @@
+import math
+from statistics import median
+
+import numpy as np
+import pytest
+
+# splink.constants isn't part of this tree
+trained_probabilities = pytest.importorskip("splink.trained_probabilities")
+from splink.constants import LEVEL_NOT_OBSERVED_TEXT  # noqa: E402
+
+TrainedProbabilityStore = trained_probabilities.TrainedProbabilityStore
+
+
+class _Level:
+    def __init__(self, i):
+        self._as_detailed_record = {
+            "sql_condition": f"level {i}",
+            "label_for_charts": f"label {i}",
+            "comparison_vector_value": i,
+        }
+
+
+def _trained_values(seed=0, num_levels=7, num_entries=300):
+    # Interleaved entries of every level, as lists of the dicts splink keeps
+    rng = np.random.default_rng(seed)
+    special = [None, LEVEL_NOT_OBSERVED_TEXT, np.float32(0.25), np.int64(1), 0.0]
+    values = {(i, m_or_u): [] for i in range(num_levels) for m_or_u in "mu"}
+    for n in range(num_entries):
+        # The last level has no entries
+        level_id = int(rng.integers(0, num_levels - 1))
+        m_or_u = "mu"[int(rng.integers(0, 2))]
+        if rng.random() < 0.2:
+            probability = special[int(rng.integers(0, len(special)))]
+        else:
+            probability = float(rng.random())
+        values[level_id, m_or_u].append(
+            {"probability": probability, "description": f"session {n % 5}"}
+        )
+    return values
+
+
+def _store(values, order_seed=1):
+    store = TrainedProbabilityStore()
+    num_levels = max(level_id for level_id, _ in values) + 1
+    for i in range(num_levels):
+        assert store.register_level(_Level(i)) == i
+    # Add the entries of different levels interleaved, keeping each level's
+    # own order
+    queues = {key: list(entries) for key, entries in values.items()}
+    rng = np.random.default_rng(order_seed)
+    while any(queues.values()):
+        keys = [key for key, entries in queues.items() if entries]
+        level_id, m_or_u = keys[int(rng.integers(0, len(keys)))]
+        entry = queues[level_id, m_or_u].pop(0)
+        store.add(level_id, m_or_u, entry["probability"], entry["description"])
+    return store
+
+
+def _numeric(entries):
+    return [
+        e["probability"]
+        for e in entries
+        if e["probability"] is not None
+        and e["probability"] != LEVEL_NOT_OBSERVED_TEXT
+    ]
+
+
+def test_per_level_values_match_lists():
+    values = _trained_values()
+    store = _store(values)
+    assert len(store) == sum(len(entries) for entries in values.values())
+    for (level_id, m_or_u), entries in values.items():
+        assert store.values(level_id, m_or_u) == [
+            dict(entry, m_or_u=m_or_u) for entry in entries
+        ]
+        numeric = _numeric(entries)
+        assert store.has_values(level_id, m_or_u) == bool(numeric)
+        if numeric:
+            assert store.median(level_id, m_or_u) == pytest.approx(median(numeric))
+        else:
+            assert store.median(level_id, m_or_u) is None
+
+
+def test_medians_match_per_level_medians():
+    values = _trained_values()
+    store = _store(values)
+    for m_or_u in "mu":
+        medians = store.medians(m_or_u)
+        assert len(medians) == len(store.levels)
+        for level_id, level_median in enumerate(medians):
+            expected = store.median(level_id, m_or_u)
+            if expected is None:
+                assert np.isnan(level_median)
+            else:
+                assert level_median == pytest.approx(expected)
+
+
+def test_records_match_per_level_records():
+    values = _trained_values()
+    store = _store(values)
+    num_levels = len(store.levels)
+
+    expected = []
+    for level_id in range(num_levels):
+        cl_record = store.levels[level_id]._as_detailed_record
+        for m_or_u in "um":
+            for entry in values[level_id, m_or_u]:
+                p = entry["probability"]
+                numeric = p is not None and p != LEVEL_NOT_OBSERVED_TEXT
+                expected.append(
+                    {
+                        "m_or_u": m_or_u,
+                        "estimated_probability": p,
+                        "estimate_description": entry["description"],
+                        "estimated_probability_as_log_odds": (
+                            math.log2(float(p) / (1 - float(p)))
+                            if numeric and 0 < p < 1
+                            else None
+                        ),
+                        "sql_condition": cl_record["sql_condition"],
+                        "comparison_level_label": cl_record["label_for_charts"],
+                        "comparison_vector_value": level_id,
+                    }
+                )
+    assert store.parameter_estimates_as_records() == expected
+
+    level_ids = [3, 0]
+    assert store.parameter_estimates_as_records(level_ids) == [
+        record
+        for level_id in level_ids
+        for record in expected
+        if record["comparison_vector_value"] == level_id
+    ]
+
+    log_odds = store.log_odds()
+    assert len(log_odds) == len(store)
+    assert np.isnan(log_odds).sum() == sum(
+        r["estimated_probability_as_log_odds"] is None for r in expected
+    )
+
+
+def test_other_values_are_kept_but_not_numeric():
+    # As the lists splink kept, any value can be recorded
+    store = TrainedProbabilityStore()
+    level_id = store.register_level(_Level(0))
+    store.add(level_id, "m", "0.5", "session 0")
+    store.add(level_id, "m", [0.1], "session 1")
+    assert [v["probability"] for v in store.values(level_id, "m")] == ["0.5", [0.1]]
+    assert not store.has_values(level_id, "m")
+    assert store.median(level_id, "m") is None
+    assert np.isnan(store.medians("m")).all()
+
+    store.add(level_id, "m", 0.25, "session 2")
+    assert store.median(level_id, "m") == 0.25
+
+
+def test_replace_and_move_level():
+    store = TrainedProbabilityStore()
+    a, b = store.register_level(_Level(0)), store.register_level(_Level(1))
+    store.add(a, "m", 0.1, "online")
+    store.add(b, "m", 0.2, "online")
+    store.add(a, "u", 0.3, "online")
+    store.add(a, "m", 0.4, "em")
+
+    store.replace(a, "m", 0.5, "online")
+    store.replace(a, "u", LEVEL_NOT_OBSERVED_TEXT, "em")
+    assert [v["probability"] for v in store.values(a, "m")] == [0.5, 0.4]
+    assert [v["probability"] for v in store.values(a, "u")] == [
+        0.3,
+        LEVEL_NOT_OBSERVED_TEXT,
+    ]
+    assert store.medians("m")[a] == pytest.approx(0.45)
+    assert store.values(b, "m")[0]["probability"] == 0.2
+
+    other = TrainedProbabilityStore()
+    other.register_level(_Level(2))
+    new_id = store.move_level(a, other)
+    assert new_id == 1
+    for m_or_u in "mu":
+        assert other.values(new_id, m_or_u) == store.values(a, m_or_u)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+# u_sampling imports the streaming engines, which need splink modules which
+# aren't part of this tree
+u_sampling = pytest.importorskip("training.u_sampling")
+
+
+def _draw_all(sampler, sizes):
+    rows_l, rows_r = [], []
+    for size in sizes:
+        left, right = sampler.draw(size)
+        rows_l.append(left)
+        rows_r.append(right)
+    return np.concatenate(rows_l), np.concatenate(rows_r)
+
+
+@pytest.mark.parametrize("num_records_r", [None, 37])
+def test_every_pair_is_drawn_exactly_once(num_records_r):
+    num_records = 53
+    sampler = u_sampling.PairSampler(num_records, num_records_r, seed=0)
+    # Enough draws of varied sizes to use up every pair, and then some
+    sizes = [1, 7, 100, 3, 250, 64] * 20
+    rows_l, rows_r = _draw_all(sampler, sizes)
+
+    if num_records_r is None:
+        expected = {(i, j) for j in range(num_records) for i in range(j)}
+    else:
+        expected = {(i, j) for i in range(num_records) for j in range(num_records_r)}
+    drawn = list(zip(rows_l.tolist(), rows_r.tolist()))
+    assert len(drawn) == len(set(drawn))
+    assert set(drawn) == expected
+    assert sampler.num_drawn == sampler.num_pairs == len(expected)
+
+    left, right = sampler.draw(10)
+    assert len(left) == len(right) == 0
+
+
+def test_dedupe_pair_rows_decode_large_keys():
+    num_records = 10**8
+    num_pairs = num_records * (num_records - 1) // 2
+    keys = np.concatenate(
+        [
+            np.arange(1_000, dtype=np.int64),
+            num_pairs - 1 - np.arange(1_000, dtype=np.int64),
+            np.random.default_rng(0).integers(0, num_pairs, 10_000),
+        ]
+    )
+    i, j = u_sampling._dedupe_pair_rows(keys, num_records)
+    assert ((0 <= i) & (i < j) & (j < num_records)).all()
+    np.testing.assert_array_equal(j * (j - 1) // 2 + i, keys)
@@ -0,0 +1,401 @@
+"""Estimates m and u probabilities with expectation maximisation, on the
+distinct gamma patterns of a set of comparison vectors.
+
+Each iteration of EM only depends on the comparison vectors through the
+number of pairs with each combination of gamma values, so the vectors are
+first collapsed to their distinct patterns and counts, with a single GROUP
+BY in DuckDB or np.unique locally. There are rarely more than a few
+thousand patterns however many pairs there are, and every iteration is then
+run in numpy on the small pattern matrix:
+
+> patterns = count_gamma_patterns(
+>     stream_comparison_vectors(pairs, comparisons), comparisons
+> )
+> result = expectation_maximisation(patterns, comparisons, 0.0001)
+> result.add_trained_values(comparisons, "EM, blocked on dob")
+
+As in splink, comparisons used by the blocking rule the pairs were generated
+with should be left out, as their m probabilities can't be estimated from
+those pairs.
+"""
+
+import math
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+from execution.comparison_vectors import (
+    assign_comparison_vector_values,
+    gamma_column_name,
+)
+from splink.comparison_level import (
+    _default_m_values,
+    _default_u_values,
+)
+from splink.constants import LEVEL_NOT_OBSERVED_TEXT
+
+# Patterns are merged whenever this many unmerged ones have built up while
+# counting a stream of batches
+_MERGE_SIZE = 1_000_000
+
+
+class GammaPatterns:
+    """The distinct gamma patterns of a set of comparison vectors, and the
+    number of pairs with each.
+
+    Args:
+        comparison_names (list[str]): The comparisons, in column order.
+        patterns (numpy.ndarray): An int8 matrix with a row per pattern and a
+            column per comparison.
+        counts (numpy.ndarray): The number of pairs with each pattern.
+    """
+
+    def __init__(self, comparison_names, patterns, counts):
+        self.comparison_names = list(comparison_names)
+        self.patterns = np.asarray(patterns, dtype=np.int8)
+        self.counts = np.asarray(counts, dtype=np.float64)
+
+    @property
+    def num_patterns(self):
+        return len(self.counts)
+
+    @property
+    def num_pairs(self):
+        return int(self.counts.sum())
+
+    def __repr__(self):
+        return (
+            f"<{self.num_patterns:,} gamma patterns of {self.num_pairs:,} "
+            "pairs>"
+        )
+
+
+def gamma_pattern_counts_sql(table_name, comparison_names):
+    """Sql collapsing a table of comparison vectors to its distinct gamma
+    patterns, with a `__splink__count` of the pairs with each."""
+    gammas = ", ".join(f'"{gamma_column_name(name)}"' for name in comparison_names)
+    return f"""
+        select {gammas}, count(*) as __splink__count
+        from {table_name}
+        group by {gammas}
+    """
+
+
+def _as_rows(patterns):
+    # Each row of the pattern matrix as a single value, so np.unique can work
+    # on a flat array rather than with axis=0
+    patterns = np.ascontiguousarray(patterns, dtype=np.int8)
+    row_type = np.dtype((np.void, patterns.shape[1]))
+    return patterns.view(row_type).ravel()
+
+
+def _unique_patterns(patterns, counts):
+    rows, inverse = np.unique(_as_rows(patterns), return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=counts, minlength=len(rows))
+    return rows.view(np.int8).reshape(len(rows), patterns.shape[1]), counts
+
+
+def _gamma_matrix(vectors, comparison_names):
+    return np.stack(
+        [
+            np.asarray(vectors[gamma_column_name(name)], dtype=np.int8)
+            for name in comparison_names
+        ],
+        axis=1,
+    )
+
+
+def _is_single_table(vectors):
+    return isinstance(vectors, (pa.Table, pa.RecordBatch, dict)) or (
+        hasattr(vectors, "columns") and hasattr(vectors, "index")
+    )
+
+
+def count_gamma_patterns(vectors, comparisons, connection=None):
+    """Collapses comparison vectors to their distinct gamma patterns.
+
+    Args:
+        vectors: The comparison vectors, with a gamma column per comparison.
+            Either the name of a table in `connection`, counted with a
+            single GROUP BY, or a pyarrow Table or RecordBatch, pandas
+            DataFrame, dict of arrays, or an iterable of any of these, such
+            as the output of stream_comparison_vectors, counted with
+            np.unique.
+        comparisons (dict[str, list[ComparisonLevel]] | list[str]): The
+            comparisons, or their names.
+        connection (duckdb.DuckDBPyConnection, optional): The connection
+            holding the table, if a table name is given. Defaults to None.
+
+    Returns:
+        GammaPatterns: The patterns and their counts.
+    """
+    names = list(comparisons)
+
+    if isinstance(vectors, str):
+        con = connection if connection is not None else duckdb.connect()
+        counts = con.execute(gamma_pattern_counts_sql(vectors, names)).fetchnumpy()
+        patterns = _gamma_matrix(counts, names)
+        return GammaPatterns(names, patterns, counts["__splink__count"])
+
+    if _is_single_table(vectors):
+        vectors = [vectors]
+
+    patterns = np.empty((0, len(names)), dtype=np.int8)
+    counts = np.empty(0)
+    unmerged = 0
+    for batch in vectors:
+        batch_patterns, batch_counts = _unique_patterns(
+            _gamma_matrix(batch, names), None
+        )
+        patterns = np.concatenate([patterns, batch_patterns])
+        counts = np.concatenate([counts, batch_counts])
+        unmerged += len(batch_counts)
+        if unmerged > _MERGE_SIZE:
+            patterns, counts = _unique_patterns(patterns, counts)
+            unmerged = 0
+    patterns, counts = _unique_patterns(patterns, counts)
+    return GammaPatterns(names, patterns, counts)
+
+
+class _FlatParameters:
+    # The m and u probabilities of every level of every comparison in flat
+    # arrays, comparison by comparison, indexed by comparison vector value +
+    # 1 plus the comparison's offset. The null level's slot holds m = u = 1,
+    # so it has a bayes factor of 1.
+
+    def __init__(self, comparisons):
+        self.levels = {}
+        sizes = []
+        for name, levels in comparisons.items():
+            assign_comparison_vector_values(levels)
+            sizes.append(max(level._comparison_vector_value for level in levels) + 2)
+            self.levels[name] = levels
+        self.sizes = np.array(sizes, dtype=np.int64)
+        self.offsets = np.cumsum(self.sizes) - self.sizes
+        self.null_slots = np.zeros(self.sizes.sum(), dtype=bool)
+        self.null_slots[self.offsets] = True
+
+        self.m = np.ones(self.sizes.sum())
+        self.u = np.ones(self.sizes.sum())
+        for offset, levels in zip(self.offsets, self.levels.values()):
+            num_levels = sum(1 for level in levels if not level.is_null_level)
+            for level in levels:
+                if level.is_null_level:
+                    continue
+                value = level._comparison_vector_value
+                m, u = _starting_values(level, num_levels)
+                self.m[offset + value + 1] = m
+                self.u[offset + value + 1] = u
+
+    def slot_sums(self, indices, weights):
+        # Sums the weights of each pattern into the slot of each of its
+        # gamma values, and the total over the non-null slots of each
+        # comparison
+        num_comparisons = indices.shape[1]
+        sums = np.bincount(
+            indices.ravel(),
+            weights=np.repeat(weights, num_comparisons),
+            minlength=len(self.m),
+        )
+        totals = np.add.reduceat(np.where(self.null_slots, 0, sums), self.offsets)
+        return sums, np.repeat(totals, self.sizes)
+
+
+def _starting_values(level, num_levels):
+    # Levels outside a Comparison can't find their own defaults
+    value = level._comparison_vector_value
+    if level._has_comparison or level._m_probability is not None:
+        m = level.m_probability
+    else:
+        m = _default_m_values(num_levels)[value]
+    if level._has_comparison or level._u_probability is not None:
+        u = level.u_probability
+    else:
+        u = _default_u_values(num_levels)[value]
+    return m, u
+
+
+class EMResult:
+    """The estimates of a run of expectation maximisation.
+
+    Attributes:
+        m_probabilities (dict[str, dict[int, float]]): The estimated m
+            probability of each level of each comparison, keyed on the
+            comparison name and the level's comparison vector value. Levels
+            with no pairs have LEVEL_NOT_OBSERVED_TEXT.
+        u_probabilities (dict[str, dict[int, float]]): As m_probabilities.
+        probability_two_random_records_match (float): The estimated prior.
+        iterations (int): The number of iterations run.
+        converged (bool): Whether the largest change in a parameter fell
+            below the convergence threshold.
+        fix_m_probabilities (bool): Whether m probabilities were fixed.
+        fix_u_probabilities (bool): Whether u probabilities were fixed.
+    """
+
+    def __init__(
+        self,
+        m_probabilities,
+        u_probabilities,
+        probability_two_random_records_match,
+        iterations,
+        converged,
+        fix_m_probabilities,
+        fix_u_probabilities,
+    ):
+        self.m_probabilities = m_probabilities
+        self.u_probabilities = u_probabilities
+        self.probability_two_random_records_match = (
+            probability_two_random_records_match
+        )
+        self.iterations = iterations
+        self.converged = converged
+        self.fix_m_probabilities = fix_m_probabilities
+        self.fix_u_probabilities = fix_u_probabilities
+
+    def add_trained_values(self, comparisons, description="EM"):
+        """Records the estimates against each level with
+        _add_trained_m_probability and _add_trained_u_probability, and sets
+        each level's m and u probabilities from the median of its trained
+        values, as splink does at the end of a training session.
+
+        Probabilities that were fixed during training aren't recorded.
+
+        Args:
+            comparisons (dict[str, list[ComparisonLevel]]): The comparisons
+                the estimates were made for.
+            description (str, optional): Describes the training session.
+                Defaults to "EM".
+        """
+        for name, levels in comparisons.items():
+            for level in levels:
+                if level.is_null_level:
+                    continue
+                value = level._comparison_vector_value
+                if not self.fix_m_probabilities:
+                    level._add_trained_m_probability(
+                        self.m_probabilities[name][value], description
+                    )
+                    if level._trained_m_median is not None:
+                        level.m_probability = level._trained_m_median
+                if not self.fix_u_probabilities:
+                    level._add_trained_u_probability(
+                        self.u_probabilities[name][value], description
+                    )
+                    if level._trained_u_median is not None:
+                        level.u_probability = level._trained_u_median
+
+    def __repr__(self):
+        status = "converged" if self.converged else "did not converge"
+        return (
+            f"<EM result, {status} after {self.iterations} iterations, "
+            f"probability_two_random_records_match "
+            f"{self.probability_two_random_records_match:.3g}>"
+        )
+
+
+def expectation_maximisation(
+    patterns,
+    comparisons,
+    probability_two_random_records_match,
+    max_iterations=25,
+    em_convergence=0.0001,
+    fix_m_probabilities=False,
+    fix_u_probabilities=True,
+    fix_probability_two_random_records_match=False,
+):
+    """Estimates m and u probabilities with expectation maximisation.
+
+    The starting values are the levels' current m and u probabilities, or
+    splink's defaults where they have none. Levels aren't modified; apply
+    the estimates with EMResult.add_trained_values.
+
+    Args:
+        patterns (GammaPatterns): The gamma patterns of the training pairs,
+            from count_gamma_patterns.
+        comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+            comparison, keyed on the comparison's output column name.
+        probability_two_random_records_match (float): The starting prior.
+        max_iterations (int, optional): Defaults to 25.
+        em_convergence (float, optional): Stop once no parameter changes by
+            more than this. Defaults to 0.0001.
+        fix_m_probabilities (bool, optional): Defaults to False.
+        fix_u_probabilities (bool, optional): Defaults to True, as u
+            probabilities are better estimated from random pairs (see
+            training.u_sampling).
+        fix_probability_two_random_records_match (bool, optional): Defaults
+            to False.
+
+    Returns:
+        EMResult: The estimates.
+    """
+    params = _FlatParameters(comparisons)
+    names = list(params.levels)
+    columns = [patterns.comparison_names.index(name) for name in names]
+    indices = patterns.patterns[:, columns].astype(np.int64) + params.offsets + 1
+    counts = patterns.counts
+    total = counts.sum()
+
+    # Slots which no pair has a gamma value in keep their starting values,
+    # which don't affect any pair's match probability
+    observed, _ = params.slot_sums(indices, counts)
+    observed = (observed > 0) & ~params.null_slots
+
+    m, u = params.m.copy(), params.u.copy()
+    prior = probability_two_random_records_match
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        # Expectation: the match probability of each pattern
+        with np.errstate(divide="ignore"):
+            log2_bayes_factors = np.log2(m) - np.log2(u)
+        match_weight = math.log2(prior / (1 - prior)) + log2_bayes_factors[
+            indices
+        ].sum(axis=1)
+        with np.errstate(over="ignore"):
+            match_probability = 1 / (1 + np.exp2(-match_weight))
+
+        # Maximisation: the share of matches and non-matches in each level
+        match_counts = counts * match_probability
+        non_match_counts = counts - match_counts
+        new_m, new_u = m.copy(), u.copy()
+        if not fix_m_probabilities:
+            sums, totals = params.slot_sums(indices, match_counts)
+            new_m[observed] = sums[observed] / totals[observed]
+        if not fix_u_probabilities:
+            sums, totals = params.slot_sums(indices, non_match_counts)
+            new_u[observed] = sums[observed] / totals[observed]
+        if not fix_probability_two_random_records_match:
+            prior = match_counts.sum() / total
+
+        change = max(
+            np.abs(new_m - m).max(initial=0), np.abs(new_u - u).max(initial=0)
+        )
+        m, u = new_m, new_u
+        if change < em_convergence:
+            converged = True
+            break
+
+    m_probabilities, u_probabilities = {}, {}
+    for name, offset in zip(names, params.offsets):
+        m_probabilities[name], u_probabilities[name] = {}, {}
+        for level in params.levels[name]:
+            if level.is_null_level:
+                continue
+            slot = offset + level._comparison_vector_value + 1
+            if observed[slot]:
+                m_value, u_value = float(m[slot]), float(u[slot])
+            else:
+                m_value = u_value = LEVEL_NOT_OBSERVED_TEXT
+            m_probabilities[name][level._comparison_vector_value] = m_value
+            u_probabilities[name][level._comparison_vector_value] = u_value
+
+    return EMResult(
+        m_probabilities,
+        u_probabilities,
+        float(prior),
+        iteration,
+        converged,
+        fix_m_probabilities,
+        fix_u_probabilities,
+    )
@@ -0,0 +1,286 @@
+"""Updates m and u probabilities incrementally, as new batches of pairs arrive.
+
+splink records every training session's estimates against each level and
+sets its m and u probabilities from their median, so estimates can only be
+refreshed by training from scratch and appending to the lists. Instead, an
+OnlineEstimator keeps sufficient statistics: the expected number of matching
+and non-matching pairs in each level, summed over every batch seen. m and u
+are the share of each comparison's matches and non-matches in each level,
+so a batch is folded in with a single EM step over its gamma patterns,
+whatever the size of the pairs seen before it.
+
+The statistics are small and can be saved between runs, so a daily run
+linking new records to an existing base only has to score the new pairs:
+
+> estimator = OnlineEstimator.from_dict(saved, comparisons)
+> estimator.update(stream_comparison_vectors(new_pairs, comparisons))
+> estimator.apply(comparisons)
+> saved = estimator.as_dict()
+"""
+
+import math
+
+import numpy as np
+
+from splink.constants import LEVEL_NOT_OBSERVED_TEXT
+from training.em import GammaPatterns, _FlatParameters, count_gamma_patterns
+
+
+def _as_patterns(vectors, comparisons):
+    if isinstance(vectors, GammaPatterns):
+        return vectors
+    return count_gamma_patterns(vectors, comparisons)
+
+
+class OnlineEstimator:
+    """Estimates m and u probabilities from running sufficient statistics.
+
+    Levels with no pairs yet keep their starting m and u probabilities,
+    their current values or splink's defaults, as in
+    expectation_maximisation.
+
+    Args:
+        comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+            comparison, keyed on the comparison's output column name.
+        probability_two_random_records_match (float): The starting prior.
+        decay (float, optional): The weight of the statistics of earlier
+            batches when a new one is added, so that estimates can follow
+            drift in the data. Defaults to 1.0, which weights every pair
+            equally.
+        fix_u_probabilities (bool, optional): Whether update leaves u
+            probabilities alone, so they're only estimated from random pairs
+            with update_u. Defaults to True.
+        fix_probability_two_random_records_match (bool, optional): Defaults
+            to False.
+    """
+
+    def __init__(
+        self,
+        comparisons,
+        probability_two_random_records_match,
+        decay=1.0,
+        fix_u_probabilities=True,
+        fix_probability_two_random_records_match=False,
+    ):
+        self._params = _FlatParameters(comparisons)
+        self.comparison_names = list(self._params.levels)
+        self.decay = decay
+        self.fix_u_probabilities = fix_u_probabilities
+        self.fix_probability_two_random_records_match = (
+            fix_probability_two_random_records_match
+        )
+        num_slots = len(self._params.m)
+        self.match_counts = np.zeros(num_slots)
+        self.non_match_counts = np.zeros(num_slots)
+        self.num_matches = 0.0
+        self.num_pairs = 0.0
+        self._starting_prior = probability_two_random_records_match
+
+    def _probabilities(self, counts, starting_values):
+        # Each slot's share of its comparison's counts, over the non-null
+        # slots. Slots with no counts keep their starting values.
+        params = self._params
+        counts = np.where(params.null_slots, 0, counts)
+        totals = np.repeat(np.add.reduceat(counts, params.offsets), params.sizes)
+        observed = counts > 0
+        probabilities = starting_values.copy()
+        probabilities[observed] = counts[observed] / totals[observed]
+        return probabilities
+
+    @property
+    def m(self):
+        return self._probabilities(self.match_counts, self._params.m)
+
+    @property
+    def u(self):
+        return self._probabilities(self.non_match_counts, self._params.u)
+
+    @property
+    def probability_two_random_records_match(self):
+        if self.fix_probability_two_random_records_match or self.num_pairs == 0:
+            return self._starting_prior
+        return self.num_matches / self.num_pairs
+
+    def _indices(self, patterns):
+        columns = [patterns.comparison_names.index(n) for n in self.comparison_names]
+        return (
+            patterns.patterns[:, columns].astype(np.int64)
+            + self._params.offsets
+            + 1
+        )
+
+    def _match_probabilities(self, indices):
+        with np.errstate(divide="ignore"):
+            log2_bayes_factors = np.log2(self.m) - np.log2(self.u)
+        prior = self.probability_two_random_records_match
+        match_weight = math.log2(prior / (1 - prior)) + log2_bayes_factors[
+            indices
+        ].sum(axis=1)
+        with np.errstate(over="ignore"):
+            return 1 / (1 + np.exp2(-match_weight))
+
+    def update(self, vectors, iterations=1):
+        """Folds a batch of pairs into the estimates, with EM steps whose
+        expectation only covers the batch.
+
+        Args:
+            vectors: The batch's comparison vectors, in any form accepted by
+                count_gamma_patterns, or their GammaPatterns.
+            iterations (int, optional): The number of EM steps to take on
+                the batch. Defaults to 1.
+        """
+        patterns = _as_patterns(vectors, self.comparison_names)
+        indices = self._indices(patterns)
+        counts = patterns.counts
+
+        decay = self.decay
+        match_counts = self.match_counts * decay
+        non_match_counts = self.non_match_counts * decay
+        num_matches = self.num_matches * decay
+        num_pairs = self.num_pairs * decay + counts.sum()
+        for _ in range(iterations):
+            batch_matches = counts * self._match_probabilities(indices)
+            sums, _ = self._params.slot_sums(indices, batch_matches)
+            self.match_counts = match_counts + sums
+            if not self.fix_u_probabilities:
+                sums, _ = self._params.slot_sums(indices, counts - batch_matches)
+                self.non_match_counts = non_match_counts + sums
+            self.num_matches = num_matches + batch_matches.sum()
+            self.num_pairs = num_pairs
+
+    def update_u(self, vectors):
+        """Folds a batch of random pairs into the u estimates, treating every
+        pair as a non-match, as in estimate_u_by_sampling."""
+        patterns = _as_patterns(vectors, self.comparison_names)
+        sums, _ = self._params.slot_sums(self._indices(patterns), patterns.counts)
+        self.non_match_counts = self.non_match_counts * self.decay + sums
+
+    def _level_values(self, probabilities, counts):
+        values = {}
+        for name, offset in zip(self.comparison_names, self._params.offsets):
+            values[name] = {}
+            for level in self._params.levels[name]:
+                if level.is_null_level:
+                    continue
+                slot = offset + level._comparison_vector_value + 1
+                values[name][level._comparison_vector_value] = (
+                    float(probabilities[slot])
+                    if counts[slot] > 0
+                    else LEVEL_NOT_OBSERVED_TEXT
+                )
+        return values
+
+    @property
+    def m_probabilities(self):
+        """dict[str, dict[int, float]]: The m probability of each level,
+        keyed as EMResult.m_probabilities."""
+        return self._level_values(self.m, self.match_counts)
+
+    @property
+    def u_probabilities(self):
+        """dict[str, dict[int, float]]: As m_probabilities."""
+        return self._level_values(self.u, self.non_match_counts)
+
+    def apply(self, comparisons, description="online"):
+        """Sets each level's m and u probabilities from the statistics.
+
+        Rather than appending to the level's trained values on every update,
+        the estimator keeps a single trained value per level, under
+        `description`, which is replaced each time it's applied. Levels with
+        no pairs are left as they are.
+
+        Args:
+            comparisons (dict[str, list[ComparisonLevel]]): The comparisons
+                the estimator was built with.
+            description (str, optional): Defaults to "online".
+        """
+        estimates = {
+            "m": self.m_probabilities,
+            "u": None if self.fix_u_probabilities else self.u_probabilities,
+        }
+        if not self.non_match_counts.any():
+            estimates["u"] = None
+        for name, levels in comparisons.items():
+            for level in levels:
+                if level.is_null_level:
+                    continue
+                value = level._comparison_vector_value
+                for m_or_u, probabilities in estimates.items():
+                    if probabilities is None:
+                        continue
+                    probability = probabilities[name][value]
+                    _replace_trained_value(level, m_or_u, probability, description)
+                    if probability != LEVEL_NOT_OBSERVED_TEXT:
+                        setattr(level, f"{m_or_u}_probability", probability)
+
+    def as_dict(self):
+        """The statistics as a dict of plain values, e.g. to save as json."""
+        return {
+            "comparisons": {
+                name: {
+                    "match_counts": self.match_counts[offset : offset + size].tolist(),
+                    "non_match_counts": self.non_match_counts[
+                        offset : offset + size
+                    ].tolist(),
+                }
+                for name, offset, size in zip(
+                    self.comparison_names, self._params.offsets, self._params.sizes
+                )
+            },
+            "num_matches": self.num_matches,
+            "num_pairs": self.num_pairs,
+            "probability_two_random_records_match": self._starting_prior,
+            "decay": self.decay,
+            "fix_u_probabilities": self.fix_u_probabilities,
+            "fix_probability_two_random_records_match": (
+                self.fix_probability_two_random_records_match
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, estimator_dict, comparisons):
+        """Restores an estimator saved with as_dict, for the same
+        comparisons."""
+        estimator = cls(
+            comparisons,
+            estimator_dict["probability_two_random_records_match"],
+            decay=estimator_dict["decay"],
+            fix_u_probabilities=estimator_dict["fix_u_probabilities"],
+            fix_probability_two_random_records_match=estimator_dict[
+                "fix_probability_two_random_records_match"
+            ],
+        )
+        for name, offset, size in zip(
+            estimator.comparison_names,
+            estimator._params.offsets,
+            estimator._params.sizes,
+        ):
+            counts = estimator_dict["comparisons"][name]
+            if len(counts["match_counts"]) != size:
+                raise ValueError(
+                    f"The saved statistics of comparison {name} have "
+                    f"{len(counts['match_counts']) - 1} levels, but it has "
+                    f"{size - 1}."
+                )
+            estimator.match_counts[offset : offset + size] = counts["match_counts"]
+            estimator.non_match_counts[offset : offset + size] = counts[
+                "non_match_counts"
+            ]
+        estimator.num_matches = estimator_dict["num_matches"]
+        estimator.num_pairs = estimator_dict["num_pairs"]
+        return estimator
+
+    def __repr__(self):
+        return (
+            f"<Online estimator over {self.num_pairs:,.0f} pairs, "
+            f"probability_two_random_records_match "
+            f"{self.probability_two_random_records_match:.3g}>"
+        )
+
+
+def _replace_trained_value(level, m_or_u, probability, description):
+    # Replaces the level's trained value with this description, if it has
+    # one, so its history doesn't grow with every update
+    level._trained_probability_store.replace(
+        level._trained_store_id, m_or_u, probability, description
+    )
@@ -0,0 +1,356 @@
+"""Estimates u probabilities from a random sample of record pairs.
+
+Almost every pair of records is a non-match, so the u probability of a level
+is close to the share of random pairs in it. Rather than sampling records
+and cross joining them, pairs are drawn directly, as uniform random indices
+into the n * (n - 1) / 2 pairs of a deduplication, or n_l * n_r pairs of a
+link, decoded into the rows of their two records. Pairs already drawn are
+kept in a few sorted runs, so each new draw is deduplicated against them with
+binary searches, and no pair is counted twice. A new run is merged into the
+last while it's no smaller, so there are about log2(n) runs of n pairs, and
+each pair is merged about log2(n) times, rather than the whole sample being
+merged again on every draw.
+
+Pairs are drawn in chunks, and each chunk's comparison vectors are computed
+by a process pool, with the records sent to each worker once. After each
+round of chunks the estimates are compared to the previous round's, and
+sampling stops once every level's estimate is stable:
+
+> result = estimate_u_by_sampling(people, comparisons, max_pairs=1e7)
+> result.add_trained_values(comparisons)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from blocking.blocking_keys import as_arrow_table
+from blocking.blocking_rule_builder import SALT_COLUMN_NAME
+from blocking.local_join import _pair_table
+from execution.comparison_vectors import (
+    assign_comparison_vector_values,
+    gamma_column_name,
+)
+from execution.streaming import _default_engine
+from splink.constants import LEVEL_NOT_OBSERVED_TEXT
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _dedupe_pair_rows(keys, num_records):
+    # Decodes indices into the pairs (i, j), i < j, of num_records records,
+    # numbered in order of j then i, so pair k has j = floor((1 +
+    # sqrt(1 + 8k)) / 2) and i = k - j * (j - 1) / 2
+    j = np.floor((1 + np.sqrt(1 + 8 * keys.astype(np.float64))) / 2)
+    j = j.astype(np.int64)
+    # Correct any rounding error in the square root
+    j -= j * (j - 1) // 2 > keys
+    j += (j + 1) * j // 2 <= keys
+    i = keys - j * (j - 1) // 2
+    return i, j
+
+
+class PairSampler:
+    """Draws pairs of records uniformly at random, without replacement.
+
+    Args:
+        num_records (int): The number of records to deduplicate, or the
+            number of left records to link.
+        num_records_r (int, optional): The number of right records to link
+            to. Defaults to None, which deduplicates.
+        seed (int, optional): Defaults to None.
+    """
+
+    def __init__(self, num_records, num_records_r=None, seed=None):
+        self.num_records = num_records
+        self.num_records_r = num_records_r
+        if num_records_r is None:
+            self.num_pairs = num_records * (num_records - 1) // 2
+        else:
+            self.num_pairs = num_records * num_records_r
+        self._rng = np.random.default_rng(seed)
+        # Sorted, disjoint runs of the keys drawn, in decreasing size
+        self._runs = []
+        self._num_drawn = 0
+
+    @property
+    def num_drawn(self):
+        return self._num_drawn
+
+    def _drawn_before(self, keys):
+        seen = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            positions = np.searchsorted(run, keys)
+            in_run = positions < len(run)
+            in_run[in_run] = run[positions[in_run]] == keys[in_run]
+            seen |= in_run
+        return seen
+
+    def _add_drawn(self, keys):
+        run = keys
+        while self._runs and len(self._runs[-1]) <= len(run):
+            # A stable sort of two sorted runs is a merge
+            run = np.sort(np.concatenate([self._runs.pop(), run]), kind="stable")
+        self._runs.append(run)
+        self._num_drawn += len(keys)
+
+    def draw(self, size):
+        """Draws up to `size` pairs not drawn before. Fewer are returned once
+        most pairs have been drawn.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: The left and right rows.
+        """
+        remaining = self.num_pairs - self.num_drawn
+        size = min(size, remaining)
+        if remaining <= 2 * size:
+            # Few pairs are left, so most draws would be repeats. Choose
+            # from the pairs not yet drawn instead.
+            undrawn = np.arange(self.num_pairs, dtype=np.int64)
+            undrawn = undrawn[~self._drawn_before(undrawn)]
+            keys = np.sort(self._rng.choice(undrawn, size, replace=False))
+        else:
+            keys = np.unique(self._rng.integers(0, self.num_pairs, size))
+            keys = keys[~self._drawn_before(keys)]
+        self._add_drawn(keys)
+        # Shuffle, as the keys are sorted
+        keys = self._rng.permutation(keys)
+
+        if self.num_records_r is None:
+            return _dedupe_pair_rows(keys, self.num_records)
+        return keys // self.num_records_r, keys % self.num_records_r
+
+
+# The records and comparisons each worker process evaluates chunks of pairs
+# against, sent once per process rather than with every task
+_worker_state = {}
+
+
+def _level_counts_sizes(comparisons):
+    return {
+        name: max(level._comparison_vector_value for level in levels) + 2
+        for name, levels in comparisons.items()
+    }
+
+
+def _set_worker_state(table_l, table_r, columns, comparisons, engine):
+    _worker_state["tables"] = (table_l, table_r, columns)
+    _worker_state["sizes"] = _level_counts_sizes(comparisons)
+    _worker_state["engine"] = engine
+    _worker_state["compiled"] = engine.compile_comparisons(comparisons)
+
+
+def _init_worker(table_l, table_r, columns, comparisons, engine_class):
+    # Each process builds its own engine, as a DuckDB connection can't be
+    # sent between processes
+    _set_worker_state(table_l, table_r, columns, comparisons, engine_class())
+
+
+def _level_counts_task(rows_l, rows_r):
+    # The number of pairs in each level of each comparison, indexed by
+    # comparison vector value + 1
+    table_l, table_r, columns = _worker_state["tables"]
+    engine = _worker_state["engine"]
+    pairs = _pair_table(table_l, table_r, rows_l, rows_r, columns)
+    vectors = engine.compute_compiled(pairs, _worker_state["compiled"])
+    return {
+        name: np.bincount(
+            np.asarray(vectors[gamma_column_name(name)], dtype=np.int64) + 1,
+            minlength=size,
+        )
+        for name, size in _worker_state["sizes"].items()
+    }
+
+
+def _u_estimates(counts):
+    # The share of the pairs with a non-null gamma value in each level
+    estimates = {}
+    for name, level_counts in counts.items():
+        non_null = level_counts[1:].sum()
+        estimates[name] = level_counts[1:] / max(non_null, 1)
+    return estimates
+
+
+def _is_stable(estimates, previous, counts, tolerance, min_count):
+    # Every level's estimate has changed by less than tolerance, relative to
+    # its size, and every level has been seen at least min_count times
+    for name, estimate in estimates.items():
+        if (counts[name][1:] < min_count).any():
+            return False
+        change = np.abs(estimate - previous[name])
+        if (change > tolerance * estimate).any():
+            return False
+    return True
+
+
+class USamplingResult:
+    """The estimates of estimate_u_by_sampling.
+
+    Attributes:
+        u_probabilities (dict[str, dict[int, float]]): The estimated u
+            probability of each level of each comparison, keyed on the
+            comparison name and the level's comparison vector value. Levels
+            with no sampled pairs have LEVEL_NOT_OBSERVED_TEXT.
+        num_pairs (int): The number of pairs sampled.
+        converged (bool): Whether sampling stopped as the estimates were
+            stable, rather than on reaching max_pairs.
+    """
+
+    def __init__(self, u_probabilities, num_pairs, converged):
+        self.u_probabilities = u_probabilities
+        self.num_pairs = num_pairs
+        self.converged = converged
+
+    def add_trained_values(self, comparisons, description=None):
+        """Records the estimates against each level with
+        _add_trained_u_probability, and sets each level's u probability from
+        the median of its trained values.
+
+        Args:
+            comparisons (dict[str, list[ComparisonLevel]]): The comparisons
+                the estimates were made for.
+            description (str, optional): Describes the training session.
+                Defaults to "estimate u by sampling <n> pairs".
+        """
+        if description is None:
+            description = f"estimate u by sampling {self.num_pairs:,} pairs"
+        for name, levels in comparisons.items():
+            for level in levels:
+                if level.is_null_level:
+                    continue
+                level._add_trained_u_probability(
+                    self.u_probabilities[name][level._comparison_vector_value],
+                    description,
+                )
+                if level._trained_u_median is not None:
+                    level.u_probability = level._trained_u_median
+
+    def __repr__(self):
+        status = "converged" if self.converged else "did not converge"
+        return f"<u estimates from {self.num_pairs:,} pairs, {status}>"
+
+
+def estimate_u_by_sampling(
+    table,
+    comparisons,
+    table_r=None,
+    max_pairs=1e7,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    tolerance=0.01,
+    min_count=10,
+    max_workers=None,
+    engine=None,
+    columns=None,
+    seed=None,
+):
+    """Estimates u probabilities from a sample of random pairs of records.
+
+    Sampling stops once, between two rounds of chunks, no level's estimate
+    changes by more than `tolerance` of its value, and every level has been
+    seen at least `min_count` times, or once `max_pairs` pairs have been
+    sampled. Levels rarely seen among random pairs, e.g. exact matches on a
+    date of birth, need the most pairs before they're stable.
+
+    Args:
+        table (pyarrow.Table | pandas.DataFrame | dict): The records to
+            deduplicate, or the left records to link.
+        comparisons (dict[str, list[ComparisonLevel]]): The levels of each
+            comparison, keyed on the comparison's output column name.
+        table_r (pyarrow.Table | pandas.DataFrame | dict, optional): The
+            right records to link to. Defaults to None, which deduplicates
+            `table`.
+        max_pairs (int, optional): Defaults to 10,000,000.
+        chunk_size (int, optional): The number of pairs evaluated per task.
+            Defaults to 100,000.
+        tolerance (float, optional): Defaults to 0.01.
+        min_count (int, optional): Defaults to 10.
+        max_workers (int, optional): The number of worker processes, each
+            evaluating one chunk per round. With 1, chunks are evaluated in
+            this process. Defaults to the number of processors.
+        engine (DuckDBComparisonEngine | NumpyComparisonEngine, optional):
+            The engine to evaluate the levels with, as in
+            stream_comparison_vectors. Worker processes each build a new
+            engine of the same class. Defaults to None.
+        columns (list[str], optional): The columns the comparisons use.
+            Defaults to all columns.
+        seed (int, optional): Seeds the sample. Defaults to None.
+
+    Returns:
+        USamplingResult: The estimates.
+    """
+    for levels in comparisons.values():
+        assign_comparison_vector_values(levels)
+    table_l = as_arrow_table(table)
+    table_r = table_l if table_r is None else as_arrow_table(table_r)
+    if columns is None:
+        columns = [c for c in table_l.column_names if c != SALT_COLUMN_NAME]
+    if engine is None:
+        engine = _default_engine(comparisons)
+    max_workers = max_workers or os.cpu_count()
+
+    sampler = PairSampler(
+        table_l.num_rows,
+        None if table_r is table_l else table_r.num_rows,
+        seed,
+    )
+    max_pairs = min(int(max_pairs), sampler.num_pairs)
+
+    executor = None
+    if max_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(table_l, table_r, columns, comparisons, type(engine)),
+        )
+    else:
+        _set_worker_state(table_l, table_r, columns, comparisons, engine)
+
+    counts = {
+        name: np.zeros(size, dtype=np.int64)
+        for name, size in _level_counts_sizes(comparisons).items()
+    }
+    previous = None
+    converged = False
+    try:
+        while sampler.num_drawn < max_pairs:
+            chunks = []
+            for _ in range(max_workers):
+                size = min(chunk_size, max_pairs - sampler.num_drawn)
+                if size <= 0:
+                    break
+                chunks.append(sampler.draw(size))
+
+            if executor is None:
+                results = [_level_counts_task(*chunk) for chunk in chunks]
+            else:
+                results = executor.map(_level_counts_task, *zip(*chunks))
+
+            for result in results:
+                for name, level_counts in result.items():
+                    counts[name] += level_counts
+
+            estimates = _u_estimates(counts)
+            if previous is not None and _is_stable(
+                estimates, previous, counts, tolerance, min_count
+            ):
+                converged = True
+                break
+            previous = estimates
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    estimates = _u_estimates(counts)
+    u_probabilities = {}
+    for name, levels in comparisons.items():
+        u_probabilities[name] = {}
+        for level in levels:
+            if level.is_null_level:
+                continue
+            value = level._comparison_vector_value
+            if counts[name][value + 1] == 0:
+                u_probabilities[name][value] = LEVEL_NOT_OBSERVED_TEXT
+            else:
+                u_probabilities[name][value] = float(estimates[name][value])
+    return USamplingResult(u_probabilities, sampler.num_drawn, converged)